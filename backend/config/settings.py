@@ -2,6 +2,7 @@ import os
 from pathlib import Path
 from decouple import config
 import dj_database_url
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -28,6 +29,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres', # Busca por trigramas (pg_trgm) nas transações
 
     # Third party apps
     'corsheaders',      
@@ -155,6 +157,11 @@ CORS_ALLOWED_ORIGINS = [
 # mas lembre-se de comentar novamente e usar a lista acima para segurança depois.
 CORS_ALLOW_ALL_ORIGINS = True 
 
+CORS_ALLOW_HEADERS = (
+    *default_headers,
+    'idempotency-key', # Retries do modo offline (ver core/idempotency.py)
+)
+
 CORS_ALLOW_METHODS = [
     "DELETE",
     "GET",
@@ -198,4 +205,19 @@ DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL')
 # Converte a string 'True' do env file para o booleano True do Python
 # Se não estiver definido, assume os padrões seguros para porta 587
 EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'True') == 'True'
-EMAIL_USE_SSL = os.getenv('EMAIL_USE_SSL', 'False') == 'True'
\ No newline at end of file
+EMAIL_USE_SSL = os.getenv('EMAIL_USE_SSL', 'False') == 'True'
+
+# --- IDEMPOTÊNCIA ---
+# Por quanto tempo uma Idempotency-Key é lembrada (limpeza: purge_idempotency_keys)
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv('IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+# --- CACHE DE RESPOSTAS ---
+# LocMem por padrão (sem serviço externo). As chaves levam a versão da casa,
+# então o timeout só serve para liberar memória de versões antigas.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'domo-responses'),
+    }
+}
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 300))
@@ -0,0 +1,87 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+# ======================================================================
+# EXPORTAÇÃO DE TRANSAÇÕES (STREAMING)
+# ======================================================================
+# export_rows() devolve um gerador de dicts lidos com values() + iterator():
+# o consumo de memória fica limitado ao chunk, independente do volume.
+
+EXPORT_CHUNK_SIZE = 2000
+
+TRANSACTION_FIELDS = (
+    'id', 'date', 'description', 'value', 'type', 'is_shared', 'created_at',
+    'category__name', 'account__name', 'invoice__card__name',
+    'owner__first_name', 'owner__username',
+)
+ITEM_FIELDS = ('items__description', 'items__quantity', 'items__value')
+
+CSV_COLUMNS = (
+    'id', 'date', 'description', 'value', 'type', 'category', 'source', 'owner', 'is_shared', 'created_at',
+)
+CSV_ITEM_COLUMNS = ('item_description', 'item_quantity', 'item_value')
+
+
+def _flatten(row, with_items):
+    # Mesma regra de TransactionSerializer.get_source_name / get_owner_name
+    if row['account__name']:
+        source = row['account__name']
+    elif row['invoice__card__name']:
+        source = f"Cartão {row['invoice__card__name']}"
+    else:
+        source = "N/A"
+
+    record = {
+        'id': row['id'],
+        'date': row['date'],
+        'description': row['description'],
+        'value': row['value'],
+        'type': row['type'],
+        'category': row['category__name'],
+        'source': source,
+        'owner': row['owner__first_name'] or row['owner__username'] or "Casa",
+        'is_shared': row['is_shared'],
+        'created_at': row['created_at'],
+    }
+    if with_items:
+        record['item_description'] = row['items__description']
+        record['item_quantity'] = row['items__quantity']
+        record['item_value'] = row['items__value']
+    return record
+
+
+def export_rows(queryset, with_items=False):
+    """Uma linha por transação, ou uma por item (LEFT JOIN) com with_items."""
+    fields = TRANSACTION_FIELDS + (ITEM_FIELDS if with_items else ())
+    order = ('date', 'created_at', 'id') + (('items__id',) if with_items else ())
+    rows = queryset.order_by(*order).values(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    return (_flatten(row, with_items) for row in rows)
+
+
+class _Echo:
+    """Buffer falso: csv.writer devolve a linha em vez de acumulá-la."""
+    def write(self, value):
+        return value
+
+
+def render_csv(rows, with_items):
+    columns = CSV_COLUMNS + (CSV_ITEM_COLUMNS if with_items else ())
+    writer = csv.writer(_Echo())
+    yield '\ufeff'  # BOM para o Excel reconhecer UTF-8
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([row[c] for c in columns])
+
+
+def render_ndjson(rows, with_items):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for row in rows:
+        yield encoder.encode(row) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv', render_csv),
+    'ndjson': ('application/x-ndjson; charset=utf-8', 'ndjson', render_ndjson),
+}
@@ -0,0 +1,148 @@
+import datetime
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.db.models import F, Q, Sum
+from django.db.models.functions import TruncWeek, TruncYear
+
+from .models import MonthlySummary, Transaction
+
+# ======================================================================
+# SÉRIES DO HISTÓRICO (RECEITA, DESPESA E SALDO ACUMULADO)
+# ======================================================================
+# month/year: agregam MonthlySummary (uma linha por mês/tipo/categoria), então
+#   10 anos custam ~120 linhas por tipo, quase o mesmo que 1 ano.
+# day/week: precisam da data exata e agregam Transaction com GROUP BY no
+#   período pedido (índice core_tx_house_date_idx).
+# O acumulado é uma soma de prefixos em Python sobre os buckets já agregados,
+# partindo do saldo líquido de tudo que aconteceu antes de "from".
+
+GRANULARITIES = ('day', 'week', 'month', 'year')
+# Máximo de pontos por série (ex.: um ano por dia, ~7 anos por semana)
+MAX_SERIES_POINTS = 366
+ZERO = Decimal('0.00')
+
+
+class HistoryRangeError(ValueError):
+    pass
+
+
+def bucket_start(day, granularity):
+    if granularity == 'day':
+        return day
+    if granularity == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day.replace(month=1, day=1)
+
+
+def next_bucket(start, granularity):
+    if granularity == 'day':
+        return start + datetime.timedelta(days=1)
+    if granularity == 'week':
+        return start + datetime.timedelta(weeks=1)
+    if granularity == 'month':
+        return start + relativedelta(months=1)
+    return start + relativedelta(years=1)
+
+
+def count_buckets(start, end, granularity):
+    """Número de períodos entre start e end (inclusive), sem montá-los."""
+    if granularity == 'day':
+        return (end - start).days + 1
+    if granularity == 'week':
+        return (end - bucket_start(start, 'week')).days // 7 + 1
+    if granularity == 'month':
+        return (end.year - start.year) * 12 + end.month - start.month + 1
+    return end.year - start.year + 1
+
+
+def parse_range(params, today=None):
+    """
+    Lê from/to (AAAA-MM-DD) e granularity; padrão: últimos 12 meses por mês.
+    Intervalos com mais de MAX_SERIES_POINTS períodos são recusados.
+    """
+    today = today or datetime.date.today()
+    granularity = params.get('granularity', 'month')
+    if granularity not in GRANULARITIES:
+        raise HistoryRangeError(f"Granularidade inválida. Use: {', '.join(GRANULARITIES)}.")
+    try:
+        end = datetime.date.fromisoformat(params['to']) if params.get('to') else today
+        start = (
+            datetime.date.fromisoformat(params['from']) if params.get('from')
+            else (end - relativedelta(months=11)).replace(day=1)
+        )
+    except ValueError:
+        raise HistoryRangeError('Datas devem estar no formato AAAA-MM-DD.')
+    if start > end:
+        raise HistoryRangeError('"from" deve ser anterior a "to".')
+    if count_buckets(start, end, granularity) > MAX_SERIES_POINTS:
+        raise HistoryRangeError(
+            f'Intervalo grande demais: no máximo {MAX_SERIES_POINTS} pontos. Use uma granularidade maior.'
+        )
+    return bucket_start(start, granularity), end, granularity
+
+
+def _net(rows, amount):
+    totals = rows.aggregate(
+        income=Sum(amount, filter=Q(type='INCOME')),
+        expense=Sum(amount, filter=~Q(type='INCOME')),
+    )
+    return (totals['income'] or ZERO) - (totals['expense'] or ZERO)
+
+
+def _opening_balance(house, start):
+    """Saldo líquido (receitas - despesas) de tudo antes de start."""
+    month = start.replace(day=1)
+    balance = _net(MonthlySummary.objects.filter(house=house, month__lt=month), 'total')
+    if start != month:
+        balance += _net(Transaction.objects.filter(house=house, date__gte=month, date__lt=start), 'value')
+    return balance
+
+
+def _bucket_totals(house, start, end, granularity):
+    if granularity in ('month', 'year'):
+        rows = MonthlySummary.objects.filter(house=house, month__gte=start, month__lte=end)
+        period, amount = (F('month') if granularity == 'month' else TruncYear('month')), 'total'
+    else:
+        rows = Transaction.objects.filter(house=house, date__gte=start, date__lte=end)
+        period, amount = (F('date') if granularity == 'day' else TruncWeek('date')), 'value'
+
+    grouped = rows.annotate(period=period).values('period').annotate(
+        income=Sum(amount, filter=Q(type='INCOME')),
+        expense=Sum(amount, filter=~Q(type='INCOME')),
+    ).order_by()
+    return {row['period']: (row['income'] or ZERO, row['expense'] or ZERO) for row in grouped}
+
+
+def build_series(house, start, end, granularity):
+    """
+    Um ponto por período entre start e end (inclusive), incluindo os vazios.
+    Cada ponto cobre o período inteiro (ex.: o mês de "to" entra completo).
+    """
+    totals = _bucket_totals(house, start, end, granularity)
+    opening = _opening_balance(house, start)
+
+    series = []
+    cumulative = opening
+    period = start
+    while period <= end:
+        income, expense = totals.get(period, (ZERO, ZERO))
+        cumulative += income - expense
+        series.append({
+            'period': period,
+            'income': float(income),
+            'expense': float(expense),
+            'net': float(income - expense),
+            'cumulative': float(cumulative),
+        })
+        period = next_bucket(period, granularity)
+
+    return {
+        'from': start,
+        'to': end,
+        'granularity': granularity,
+        'opening_balance': float(opening),
+        'series': series,
+    }
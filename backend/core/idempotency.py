@@ -0,0 +1,81 @@
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction as db_transaction
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+# ======================================================================
+# IDEMPOTÊNCIA (HEADER Idempotency-Key)
+# ======================================================================
+# Retries do frontend offline-first reenviam a mesma escrita. Com o header,
+# a primeira execução grava a resposta; as seguintes a devolvem direto.
+#
+# A chave é reservada (INSERT com UNIQUE) na mesma transação da escrita:
+# um retry concorrente espera o primeiro terminar e então reaproveita a
+# resposta. Respostas que não são 2xx desfazem tudo (inclusive a reserva),
+# então o cliente pode tentar de novo com a mesma chave.
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+DEFAULT_TTL_HOURS = 24
+
+
+def get_ttl_hours():
+    return getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', DEFAULT_TTL_HOURS)
+
+
+def _request_hash(request):
+    payload = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _replay(record, endpoint, request_hash):
+    if record.endpoint != endpoint or record.request_hash != request_hash:
+        return Response(
+            {'error': 'Idempotency-Key já usada com outra requisição.'},
+            status=422
+        )
+    response = Response(record.response_body, status=record.response_status)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(endpoint):
+    """Decorator para métodos de escrita de ViewSets (create, actions POST)."""
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key:
+                return view_method(self, request, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return Response({'error': f'{HEADER} deve ter até {MAX_KEY_LENGTH} caracteres.'}, status=400)
+
+            request_hash = _request_hash(request)
+
+            with db_transaction.atomic():
+                try:
+                    with db_transaction.atomic():
+                        record = IdempotencyKey.objects.create(
+                            user=request.user, key=key, endpoint=endpoint, request_hash=request_hash
+                        )
+                except IntegrityError:
+                    # Já executada (ou em execução concorrente, que já terminou ao liberar o UNIQUE)
+                    record = IdempotencyKey.objects.get(user=request.user, key=key)
+                    return _replay(record, endpoint, request_hash)
+
+                response = view_method(self, request, *args, **kwargs)
+
+                if 200 <= response.status_code < 300:
+                    record.response_status = response.status_code
+                    record.response_body = response.data
+                    record.save(update_fields=['response_status', 'response_body'])
+                else:
+                    db_transaction.set_rollback(True)
+                return response
+        return wrapper
+    return decorator
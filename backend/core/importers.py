@@ -0,0 +1,234 @@
+import csv
+import datetime
+import io
+import re
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction as db_transaction
+
+from .models import AccountLedgerEntry, Transaction
+from .services import adjust_account_balances
+from .summaries import record_bulk_create
+
+# ======================================================================
+# IMPORTAÇÃO DE EXTRATOS (CSV / OFX)
+# ======================================================================
+# Os parsers são geradores: leem o arquivo linha a linha e produzem uma
+# StatementRow por lançamento, então a memória usada não depende do tamanho
+# do extrato. A gravação acontece em lotes de bulk_create.
+
+DEFAULT_BATCH_SIZE = 1000
+DESCRIPTION_MAX_LENGTH = Transaction._meta.get_field('description').max_length
+
+CSV_DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d/%m/%y', '%d-%m-%Y')
+CSV_DATE_COLUMNS = ('date', 'data')
+CSV_DESCRIPTION_COLUMNS = ('description', 'descricao', 'descrição', 'historico', 'histórico', 'memo')
+CSV_VALUE_COLUMNS = ('value', 'valor', 'amount')
+
+OFX_TAG_RE = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+
+class StatementImportError(Exception):
+    pass
+
+
+class StatementRow:
+    __slots__ = ('date', 'description', 'value')
+
+    def __init__(self, date, description, value):
+        self.date = date
+        self.description = description
+        self.value = value
+
+
+def parse_amount(raw, thousands=True):
+    """
+    Aceita '1234.56', '-1.234,56', '1,234.56', 'R$ 10,00' etc. Retorna Decimal com sinal.
+    O separador decimal é o último entre ',' e '.'; o outro só vale como milhar
+    (grupos de 3 dígitos). Um único separador seguido de 3 dígitos ('1.234') é
+    ambíguo e é rejeitado. Sem thousands (OFX não usa milhar), ',' ou '.' é
+    sempre o decimal.
+    """
+    clean = re.sub(r'[^\d,.+-]', '', raw or '')
+    sign = clean[0] if clean[:1] in ('+', '-') else ''
+    digits = clean[len(sign):]
+    separators = [char for char in digits if char in ',.']
+
+    decimal = None
+    if separators:
+        if not thousands or len(set(separators)) == 2:
+            decimal = separators[-1]
+        elif len(separators) == 1:
+            if len(digits.rsplit(separators[0], 1)[1]) == 3:
+                raise StatementImportError(f"Valor ambíguo (milhar ou decimal?): {raw!r}")
+            decimal = separators[0]
+        # Um só tipo de separador, repetido: é milhar ('1.234.567')
+    if decimal and separators.count(decimal) > 1:
+        raise StatementImportError(f"Valor inválido: {raw!r}")
+
+    integer, fraction = digits.rsplit(decimal, 1) if decimal else (digits, '')
+    group = {',': '.', '.': ','}[decimal] if decimal else (separators[0] if separators else None)
+    if group and group in integer:
+        head, *tail = integer.split(group)
+        if not (1 <= len(head) <= 3 and tail and all(len(part) == 3 for part in tail)):
+            raise StatementImportError(f"Valor inválido: {raw!r}")
+        integer = head + ''.join(tail)
+
+    number = f"{sign}{integer}.{fraction}" if decimal else f"{sign}{integer}"
+    if not re.fullmatch(r'[+-]?\d+(\.\d+)?', number):
+        raise StatementImportError(f"Valor inválido: {raw!r}")
+    return Decimal(number)
+
+
+def parse_csv_date(raw):
+    raw = (raw or '').strip()
+    for fmt in CSV_DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(raw, fmt).date()
+        except ValueError:
+            continue
+    raise StatementImportError(f"Data inválida: {raw!r}")
+
+
+def _pick_column(fieldnames, candidates):
+    normalized = {name.strip().lower(): name for name in fieldnames if name}
+    for candidate in candidates:
+        if candidate in normalized:
+            return normalized[candidate]
+    raise StatementImportError(f"Coluna obrigatória ausente: {'/'.join(candidates)}")
+
+
+def iter_csv_rows(text_stream):
+    """
+    CSV com cabeçalho contendo data, descrição e valor (nomes em pt ou en).
+    Separador ',' ou ';' é detectado pela primeira linha.
+    """
+    header = text_stream.readline()
+    if not header:
+        return
+    delimiter = ';' if header.count(';') > header.count(',') else ','
+    fieldnames = next(csv.reader([header], delimiter=delimiter))
+
+    date_col = _pick_column(fieldnames, CSV_DATE_COLUMNS)
+    desc_col = _pick_column(fieldnames, CSV_DESCRIPTION_COLUMNS)
+    value_col = _pick_column(fieldnames, CSV_VALUE_COLUMNS)
+
+    reader = csv.DictReader(text_stream, fieldnames=fieldnames, delimiter=delimiter)
+    for record in reader:
+        if not any((v or '').strip() for v in record.values() if isinstance(v, str)):
+            continue
+        try:
+            row = StatementRow(
+                date=parse_csv_date(record[date_col]),
+                description=(record[desc_col] or '').strip(),
+                value=parse_amount(record[value_col]),
+            )
+        except StatementImportError as e:
+            # Linha do arquivo (o cabeçalho foi lido à parte)
+            raise StatementImportError(f"Linha {reader.line_num + 1}: {e}")
+        yield row
+
+
+def iter_ofx_rows(text_stream):
+    """
+    OFX 1.x (SGML) ou 2.x (XML). Lê tag a tag e emite um lançamento a cada
+    </STMTTRN> (ou no início do próximo <STMTTRN>, já que o SGML não fecha tags).
+    """
+    current = None
+
+    def flush(fields):
+        if not fields or 'DTPOSTED' not in fields or 'TRNAMT' not in fields:
+            return None
+        try:
+            posted = datetime.datetime.strptime(fields['DTPOSTED'][:8], '%Y%m%d').date()
+        except ValueError:
+            raise StatementImportError(f"Data inválida: {fields['DTPOSTED']!r}")
+        description = fields.get('MEMO') or fields.get('NAME') or ''
+        return StatementRow(date=posted, description=description, value=parse_amount(fields['TRNAMT'], thousands=False))
+
+    for line in text_stream:
+        for closing, tag, value in OFX_TAG_RE.findall(line):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                row = flush(current)
+                if row:
+                    yield row
+                current = None if closing else {}
+            elif current is not None and not closing:
+                current[tag] = value.strip()
+
+    row = flush(current)
+    if row:
+        yield row
+
+
+PARSERS = {
+    'csv': iter_csv_rows,
+    'ofx': iter_ofx_rows,
+}
+
+
+def detect_format(filename):
+    name = (filename or '').lower()
+    if name.endswith(('.ofx', '.qfx')):
+        return 'ofx'
+    return 'csv'
+
+
+def open_text_stream(binary_stream, encoding='utf-8-sig'):
+    """Envolve um arquivo binário (upload ou disco) sem carregá-lo inteiro."""
+    return io.TextIOWrapper(binary_stream, encoding=encoding, errors='replace', newline='')
+
+
+def import_statement(account, text_stream, fmt='csv', batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Importa o extrato para a conta em lotes de bulk_create e aplica um único
+    ajuste líquido no saldo ao final. Tudo ocorre numa única transação de banco:
+    ou o extrato entra inteiro, ou nada muda.
+    """
+    if fmt not in PARSERS:
+        raise StatementImportError(f"Formato não suportado: {fmt}")
+
+    summary = {'created': 0, 'income': Decimal('0.00'), 'expense': Decimal('0.00')}
+    net_delta = Decimal('0.00')
+    # Extrato da conta: uma linha por dia do arquivo, não por lançamento
+    net_by_day = defaultdict(Decimal)
+    batch = []
+
+    with db_transaction.atomic():
+        for row in PARSERS[fmt](text_stream):
+            if row.value == 0:
+                continue
+            tx_type = 'INCOME' if row.value > 0 else 'EXPENSE'
+            value = abs(row.value)
+
+            # bulk_create não chama save(): herda privacidade e dono da conta aqui
+            batch.append(Transaction(
+                house_id=account.house_id, account=account, owner_id=account.owner_id,
+                is_shared=account.is_shared, description=(row.description or 'Importado')[:DESCRIPTION_MAX_LENGTH],
+                value=value, type=tx_type, date=row.date,
+            ))
+            net_delta += row.value
+            net_by_day[row.date] += row.value
+            summary['income' if tx_type == 'INCOME' else 'expense'] += value
+
+            if len(batch) >= batch_size:
+                Transaction.objects.bulk_create(batch)
+                record_bulk_create(batch)
+                summary['created'] += len(batch)
+                batch = []
+
+        if batch:
+            Transaction.objects.bulk_create(batch)
+            record_bulk_create(batch)
+            summary['created'] += len(batch)
+
+        if net_by_day:
+            adjust_account_balances(account.house_id, {account.pk: net_delta}, entries=[
+                AccountLedgerEntry(account_id=account.pk, date=day, delta=delta, description='Importação de extrato')
+                for day, delta in sorted(net_by_day.items())
+            ])
+
+    summary['net'] = net_delta
+    return summary
@@ -0,0 +1,122 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction as db_transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Invoice, Transaction, money
+from .response_cache import bump_house_version
+from .summaries import summaries_suspended_now
+
+# ======================================================================
+# TOTAL DAS FATURAS (Invoice.value) MANTIDO NA ESCRITA
+# ======================================================================
+# Invoice.value é a soma das transações da fatura. Em vez de ser ajustado à mão
+# em cada view, segue as mesmas ligações do MonthlySummary:
+#   - Transaction.save()       -> record_invoice_change (tira da fatura antiga,
+#                                 soma na nova)
+#   - delete (signals.py)      -> record_invoice_bulk_delete, uma vez por lote
+#   - bulk_create              -> record_invoice_bulk_create (chame logo após)
+# Sempre com UPDATE ... SET value = value + delta (F), nunca lendo e regravando.
+# Reparo: manage.py reconcile_invoices.
+
+
+def _increment(invoice_id, delta):
+    if delta:
+        Invoice.objects.filter(pk=invoice_id).update(value=F('value') + delta)
+
+
+def record_invoice_change(old_key, new_key):
+    """Chaves no formato Transaction.invoice_key(); None = fora de fatura."""
+    if old_key == new_key or summaries_suspended_now():
+        return
+    old_invoice, old_value = old_key or (None, Decimal('0.00'))
+    new_invoice, new_value = new_key or (None, Decimal('0.00'))
+
+    if old_invoice == new_invoice:
+        _increment(new_invoice, new_value - old_value)
+        return
+    if old_invoice:
+        _increment(old_invoice, -old_value)
+    if new_invoice:
+        _increment(new_invoice, new_value)
+
+
+def record_invoice_bulk_create(transactions):
+    """Soma as transações recém-criadas nas faturas com um único bulk_update."""
+    if summaries_suspended_now():
+        return
+    deltas = defaultdict(Decimal)
+    for tx in transactions:
+        key = tx.invoice_key()
+        if key is None:
+            continue
+        deltas[key[0]] += key[1]
+        tx._invoice_snapshot = key
+    _apply_invoice_deltas(deltas)
+
+
+def record_invoice_bulk_delete(keys):
+    """Desconta das faturas as transações apagadas em lote (chaves de invoice_key())."""
+    if summaries_suspended_now():
+        return
+    deltas = defaultdict(Decimal)
+    for key in keys:
+        if key is not None:
+            deltas[key[0]] -= key[1]
+    _apply_invoice_deltas(deltas)
+
+
+def _apply_invoice_deltas(deltas):
+    invoices = []
+    for invoice_id, delta in deltas.items():
+        if not delta:
+            continue
+        invoice = Invoice(pk=invoice_id)
+        invoice.value = F('value') + delta
+        invoices.append(invoice)
+    if invoices:
+        Invoice.objects.bulk_update(invoices, ['value'])
+
+
+def reconcile_invoices(batch_size=1000, dry_run=False):
+    """
+    Compara Invoice.value com a soma real das transações de todas as faturas
+    (uma query agregada, só as divergentes voltam) e corrige em bulk_update.
+    Retorna (faturas corrigidas, soma das diferenças absolutas).
+    """
+    real_total = Transaction.objects.filter(invoice=OuterRef('pk')).values('invoice').annotate(
+        total=Sum('value')
+    ).values('total')
+    drifted = Invoice.objects.annotate(
+        real_total=Coalesce(Subquery(real_total), Value(0), output_field=DecimalField(max_digits=12, decimal_places=2))
+    ).exclude(value=F('real_total')).values_list('pk', 'card__house_id', 'value', 'real_total')
+
+    fixed, drift = 0, Decimal('0.00')
+    batch, houses = [], set()
+
+    def flush():
+        if batch and not dry_run:
+            with db_transaction.atomic():
+                Invoice.objects.bulk_update(batch, ['value'])
+                # Faturas e cartões ficam em respostas cacheadas da casa
+                for house_id in houses:
+                    bump_house_version(house_id)
+        batch.clear()
+        houses.clear()
+
+    # Materializa só as divergentes antes de gravar (não atualiza sob um cursor aberto)
+    for pk, house_id, stored, real in list(drifted):
+        # No SQLite a soma vem em ponto flutuante: compara em centavos
+        difference = money(real) - money(stored)
+        if not difference:
+            continue
+        fixed += 1
+        drift += abs(difference)
+        batch.append(Invoice(pk=pk, value=money(real)))
+        houses.add(house_id)
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    return fixed, drift
@@ -0,0 +1,129 @@
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction as db_transaction
+from django.db.models import F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import TruncMonth, TruncWeek, TruncYear
+
+from .history import bucket_start, next_bucket
+from .models import AccountLedgerEntry, AccountSnapshot, money
+
+# ======================================================================
+# EXTRATO DA CONTA (AccountLedgerEntry) E SNAPSHOTS DE SALDO
+# ======================================================================
+# Toda alteração de Account.balance grava uma linha de extrato com o delta
+# (core.services e Account.save), então o saldo em qualquer data é a soma do
+# extrato até ela. Para não somar o histórico inteiro, AccountSnapshot guarda
+# o saldo ao fim de cada mês fechado:
+#   saldo em X = último snapshot com data <= X + extrato entre ele e X
+# ou seja, uma busca no índice e no máximo um mês de extrato.
+# Uma linha com data anterior a um snapshot (lançamento retroativo) apaga os
+# snapshots a partir dela; take_snapshots (manage.py snapshot_balances) os refaz.
+
+ZERO = Decimal('0.00')
+
+
+def record_entries(entries):
+    """Grava as linhas (AccountLedgerEntry não salvas) e invalida os snapshots afetados."""
+    entries = [entry for entry in entries if entry.delta]
+    if not entries:
+        return []
+    earliest = {}
+    for entry in entries:
+        entry.delta = money(entry.delta)
+        entry.date = entry.date or datetime.date.today()
+        if isinstance(entry.date, str):
+            # Datas vindas direto do request (ex.: pagamento de fatura)
+            entry.date = datetime.date.fromisoformat(entry.date)
+        earliest[entry.account_id] = min(entry.date, earliest.get(entry.account_id, entry.date))
+
+    with db_transaction.atomic():
+        created = AccountLedgerEntry.objects.bulk_create(entries)
+        stale = Q()
+        for account_id, day in earliest.items():
+            stale |= Q(account_id=account_id, date__gte=day)
+        AccountSnapshot.objects.filter(stale).delete()
+    return created
+
+
+def balance_at(account_id, day):
+    """Saldo ao fim de day: um snapshot + a cauda do extrato depois dele."""
+    snapshot = AccountSnapshot.objects.filter(account_id=account_id, date__lte=day).order_by('-date').first()
+    tail = AccountLedgerEntry.objects.filter(account_id=account_id, date__lte=day)
+    if snapshot:
+        tail = tail.filter(date__gt=snapshot.date)
+    total = tail.aggregate(total=Sum('delta'))['total'] or ZERO
+    return money((snapshot.balance if snapshot else ZERO) + total)
+
+
+def take_snapshots(until=None, account_ids=None):
+    """
+    Cria um snapshot ao fim de cada mês fechado (antes do mês de until) que teve
+    movimento depois do último snapshot da conta. Uma query agrupada para todas
+    as contas e um bulk_create. Retorna o número de snapshots criados.
+    """
+    until = (until or datetime.date.today()).replace(day=1)
+    last_snapshot = AccountSnapshot.objects.filter(account=OuterRef('account')).order_by('-date')
+    pending = AccountLedgerEntry.objects.filter(date__lt=until)
+    if account_ids is not None:
+        pending = pending.filter(account_id__in=account_ids)
+    pending = pending.annotate(
+        last_date=Subquery(last_snapshot.values('date')[:1])
+    ).filter(Q(last_date__isnull=True) | Q(date__gt=F('last_date')))
+
+    months = defaultdict(list)
+    for row in pending.annotate(month=TruncMonth('date')).values('account_id', 'month').annotate(
+        total=Sum('delta')
+    ).order_by('account_id', 'month'):
+        months[row['account_id']].append((row['month'], row['total']))
+    if not months:
+        return 0
+
+    # Saldo de partida de cada conta: o último snapshot (uma query para todas)
+    opening = dict(AccountSnapshot.objects.filter(
+        account_id__in=months, date=Subquery(last_snapshot.values('date')[:1])
+    ).values_list('account_id', 'balance'))
+
+    snapshots = []
+    for account_id, totals in months.items():
+        balance = opening.get(account_id, ZERO)
+        for month, total in totals:
+            balance = money(balance + total)
+            snapshots.append(AccountSnapshot(
+                account_id=account_id, date=next_bucket(month, 'month') - datetime.timedelta(days=1), balance=balance,
+            ))
+    AccountSnapshot.objects.bulk_create(snapshots, ignore_conflicts=True)
+    return len(snapshots)
+
+
+def build_balance_series(account, start, end, granularity):
+    """Saldo ao fim de cada período entre start e end, mais a variação do período."""
+    opening = balance_at(account.pk, start - datetime.timedelta(days=1))
+
+    rows = AccountLedgerEntry.objects.filter(account=account, date__gte=start, date__lte=end)
+    period = {
+        'day': F('date'), 'week': TruncWeek('date'), 'month': TruncMonth('date'), 'year': TruncYear('date'),
+    }[granularity]
+    changes = {
+        row['period']: row['change']
+        for row in rows.annotate(period=period).values('period').annotate(change=Sum('delta')).order_by()
+    }
+
+    series = []
+    balance = opening
+    current = bucket_start(start, granularity)
+    while current <= end:
+        change = money(changes.get(current) or ZERO)
+        balance += change
+        series.append({'period': current, 'change': float(change), 'balance': float(balance)})
+        current = next_bucket(current, granularity)
+
+    return {
+        'account': account.pk,
+        'from': start,
+        'to': end,
+        'granularity': granularity,
+        'opening_balance': float(opening),
+        'series': series,
+    }
@@ -0,0 +1,186 @@
+import datetime
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction as db_transaction
+from django.db.models import Q, Sum
+
+from core.models import Account, CreditCard, House, Invoice, RecurringBill, Transaction
+from core.summaries import rebuild_house_summaries, summaries_suspended
+
+# Índices avaliados (ver Transaction.Meta / Invoice.Meta)
+BENCH_INDEXES = {
+    Transaction: ('core_tx_visibility_idx', 'core_tx_house_date_idx', 'core_tx_bill_date_idx', 'core_tx_invoice_value_idx'),
+    Invoice: ('core_inv_card_status_ref_idx',),
+}
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Popula um volume grande de transações numa casa de benchmark e mostra o plano "
+        "(EXPLAIN) e o tempo das queries quentes. Com --compare, repete as medições sem "
+        "os índices compostos, dentro de uma transação que é desfeita no final. "
+        "Use apenas em banco de desenvolvimento."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--houses', type=int, default=20, help="Casas a popular (o alvo é a primeira)")
+        parser.add_argument('--transactions', type=int, default=200000, help="Total de transações, distribuídas entre as casas")
+        parser.add_argument('--years', type=int, default=5)
+        parser.add_argument('--repeat', type=int, default=20, help="Execuções por query para a média")
+        parser.add_argument('--compare', action='store_true', help="Mede também sem os índices (antes/depois)")
+        parser.add_argument('--keep', action='store_true', help="Não apaga os dados de benchmark ao final")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        started = time.monotonic()
+        target = self.seed_data(options)
+        self.stdout.write(f"Dados gerados em {time.monotonic() - started:.1f}s ({connection.vendor}).\n")
+
+        try:
+            self.stdout.write(self.style.MIGRATE_HEADING("== COM ÍNDICES (depois)"))
+            after = self.run_suite(target, options['repeat'])
+
+            if options['compare']:
+                before = self.run_without_indexes(target, options['repeat'])
+                self.stdout.write(self.style.MIGRATE_HEADING("== RESUMO (ms por execução)"))
+                for name in after:
+                    speedup = before[name] / after[name] if after[name] else float('inf')
+                    self.stdout.write(f"{name:<28} antes {before[name]:>9.3f}  depois {after[name]:>9.3f}  ({speedup:.1f}x)")
+        finally:
+            if not options['keep']:
+                # Inclui as casas padrão criadas pelo signal de User
+                with summaries_suspended():
+                    House.objects.filter(
+                        Q(name__startswith='[bench]') | Q(members__user__username__startswith='bench_')
+                    ).delete()
+                User.objects.filter(username__startswith='bench_').delete()
+
+    # ------------------------------------------------------------------
+    # DADOS
+    # ------------------------------------------------------------------
+
+    def seed_data(self, options):
+        today = datetime.date.today()
+        span_days = 365 * options['years']
+        per_house = max(1, options['transactions'] // options['houses'])
+        target = None
+
+        for h in range(options['houses']):
+            house = House.objects.create(name=f"[bench] Casa {h}")
+            users = [
+                User.objects.create(username=f"bench_{house.pk}_{u}")
+                for u in range(3)
+            ]
+            accounts = [
+                Account.objects.create(house=house, owner=user, name=f"Conta {i}", is_shared=i % 2 == 0)
+                for i, user in enumerate(users)
+            ]
+            cards = [
+                CreditCard.objects.create(house=house, owner=user, name=f"Cartão {i}", limit_total=10000,
+                                          limit_available=10000, closing_day=5, due_day=12, is_shared=i % 2 == 1)
+                for i, user in enumerate(users)
+            ]
+            bills = [RecurringBill.objects.create(house=house, name=f"Conta fixa {i}", base_value=100, due_day=10) for i in range(5)]
+
+            invoices = []
+            for card in cards:
+                for m in range(options['years'] * 12):
+                    ref = (today.replace(day=1) - datetime.timedelta(days=30 * m)).replace(day=1)
+                    invoices.append(Invoice(card=card, reference_date=ref, status='PAID' if m > 1 else 'OPEN'))
+            invoices = Invoice.objects.bulk_create(invoices)
+
+            batch = []
+            for i in range(per_house):
+                tx_date = today - datetime.timedelta(days=random.randrange(span_days))
+                use_card = random.random() < 0.4
+                source = random.choice(cards if use_card else accounts)
+                batch.append(Transaction(
+                    house=house, description=f"Lançamento {i}", value=Decimal(random.randint(100, 50000)) / 100,
+                    type='INCOME' if random.random() < 0.2 else 'EXPENSE', date=tx_date,
+                    account=None if use_card else source,
+                    invoice=random.choice(invoices) if use_card else None,
+                    recurring_bill=random.choice(bills) if random.random() < 0.05 else None,
+                    owner=source.owner, is_shared=source.is_shared,
+                ))
+                if len(batch) >= 5000:
+                    Transaction.objects.bulk_create(batch)
+                    batch = []
+            Transaction.objects.bulk_create(batch)
+            rebuild_house_summaries(house.pk)
+
+            if target is None:
+                target = {
+                    'house': house, 'user': users[0], 'bill': bills[0],
+                    'card': cards[0], 'invoice': invoices[0],
+                    'members': [u.pk for u in users],
+                }
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        return target
+
+    # ------------------------------------------------------------------
+    # QUERIES
+    # ------------------------------------------------------------------
+
+    def queries(self, target):
+        today = datetime.date.today()
+        house, user = target['house'], target['user']
+        year_start = today.replace(day=1) - datetime.timedelta(days=335)
+        month_start = today.replace(day=1)
+
+        return {
+            'history (house, date)': Transaction.objects.filter(house=house, date__gte=year_start).values('date', 'type', 'value'),
+            'list page (visibility)': Transaction.objects.filter(house=house).filter(
+                Q(owner=user) | Q(is_shared=True, owner_id__in=target['members'])
+            ).order_by('-date', '-created_at', '-id')[:50],
+            'bill paid (bill, date)': Transaction.objects.filter(
+                recurring_bill=target['bill'], date__gte=month_start, date__year=today.year, date__month=today.month
+            ),
+            'invoice total (invoice)': Transaction.objects.filter(invoice=target['invoice']).values('invoice').annotate(total=Sum('value')),
+            'current invoice (card)': Invoice.objects.filter(card=target['card']).exclude(status='PAID').order_by('reference_date')[:1],
+        }
+
+    def evaluate(self, name, queryset):
+        if name.startswith('bill paid'):
+            return queryset.exists()
+        return list(queryset)
+
+    def run_suite(self, target, repeat):
+        timings = {}
+        for name, queryset in self.queries(target).items():
+            self.stdout.write(self.style.SQL_TABLE(f"-- {name}"))
+            self.stdout.write(queryset.explain())
+            self.evaluate(name, queryset.all())  # aquece cache
+            started = time.perf_counter()
+            for _ in range(repeat):
+                self.evaluate(name, queryset.all())
+            timings[name] = (time.perf_counter() - started) * 1000 / repeat
+            self.stdout.write(f"   {timings[name]:.3f} ms\n")
+        return timings
+
+    def run_without_indexes(self, target, repeat):
+        result = {}
+        try:
+            # DDL transacional (Postgres/SQLite): o DROP é desfeito no rollback
+            with db_transaction.atomic():
+                with connection.cursor() as cursor:
+                    for names in BENCH_INDEXES.values():
+                        for name in names:
+                            cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+                    cursor.execute('ANALYZE')
+                self.stdout.write(self.style.MIGRATE_HEADING("== SEM ÍNDICES (antes)"))
+                result = self.run_suite(target, repeat)
+                raise _Rollback
+        except _Rollback:
+            pass
+        return result
@@ -0,0 +1,29 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from core.services import close_due_invoices, recompute_card_limits
+
+
+class Command(BaseCommand):
+    help = (
+        "Fecha as faturas que já passaram do dia de fechamento do cartão e recalcula "
+        "o limite disponível de todos os cartões a partir das faturas não pagas. "
+        "Idempotente: pode rodar no cron quantas vezes quiser."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=datetime.date.fromisoformat, default=None,
+                            help="Data de referência AAAA-MM-DD (padrão: hoje)")
+        parser.add_argument('--skip-limits', action='store_true', help="Só fecha faturas")
+
+    def handle(self, *args, **options):
+        today = options['date'] or datetime.date.today()
+        closed = close_due_invoices(today)
+        self.stdout.write(f"{closed} faturas fechadas até {today:%d/%m/%Y}.")
+
+        if not options['skip_limits']:
+            changed = recompute_card_limits()
+            self.stdout.write(f"{changed} cartões com limite disponível recalculado.")
+
+        self.stdout.write(self.style.SUCCESS("Concluído."))
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importers import (
+    DEFAULT_BATCH_SIZE, PARSERS, StatementImportError,
+    detect_format, import_statement, open_text_stream
+)
+from core.models import Account
+
+
+class Command(BaseCommand):
+    help = "Importa um extrato bancário (CSV ou OFX) para uma conta, em lotes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Caminho do arquivo CSV/OFX")
+        parser.add_argument('--account', type=int, required=True, help="ID da conta de destino")
+        parser.add_argument('--format', choices=sorted(PARSERS), help="Força o formato (padrão: pela extensão)")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--encoding', default='utf-8-sig')
+
+    def handle(self, *args, **options):
+        try:
+            account = Account.objects.get(pk=options['account'])
+        except Account.DoesNotExist:
+            raise CommandError(f"Conta {options['account']} não encontrada.")
+
+        fmt = options['format'] or detect_format(options['path'])
+        started = time.monotonic()
+
+        try:
+            with open(options['path'], 'rb') as raw:
+                summary = import_statement(
+                    account, open_text_stream(raw, options['encoding']),
+                    fmt=fmt, batch_size=options['batch_size']
+                )
+        except OSError as e:
+            raise CommandError(str(e))
+        except StatementImportError as e:
+            raise CommandError(f"Extrato inválido: {e}")
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['created']} lançamentos importados em {account.name} "
+            f"(receitas R$ {summary['income']}, despesas R$ {summary['expense']}, "
+            f"líquido R$ {summary['net']}) em {elapsed:.1f}s."
+        ))
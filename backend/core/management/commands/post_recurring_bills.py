@@ -0,0 +1,47 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.services import post_due_recurring_bills
+
+
+class Command(BaseCommand):
+    help = (
+        "Lança como despesa, debitando a conta de débito automático, as contas fixas "
+        "ativas que já venceram no mês e ainda não têm transação no mês, em todas as "
+        "casas. Contas fixas sem conta de débito não são lançadas; sem saldo, ficam para "
+        "a próxima execução. Idempotente por conta e mês. "
+        "Com --every, fica rodando e repete o lançamento a cada N segundos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=datetime.date.fromisoformat, default=None,
+                            help="Data de referência AAAA-MM-DD (padrão: hoje)")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--every', type=int, default=None, metavar='SEGUNDOS',
+                            help="Agendador no próprio processo: repete a cada N segundos")
+
+    def handle(self, *args, **options):
+        if options['every'] is None:
+            self.run_once(options['date'], options['batch_size'])
+            return
+
+        self.stdout.write(f"Agendador iniciado: lançamento a cada {options['every']}s (Ctrl+C para parar).")
+        try:
+            while True:
+                # Sem --date a referência acompanha o relógio a cada execução
+                self.run_once(options['date'], options['batch_size'])
+                time.sleep(options['every'])
+        except KeyboardInterrupt:
+            self.stdout.write("Agendador encerrado.")
+
+    def run_once(self, date, batch_size):
+        today = date or datetime.date.today()
+        started = time.perf_counter()
+        created, skipped = post_due_recurring_bills(today, batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f"{created} contas fixas lançadas até {today:%d/%m/%Y} ({time.perf_counter() - started:.2f}s)."
+        ))
+        if skipped:
+            self.stdout.write(self.style.WARNING(f"{skipped} contas fixas sem saldo na conta de débito."))
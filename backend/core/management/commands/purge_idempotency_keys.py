@@ -0,0 +1,30 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.idempotency import get_ttl_hours
+from core.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Remove chaves de idempotência mais antigas que o TTL (padrão: IDEMPOTENCY_KEY_TTL_HOURS)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=None, help="Sobrescreve o TTL em horas")
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        hours = options['hours'] if options['hours'] is not None else get_ttl_hours()
+        cutoff = timezone.now() - datetime.timedelta(hours=hours)
+        expired = IdempotencyKey.objects.filter(created_at__lt=cutoff)
+
+        # Apaga em lotes para não segurar locks numa tabela grande
+        total = 0
+        while True:
+            ids = list(expired.values_list('pk', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            total += IdempotencyKey.objects.filter(pk__in=ids).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f"{total} chaves expiradas removidas (TTL {hours}h)."))
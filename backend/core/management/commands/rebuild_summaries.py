@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core.models import House
+from core.summaries import rebuild_house_summaries
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula a tabela MonthlySummary a partir das transações, casa por casa "
+        "(cada casa numa transação própria). Use para corrigir divergências."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--house', type=int, action='append', help="ID da casa (pode repetir). Padrão: todas")
+
+    def handle(self, *args, **options):
+        houses = House.objects.order_by('pk')
+        if options['house']:
+            houses = houses.filter(pk__in=options['house'])
+
+        total_houses = total_rows = 0
+        for house_id in houses.values_list('pk', flat=True).iterator():
+            total_rows += rebuild_house_summaries(house_id)
+            total_houses += 1
+
+        self.stdout.write(self.style.SUCCESS(f"{total_rows} linhas de resumo recalculadas em {total_houses} casas."))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from core.invoice_totals import reconcile_invoices
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula Invoice.value de todas as faturas a partir das transações "
+        "(uma consulta agregada + bulk_update) e informa a divergência corrigida."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Só informa, sem gravar")
+
+    def handle(self, *args, **options):
+        fixed, drift = reconcile_invoices(batch_size=options['batch_size'], dry_run=options['dry_run'])
+        verb = "divergentes" if options['dry_run'] else "corrigidas"
+        self.stdout.write(self.style.SUCCESS(f"{fixed} faturas {verb} (diferença total R$ {drift:.2f})."))
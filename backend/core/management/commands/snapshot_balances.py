@@ -0,0 +1,22 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from core.ledger import take_snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        "Grava o saldo de cada conta ao fim dos meses já fechados (AccountSnapshot), "
+        "a partir do extrato. Só cria os que faltam: pode rodar no cron todo dia."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=datetime.date.fromisoformat, default=None,
+                            help="Data de referência AAAA-MM-DD (padrão: hoje); fecha os meses anteriores")
+        parser.add_argument('--account', type=int, action='append', dest='accounts',
+                            help="ID da conta (pode repetir). Padrão: todas.")
+
+    def handle(self, *args, **options):
+        created = take_snapshots(until=options['date'], account_ids=options['accounts'])
+        self.stdout.write(self.style.SUCCESS(f"{created} snapshots de saldo criados."))
@@ -0,0 +1,75 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.verification import house_shards, verify_shard
+
+
+def _init_worker():
+    # Processos novos (spawn) precisam carregar o Django; com fork é um no-op.
+    # Cada processo abre a própria conexão com o banco.
+    import django
+    django.setup()
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Confere Account.balance (abertura do extrato + transações da conta + ajustes "
+        "manuais), Invoice.value (transações) e CreditCard.limit_available (faturas não "
+        "pagas) de todas as casas, em lotes de casas distribuídos entre processos. Contas "
+        "com ajuste manual de saldo são informadas como suspeitas, nunca revertidas. "
+        "Com --fix, grava os valores esperados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Processos em paralelo (1 = no próprio processo)")
+        parser.add_argument('--shard-size', type=int, default=500, help="Casas por lote")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Linhas por bulk_update")
+        parser.add_argument('--fix', action='store_true', help="Corrige as divergências (padrão: só informa)")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        shards = house_shards(options['shard_size'])
+        fix, batch_size = options['fix'], options['batch_size']
+        workers = max(1, min(options['workers'], len(shards)))
+        self.stdout.write(f"{len(shards)} lotes de casas, {workers} processo(s).")
+
+        totals = {'accounts': 0, 'suspects': 0, 'invoices': 0, 'cards': 0, 'drift': Decimal('0.00')}
+        if workers == 1:
+            for shard in shards:
+                self.report(verify_shard(*shard, fix=fix, batch_size=batch_size), totals)
+        else:
+            # Os filhos não podem herdar a conexão aberta do processo pai
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                futures = [pool.submit(verify_shard, *shard, fix=fix, batch_size=batch_size) for shard in shards]
+                for future in as_completed(futures):
+                    self.report(future.result(), totals)
+
+        verb = "corrigidos" if fix else "divergentes"
+        summary = (
+            f"{totals['accounts']} saldos de conta, {totals['invoices']} faturas e {totals['cards']} "
+            f"limites de cartão {verb} (diferença total R$ {totals['drift']:.2f}) "
+            f"em {time.perf_counter() - started:.2f}s."
+        )
+        clean = fix or not (totals['accounts'] or totals['invoices'] or totals['cards'])
+        self.stdout.write((self.style.SUCCESS if clean else self.style.WARNING)(summary))
+        if totals['suspects']:
+            self.stdout.write(self.style.WARNING(
+                f"{totals['suspects']} conta(s) com ajuste manual de saldo sem transação (suspeitas, "
+                f"não corrigidas): confira se as edições de saldo foram intencionais."
+            ))
+
+    def report(self, result, totals):
+        for key in totals:
+            totals[key] += result[key]
+        first, last = result['houses']
+        self.stdout.write(
+            f"  casas {first}-{last}: {result['accounts']} contas ({result['suspects']} suspeitas), "
+            f"{result['invoices']} faturas, "
+            f"{result['cards']} cartões ({result['seconds']:.2f}s)"
+        )
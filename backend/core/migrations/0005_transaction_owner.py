@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-17 03:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_transaction_created_at_transaction_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='owner',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='owned_transactions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['house', 'owner', 'is_shared', 'date'], name='core_tx_visibility_idx'),
+        ),
+    ]
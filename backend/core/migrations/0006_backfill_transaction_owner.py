@@ -0,0 +1,42 @@
+# Generated by Django 6.0 on 2026-10-17 03:52
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+BATCH_SIZE = 5000
+
+
+def backfill_owner(apps, schema_editor):
+    """
+    Preenche Transaction.owner em lotes por faixa de ID, com um UPDATE por lote
+    (sem carregar as linhas em memória nem travar a tabela inteira).
+    """
+    Transaction = apps.get_model('core', 'Transaction')
+    Account = apps.get_model('core', 'Account')
+    Invoice = apps.get_model('core', 'Invoice')
+
+    account_owner = Account.objects.filter(pk=OuterRef('account_id')).values('owner_id')[:1]
+    card_owner = Invoice.objects.filter(pk=OuterRef('invoice_id')).values('card__owner_id')[:1]
+
+    last = Transaction.objects.order_by('-pk').values_list('pk', flat=True).first()
+    if last is None:
+        return
+
+    for start in range(0, last + 1, BATCH_SIZE):
+        batch = Transaction.objects.filter(pk__gte=start, pk__lt=start + BATCH_SIZE, owner__isnull=True)
+        # Conta tem prioridade sobre o cartão (mesma regra de Transaction.save)
+        batch.filter(account__isnull=False).update(owner_id=Subquery(account_owner))
+        batch.filter(account__isnull=True, invoice__isnull=False).update(owner_id=Subquery(card_owner))
+
+
+class Migration(migrations.Migration):
+    # Cada lote é commitado separadamente, evitando um lock longo na tabela
+    atomic = False
+
+    dependencies = [
+        ('core', '0005_transaction_owner'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_owner, migrations.RunPython.noop),
+    ]
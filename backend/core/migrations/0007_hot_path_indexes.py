@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-17 03:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_backfill_transaction_owner'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['card', 'status', 'reference_date'], name='core_inv_card_status_ref_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['house', 'date', 'created_at', 'id'], name='core_tx_house_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['recurring_bill', 'date'], name='core_tx_bill_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['invoice', 'value'], name='core_tx_invoice_value_idx'),
+        ),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 6.0 on 2026-10-17 04:10
+
+from django.db import migrations
+
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS core_tx_desc_trgm_idx ON core_transaction USING gin (description gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS core_txitem_desc_trgm_idx ON core_transactionitem USING gin (description gin_trgm_ops)",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS core_txitem_desc_trgm_idx",
+    "DROP INDEX IF EXISTS core_tx_desc_trgm_idx",
+]
+
+# Tabelas FTS5 "sombra": rowid = id da linha de origem, sincronizadas por triggers
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE core_transaction_fts USING fts5(description, tokenize='trigram')",
+    """CREATE TRIGGER core_transaction_fts_ai AFTER INSERT ON core_transaction BEGIN
+        INSERT INTO core_transaction_fts(rowid, description) VALUES (new.id, new.description);
+    END""",
+    """CREATE TRIGGER core_transaction_fts_ad AFTER DELETE ON core_transaction BEGIN
+        DELETE FROM core_transaction_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER core_transaction_fts_au AFTER UPDATE OF description ON core_transaction BEGIN
+        UPDATE core_transaction_fts SET description = new.description WHERE rowid = old.id;
+    END""",
+    "INSERT INTO core_transaction_fts(rowid, description) SELECT id, description FROM core_transaction",
+
+    "CREATE VIRTUAL TABLE core_transactionitem_fts USING fts5(description, transaction_id UNINDEXED, tokenize='trigram')",
+    """CREATE TRIGGER core_transactionitem_fts_ai AFTER INSERT ON core_transactionitem BEGIN
+        INSERT INTO core_transactionitem_fts(rowid, description, transaction_id)
+        VALUES (new.id, new.description, new.transaction_id);
+    END""",
+    """CREATE TRIGGER core_transactionitem_fts_ad AFTER DELETE ON core_transactionitem BEGIN
+        DELETE FROM core_transactionitem_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER core_transactionitem_fts_au AFTER UPDATE OF description, transaction_id ON core_transactionitem BEGIN
+        UPDATE core_transactionitem_fts SET description = new.description, transaction_id = new.transaction_id
+        WHERE rowid = old.id;
+    END""",
+    """INSERT INTO core_transactionitem_fts(rowid, description, transaction_id)
+        SELECT id, description, transaction_id FROM core_transactionitem""",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS core_transactionitem_fts_au",
+    "DROP TRIGGER IF EXISTS core_transactionitem_fts_ad",
+    "DROP TRIGGER IF EXISTS core_transactionitem_fts_ai",
+    "DROP TABLE IF EXISTS core_transactionitem_fts",
+    "DROP TRIGGER IF EXISTS core_transaction_fts_au",
+    "DROP TRIGGER IF EXISTS core_transaction_fts_ad",
+    "DROP TRIGGER IF EXISTS core_transaction_fts_ai",
+    "DROP TABLE IF EXISTS core_transaction_fts",
+]
+
+STATEMENTS = {
+    'postgresql': (POSTGRES_FORWARD, POSTGRES_BACKWARD),
+    'sqlite': (SQLITE_FORWARD, SQLITE_BACKWARD),
+}
+
+
+def _pg_trgm_available(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def _run(schema_editor, backward):
+    vendor = schema_editor.connection.vendor
+    statements = STATEMENTS.get(vendor)
+    if not statements:
+        return
+    # Sem a extensão no servidor, a busca usa o fallback (icontains)
+    if vendor == 'postgresql' and not backward and not _pg_trgm_available(schema_editor):
+        return
+    for sql in statements[1 if backward else 0]:
+        schema_editor.execute(sql)
+
+
+def create_search_structures(apps, schema_editor):
+    _run(schema_editor, backward=False)
+
+
+def drop_search_structures(apps, schema_editor):
+    _run(schema_editor, backward=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_structures, drop_search_structures),
+    ]
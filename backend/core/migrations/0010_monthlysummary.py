@@ -0,0 +1,49 @@
+# Generated by Django 6.0 on 2026-10-17 09:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def populate_summaries(apps, schema_editor):
+    """Carga inicial: um GROUP BY por casa, gravado com bulk_create."""
+    House = apps.get_model('core', 'House')
+    Transaction = apps.get_model('core', 'Transaction')
+    MonthlySummary = apps.get_model('core', 'MonthlySummary')
+
+    for house_id in House.objects.values_list('pk', flat=True).iterator():
+        rows = Transaction.objects.filter(house_id=house_id).annotate(month=TruncMonth('date')).values(
+            'month', 'type', 'category_id'
+        ).annotate(total=Sum('value'), count=Count('id')).order_by()
+        MonthlySummary.objects.bulk_create([
+            MonthlySummary(house_id=house_id, month=row['month'], type=row['type'],
+                           category_id=row['category_id'], total=row['total'], count=row['count'])
+            for row in rows
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('type', models.CharField(choices=[('INCOME', 'Receita'), ('EXPENSE', 'Despesa')], max_length=10)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='monthly_summaries', to='core.category')),
+                ('house', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_summaries', to='core.house')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('category__isnull', False)), fields=('house', 'month', 'type', 'category'), name='core_summary_key_uniq'), models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('house', 'month', 'type'), name='core_summary_key_nocat_uniq')],
+            },
+        ),
+        migrations.RunPython(populate_summaries, migrations.RunPython.noop),
+    ]
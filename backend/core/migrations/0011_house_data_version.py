@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 10:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_monthlysummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='house',
+            name='data_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
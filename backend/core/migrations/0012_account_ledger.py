@@ -0,0 +1,73 @@
+# Generated by Django 6.0 on 2026-10-17 11:20
+
+from decimal import Decimal
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Case, F, Sum, When
+
+
+def opening_entries(apps, schema_editor):
+    """
+    Contas existentes abrem o extrato com o saldo atual (hoje) dividido em duas
+    linhas: o líquido das transações já lançadas na conta e a abertura, o resto.
+    Assim a abertura + todas as transações da conta continuam dando o saldo
+    (é o que a verificação de saldos confere).
+    """
+    Account = apps.get_model('core', 'Account')
+    AccountLedgerEntry = apps.get_model('core', 'AccountLedgerEntry')
+    Transaction = apps.get_model('core', 'Transaction')
+
+    net = dict(
+        Transaction.objects.filter(account__isnull=False).values('account_id').annotate(
+            total=Sum(Case(When(type='INCOME', then=F('value')), default=-F('value')))
+        ).order_by().values_list('account_id', 'total')
+    )
+    entries = []
+    for account_id, balance in Account.objects.values_list('pk', 'balance').iterator():
+        # No SQLite a soma vem em ponto flutuante: arredonda em centavos
+        prior = Decimal(str(net.get(account_id) or 0)).quantize(Decimal('0.01'))
+        if prior:
+            entries.append(AccountLedgerEntry(account_id=account_id, delta=prior, description='Transações anteriores'))
+        if balance - prior:
+            entries.append(AccountLedgerEntry(account_id=account_id, delta=balance - prior, description='Saldo de abertura'))
+    AccountLedgerEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_house_data_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(default=django.utils.timezone.localdate)),
+                ('delta', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('description', models.CharField(blank=True, max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='core.account')),
+                ('transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='core.transaction')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['account', 'date', 'delta'], name='core_ledger_account_date_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='AccountSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='core.account')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('account', 'date'), name='core_snapshot_account_date_uniq')],
+            },
+        ),
+        migrations.RunPython(opening_entries, migrations.RunPython.noop),
+    ]
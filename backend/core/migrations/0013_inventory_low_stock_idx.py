@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-17 12:05
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def add_missing_low_stock_items(apps, schema_editor):
+    """
+    A lista era completada a cada GET; agora só nas escritas de estoque.
+    Carga inicial: itens em falta que ainda não estão na lista, em bulk_create.
+    """
+    InventoryItem = apps.get_model('core', 'InventoryItem')
+    ShoppingList = apps.get_model('core', 'ShoppingList')
+
+    listed = set(ShoppingList.objects.values_list('house_id', 'product_id'))
+    missing = []
+    for house_id, product_id, quantity, min_quantity, price in InventoryItem.objects.filter(
+        quantity__lt=F('min_quantity')
+    ).values_list('house_id', 'product_id', 'quantity', 'min_quantity', 'product__estimated_price').iterator():
+        if (house_id, product_id) not in listed:
+            missing.append(ShoppingList(
+                house_id=house_id, product_id=product_id, quantity_to_buy=min_quantity - quantity,
+                real_unit_price=price, discount_unit_price=price, is_purchased=False,
+            ))
+    ShoppingList.objects.bulk_create(missing, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_account_ledger'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=models.Index(condition=models.Q(('quantity__lt', models.F('min_quantity'))), fields=['house', 'product', 'quantity', 'min_quantity'], name='core_inv_low_stock_idx'),
+        ),
+        migrations.RunPython(add_missing_low_stock_items, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-17 14:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_inventory_low_stock_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recurringbill',
+            name='account',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='recurring_bills', to='core.account', verbose_name='Conta de débito automático'),
+        ),
+    ]
@@ -1,17 +1,27 @@
-from django.db import models
+from django.db import models, transaction as db_transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
-from datetime import date
+from datetime import date, datetime
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from decimal import Decimal
+from django.core.serializers.json import DjangoJSONEncoder
+from decimal import Decimal, ROUND_HALF_UP
 import uuid
 
+CENT = Decimal('0.01')
+
+
+def money(value):
+    """Valor em centavos, como fica gravado nos DecimalField(decimal_places=2)."""
+    return Decimal(str(value)).quantize(CENT, rounding=ROUND_HALF_UP)
+
 # --- GESTÃO DA CASA (MULTI-TENANCY) ---
 
 class House(models.Model):
     name = models.CharField(max_length=100, verbose_name="Nome da Casa")
     created_at = models.DateTimeField(auto_now_add=True)
+    # Incrementado a cada escrita nos dados da casa (chave do cache de respostas)
+    data_version = models.PositiveBigIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.name
@@ -56,6 +66,22 @@ class Account(models.Model):
     def __str__(self):
         return f"{self.name} - R$ {self.balance}"
 
+    def save(self, *args, **kwargs):
+        # Saldo gravado direto (saldo inicial, edição da conta) também entra no
+        # extrato, para que a soma do extrato continue igual ao saldo
+        with db_transaction.atomic():
+            previous = None
+            if not self._state.adding:
+                previous = Account.objects.filter(pk=self.pk).values_list('balance', flat=True).first()
+            super().save(*args, **kwargs)
+            delta = money(self.balance) - money(previous or 0)
+            if delta:
+                from .ledger import record_entries
+                record_entries([AccountLedgerEntry(
+                    account=self, delta=delta,
+                    description='Saldo inicial' if previous is None else 'Ajuste manual de saldo',
+                )])
+
 class CreditCard(models.Model):
     house = models.ForeignKey(House, on_delete=models.CASCADE, related_name='credit_cards')
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='owned_cards')
@@ -80,6 +106,12 @@ class Invoice(models.Model):
     # NOVO CAMPO: Para controlar pagamentos parciais
     amount_paid = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
 
+    class Meta:
+        indexes = [
+            # Fatura atual do cartão: card + status != PAID, ordenado por reference_date
+            models.Index(fields=['card', 'status', 'reference_date'], name='core_inv_card_status_ref_idx'),
+        ]
+
     def __str__(self):
         return f"{self.card.name} - {self.status}"
 
@@ -90,6 +122,9 @@ class RecurringBill(models.Model):
     due_day = models.IntegerField(verbose_name="Dia de Vencimento")
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
     is_active = models.BooleanField(default=True)
+    # Débito automático (post_recurring_bills): sem conta, a conta fixa é paga à mão
+    account = models.ForeignKey(Account, on_delete=models.SET_NULL, null=True, blank=True,
+                                related_name='recurring_bills', verbose_name="Conta de débito automático")
 
     def __str__(self):
         return self.name
@@ -120,6 +155,29 @@ class Transaction(models.Model):
     invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, null=True, blank=True, related_name='transactions')
     recurring_bill = models.ForeignKey(RecurringBill, on_delete=models.SET_NULL, null=True, blank=True, related_name='transactions')
 
+    # Dono efetivo (desnormalizado): dono da conta ou do cartão da fatura.
+    # Permite filtrar a visibilidade sem JOIN em conta/fatura/cartão nem DISTINCT.
+    owner = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='owned_transactions')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['house', 'owner', 'is_shared', 'date'], name='core_tx_visibility_idx'),
+            # Histórico por período e ordenação/paginação (date, created_at, id)
+            models.Index(fields=['house', 'date', 'created_at', 'id'], name='core_tx_house_date_idx'),
+            # "Conta fixa paga no mês?"
+            models.Index(fields=['recurring_bill', 'date'], name='core_tx_bill_date_idx'),
+            # Soma da fatura direto do índice (covering), sem visitar a tabela
+            models.Index(fields=['invoice', 'value'], name='core_tx_invoice_value_idx'),
+        ]
+
+    def resolve_owner(self):
+        """Retorna o dono efetivo a partir da conta ou do cartão (via fatura)."""
+        if self.account:
+            return self.account.owner
+        if self.invoice and self.invoice.card:
+            return self.invoice.card.owner
+        return None
+
     def save(self, *args, **kwargs):
         # 1. Verifica se é uma criação nova (não tem ID ainda)
         is_new = self.pk is None
@@ -133,9 +191,134 @@ class Transaction(models.Model):
             # Prioridade 2: Herdar do Cartão de Crédito (via Fatura)
             elif self.invoice and self.invoice.card:
                 self.is_shared = self.invoice.card.is_shared
+
+        # 3. Dono efetivo sempre acompanha a origem atual (conta ou cartão).
+        #    Sem origem (ex.: conta fixa lançada automaticamente) mantém o dono gravado.
+        if self.account or self.invoice:
+            self.owner = self.resolve_owner()
         
-        # 3. Salva a transação no banco
-        super().save(*args, **kwargs)
+        # 4. Salva a transação e ajusta o resumo mensal e o total da fatura
+        #    na mesma transação de banco
+        from .summaries import record_transaction_change
+        from .invoice_totals import record_invoice_change
+        if self.value is not None:
+            self.value = money(self.value)
+        with db_transaction.atomic():
+            if not self._state.adding and self._summary_snapshot is None:
+                self._load_snapshots()
+            super().save(*args, **kwargs)
+            record_transaction_change(self._summary_snapshot, self.summary_key())
+            record_invoice_change(self._invoice_snapshot, self.invoice_key())
+        self._summary_snapshot = self.summary_key()
+        self._invoice_snapshot = self.invoice_key()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Guarda as chaves como vieram do banco, para desfazer no próximo save().
+        # Com campos adiados (only/defer) a leitura fica para o save().
+        if not instance.get_deferred_fields() & cls.SNAPSHOT_FIELDS:
+            instance._summary_snapshot = instance.summary_key()
+            instance._invoice_snapshot = instance.invoice_key()
+        return instance
+
+    SNAPSHOT_FIELDS = {'house_id', 'date', 'type', 'category_id', 'value', 'invoice_id'}
+
+    def _load_snapshots(self):
+        stored = Transaction.objects.filter(pk=self.pk).first()
+        if stored is not None:
+            self._summary_snapshot = stored._summary_snapshot
+            self._invoice_snapshot = stored._invoice_snapshot
+
+    _summary_snapshot = None
+    _invoice_snapshot = None
+
+    def invoice_key(self):
+        """(invoice_id, valor) somado em Invoice.value; None se não está em fatura."""
+        if not self.invoice_id or self.value is None:
+            return None
+        return (self.invoice_id, money(self.value))
+
+    def summary_key(self):
+        """(house_id, mês, tipo, category_id, valor) usado no MonthlySummary."""
+        tx_date = self.date
+        if isinstance(tx_date, str):
+            tx_date = date.fromisoformat(tx_date)
+        elif isinstance(tx_date, datetime):
+            tx_date = tx_date.date()
+        if tx_date is None or self.value is None:
+            return None
+        return (self.house_id, tx_date.replace(day=1), self.type, self.category_id, money(self.value))
+
+class MonthlySummary(models.Model):
+    """
+    Total e quantidade de transações por (casa, mês, tipo, categoria).
+    Mantido incrementalmente por core.summaries a cada escrita de Transaction;
+    os gráficos leem estas poucas linhas em vez de varrer as transações.
+    Reparo: manage.py rebuild_summaries.
+    """
+    house = models.ForeignKey(House, on_delete=models.CASCADE, related_name='monthly_summaries')
+    month = models.DateField()  # sempre o dia 1
+    type = models.CharField(max_length=10, choices=Transaction.TYPES)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True, related_name='monthly_summaries')
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['house', 'month', 'type', 'category'], condition=models.Q(category__isnull=False),
+                name='core_summary_key_uniq',
+            ),
+            models.UniqueConstraint(
+                fields=['house', 'month', 'type'], condition=models.Q(category__isnull=True),
+                name='core_summary_key_nocat_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.house_id} {self.month:%Y-%m} {self.type}: {self.total}"
+
+class AccountLedgerEntry(models.Model):
+    """
+    Extrato da conta (só inserções): cada alteração de Account.balance gera uma
+    linha com o delta. Escrito por core.services (débitos/créditos) e por
+    Account.save() (saldo inicial e ajustes manuais). Ver core.ledger.
+    """
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='ledger_entries')
+    date = models.DateField(default=timezone.localdate)
+    delta = models.DecimalField(max_digits=12, decimal_places=2)
+    description = models.CharField(max_length=100, blank=True)
+    transaction = models.ForeignKey(Transaction, on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entries')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Saldo em uma data: soma do trecho depois do último snapshot
+            models.Index(fields=['account', 'date', 'delta'], name='core_ledger_account_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.account_id} {self.date}: {self.delta}"
+
+
+class AccountSnapshot(models.Model):
+    """
+    Saldo da conta ao fim de date (todas as linhas do extrato com data <= date).
+    Criado por mês fechado (manage.py snapshot_balances) e apagado quando chega
+    uma linha com data anterior ou igual (ver core.ledger).
+    """
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='snapshots')
+    date = models.DateField()
+    balance = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'date'], name='core_snapshot_account_date_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.account_id} {self.date}: {self.balance}"
 
 # --- MÓDULO ESTOQUE ---
 
@@ -159,6 +342,14 @@ class InventoryItem(models.Model):
 
     class Meta:
         unique_together = ('house', 'product') 
+        indexes = [
+            # Itens em falta (quantity < min_quantity) da casa, sem visitar o estoque saudável
+            models.Index(
+                fields=['house', 'product', 'quantity', 'min_quantity'],
+                condition=models.Q(quantity__lt=models.F('min_quantity')),
+                name='core_inv_low_stock_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.product.name}: {self.quantity}"
@@ -170,41 +361,9 @@ class InventoryItem(models.Model):
         self.update_shopping_list()
 
     def update_shopping_list(self):
-        from .models import ShoppingList 
-
-        current_qty = Decimal(str(self.quantity))
-        min_qty = Decimal(str(self.min_quantity))
-
-        # Busca itens na lista (e remove duplicatas se houver sujeira antiga)
-        shopping_queryset = ShoppingList.objects.filter(
-            house=self.house, 
-            product=self.product
-        )
-
-        # LÓGICA ESTRITA: Só compra se for MENOR (<) que o mínimo.
-        # Se for IGUAL, considera saudável e não compra.
-        if current_qty < min_qty:
-            needed_qty = min_qty - current_qty
-            if needed_qty <= 0: needed_qty = Decimal('1')
-
-            if shopping_queryset.count() > 1:
-                shopping_queryset.delete() # Limpa duplicatas
-                ShoppingList.objects.create(
-                    house=self.house,
-                    product=self.product,
-                    quantity_to_buy=needed_qty,
-                    is_purchased=False
-                )
-            else:
-                ShoppingList.objects.update_or_create(
-                    house=self.house,
-                    product=self.product,
-                    defaults={'quantity_to_buy': needed_qty, 'is_purchased': False}
-                )
-        else:
-            # Se o estoque está OK (>=), o item NÃO deve existir na lista
-            if shopping_queryset.exists():
-                shopping_queryset.delete()
+        # Só compra se estiver ABAIXO (<) do mínimo; ver services.sync_shopping_list
+        from .services import sync_shopping_list
+        sync_shopping_list(self.house_id, [self.product_id])
 
 class ShoppingList(models.Model):
     house = models.ForeignKey(House, on_delete=models.CASCADE, related_name='shopping_list')
@@ -246,6 +405,28 @@ class HouseInvitation(models.Model):
     def __str__(self):
         return f"Convite para {self.email} ({self.house.name})"
     
+class IdempotencyKey(models.Model):
+    """
+    Resposta gravada de uma escrita feita com o header Idempotency-Key.
+    Um retry com a mesma chave devolve esta resposta sem reexecutar a escrita.
+    Limpeza periódica: manage.py purge_idempotency_keys.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=64)
+    endpoint = models.CharField(max_length=50)
+    request_hash = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField(null=True)
+    response_body = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='core_idempotency_user_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.endpoint} {self.key}"
+
 @receiver(post_save, sender=HouseMember)
 def enforce_master_role_for_creator(sender, instance, created, **kwargs):
     """
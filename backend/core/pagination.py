@@ -0,0 +1,153 @@
+import base64
+import binascii
+import datetime
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class TransactionCursorPagination(BasePagination):
+    """
+    Paginação por cursor (keyset) sobre (date, created_at, id), sempre em ordem decrescente.
+    O custo de qualquer página é o mesmo, independente do tamanho do histórico:
+    nunca usamos OFFSET, apenas um WHERE sobre a chave da última linha vista.
+
+    Só é ativada quando o cliente envia ?cursor= ou ?page_size=. Sem esses
+    parâmetros (ou com o antigo ?limit=) a listagem continua sem paginação.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 200
+    invalid_cursor_message = 'Cursor inválido.'
+
+    def is_enabled(self, request):
+        params = request.query_params
+        if params.get('limit'):
+            return False
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_enabled(request):
+            return None
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size_value = self.get_page_size(request)
+
+        position, reverse = self.decode_cursor(request)
+
+        if reverse:
+            queryset = queryset.order_by('date', 'created_at', 'id')
+        else:
+            queryset = queryset.order_by('-date', '-created_at', '-id')
+
+        if position is not None:
+            queryset = queryset.filter(self.keyset_filter(position, reverse))
+
+        # Busca uma linha a mais para saber se existe página seguinte
+        rows = list(queryset[:self.page_size_value + 1])
+        has_more = len(rows) > self.page_size_value
+        rows = rows[:self.page_size_value]
+
+        if reverse:
+            rows.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        self.page = rows
+        return rows
+
+    def keyset_filter(self, position, reverse):
+        date, created_at, pk = position
+        op = 'gt' if reverse else 'lt'
+        return (
+            Q(**{f'date__{op}': date}) |
+            Q(date=date, **{f'created_at__{op}': created_at}) |
+            Q(date=date, created_at=created_at, **{f'id__{op}': pk})
+        )
+
+    # --- CODIFICAÇÃO DO CURSOR (OPACO PARA O CLIENTE) ---
+
+    def encode_cursor(self, obj, reverse):
+        return self.encode_position(obj.date, obj.created_at, obj.pk, reverse)
+
+    @staticmethod
+    def encode_position(date, created_at, pk, reverse=False):
+        payload = {
+            'd': date.isoformat(),
+            'c': created_at.isoformat(),
+            'i': pk,
+        }
+        if reverse:
+            payload['r'] = 1
+        raw = json.dumps(payload, separators=(',', ':')).encode('ascii')
+        return base64.urlsafe_b64encode(raw).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            position = (
+                datetime.date.fromisoformat(payload['d']),
+                datetime.datetime.fromisoformat(payload['c']),
+                int(payload['i']),
+            )
+            return position, bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, binascii.Error, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        cursor = self.encode_cursor(self.page[-1], reverse=False)
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        cursor = self.encode_cursor(self.page[0], reverse=True)
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class TransactionSearchPagination(PageNumberPagination):
+    """Resultados de busca (?q=) vêm por relevância: paginação simples por página."""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
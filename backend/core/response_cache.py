@@ -0,0 +1,120 @@
+import datetime
+import functools
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction as db_transaction
+from django.db.models import F
+from rest_framework.response import Response
+
+from .models import House
+
+# ======================================================================
+# CACHE DE RESPOSTAS POR VERSÃO DA CASA
+# ======================================================================
+# Cada casa tem um contador House.data_version. Toda escrita em dados da casa
+# (signals em signals.py + UPDATEs diretos em services.py) incrementa o
+# contador após o commit. As listagens cacheadas usam a versão na chave:
+#   (casa, versão, usuário, dia, rota, query string)
+# então uma escrita invalida tudo da casa sem precisar apagar chaves, e o que
+# ficou para trás expira pelo timeout do backend. O usuário entra na chave
+# porque contas/cartões/transações dependem da visibilidade de cada membro;
+# o dia, porque campos como "paga este mês" e a fatura atual dependem da data.
+
+CACHE_ALIAS = getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+class _PendingVersionBump:
+    """Casas alteradas na transação atual: um único UPDATE no commit."""
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.house_ids = set()
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        House.objects.filter(pk__in=self.house_ids).update(data_version=F('data_version') + 1)
+
+
+def bump_house_version(house_id):
+    """
+    Marca os dados da casa como alterados (aplicado no commit da transação atual).
+    As casas se acumulam num único on_commit por conexão e transação, por mais
+    linhas que a transação escreva (ex.: delete em cascata de centenas de transações).
+    """
+    if house_id is None:
+        return
+    connection = db_transaction.get_connection()
+    # Transação = bloco atômico mais externo (os dos testes não contam: nunca fazem commit)
+    scope = next((block for block in connection.atomic_blocks if not getattr(block, '_from_testcase', False)), None)
+    if scope is None:
+        # Fora de bloco atômico o on_commit roda na hora
+        db_transaction.on_commit(lambda: House.objects.filter(pk=house_id).update(data_version=F('data_version') + 1))
+        return
+    pending = getattr(connection, 'pending_house_versions', None)
+    # Outra transação, já executado, ou descartado no rollback de um savepoint
+    if pending is None or pending.scope is not scope or pending.done or not any(
+        callback is pending for _, callback, *_ in connection.run_on_commit
+    ):
+        pending = connection.pending_house_versions = _PendingVersionBump(scope)
+        db_transaction.on_commit(pending)
+    pending.house_ids.add(house_id)
+
+
+def _count(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def get_cache_stats():
+    with _stats_lock:
+        hits, misses = _stats['hits'], _stats['misses']
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': round(hits / total, 3) if total else None}
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats['hits'] = _stats['misses'] = 0
+
+
+def cache_house_response(view_method):
+    """
+    Decorator para list() de ViewSets da casa. Só respostas 200 são guardadas;
+    a resposta leva o header X-Cache: HIT/MISS.
+    """
+    @functools.wraps(view_method)
+    def wrapper(view, request, *args, **kwargs):
+        user = request.user
+        if not getattr(view, 'cache_list', True) or not hasattr(user, 'house_member'):
+            return view_method(view, request, *args, **kwargs)
+
+        # Versão lida do banco a cada requisição (o objeto house pode estar em memória)
+        house_id = user.house_member.house_id
+        version = House.objects.filter(pk=house_id).values_list('data_version', flat=True).first()
+        key = ':'.join((
+            'house-response', str(house_id), str(version), str(user.pk),
+            datetime.date.today().isoformat(), view.basename, request.GET.urlencode(),
+        ))
+        cache = caches[CACHE_ALIAS]
+
+        data = cache.get(key)
+        if data is not None:
+            _count('hits')
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        _count('misses')
+        response = view_method(view, request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300))
+        response['X-Cache'] = 'MISS'
+        return response
+
+    return wrapper
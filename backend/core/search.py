@@ -0,0 +1,141 @@
+from functools import lru_cache
+
+from django.db import connection
+from django.db.models import FloatField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import TransactionItem
+
+# ======================================================================
+# BUSCA TEXTUAL EM TRANSAÇÕES E ITENS
+# ======================================================================
+# Postgres: similaridade por trigramas (pg_trgm) com índices GIN em
+#   Transaction.description e TransactionItem.description.
+# SQLite: tabelas FTS5 "sombra" (tokenizer trigram) mantidas por triggers.
+# Os índices/tabelas são criados na migration 0008_transaction_search.
+# Em qualquer outro banco (ou Postgres sem pg_trgm), cai para icontains.
+
+MIN_QUERY_LENGTH = 3
+
+
+def search_transactions(queryset, query):
+    """
+    Filtra o queryset (já com a visibilidade aplicada) pelas transações cujo
+    cabeçalho ou algum item casa com a busca, ordenadas por relevância.
+    No SQLite devolve RankedSearchResults (paginável, mas não um QuerySet).
+    """
+    query = (query or '').strip()
+    if len(query) < MIN_QUERY_LENGTH:
+        return queryset.none()
+
+    if connection.vendor == 'postgresql' and _has_pg_trgm():
+        return _search_postgres(queryset, query)
+    if connection.vendor == 'sqlite':
+        return _search_sqlite(queryset, query)
+    return _search_fallback(queryset, query)
+
+
+@lru_cache(maxsize=1)
+def _has_pg_trgm():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def _search_postgres(queryset, query):
+    from django.contrib.postgres.search import TrigramWordSimilarity
+
+    # Os operadores %> (trigram_word_similar) usam os índices GIN
+    matching_items = TransactionItem.objects.filter(description__trigram_word_similar=query).values('transaction_id')
+    best_item = TransactionItem.objects.filter(transaction=OuterRef('pk')).annotate(
+        similarity=TrigramWordSimilarity(query, 'description')
+    ).order_by('-similarity').values('similarity')[:1]
+
+    return queryset.filter(
+        Q(description__trigram_word_similar=query) | Q(pk__in=matching_items)
+    ).annotate(
+        search_rank=Greatest(
+            TrigramWordSimilarity(query, 'description'),
+            Coalesce(Subquery(best_item, output_field=FloatField()), Value(0.0)),
+        )
+    ).order_by('-search_rank', '-date', '-created_at', '-id')
+
+
+def _fts_query(query):
+    # Cada termo entre aspas: o usuário não consegue injetar sintaxe do FTS5
+    terms = [term.replace('"', '""') for term in query.split()]
+    return ' '.join(f'"{term}"' for term in terms if term)
+
+
+def _search_sqlite(queryset, query):
+    match = _fts_query(query)
+    # As tabelas FTS têm as transações de todas as casas: restringe ao queryset
+    # (casa + visibilidade) dentro do próprio SQL, antes do LIMIT da página
+    visible_sql, visible_params = queryset.order_by().values('pk').query.sql_with_params()
+    # bm25: menor = mais relevante; agrupa cabeçalho e itens por transação
+    sql = f"""
+        SELECT transaction_id, MIN(score) AS score FROM (
+            SELECT rowid AS transaction_id, bm25(core_transaction_fts) AS score
+              FROM core_transaction_fts WHERE core_transaction_fts MATCH %s
+            UNION ALL
+            SELECT transaction_id, bm25(core_transactionitem_fts) AS score
+              FROM core_transactionitem_fts WHERE core_transactionitem_fts MATCH %s
+        ) WHERE transaction_id IN ({visible_sql})
+        GROUP BY transaction_id
+    """
+    return RankedSearchResults(queryset, sql, [match, match, *visible_params])
+
+
+class RankedSearchResults:
+    """
+    Resultado da busca no SQLite, paginado dentro do FTS: o Paginator pede
+    count() e uma fatia, que vira LIMIT/OFFSET sobre o ranking; só as
+    transações da página são carregadas. Sem teto de resultados.
+    """
+
+    def __init__(self, queryset, sql, params):
+        self.queryset = queryset
+        self.sql = sql
+        self.params = params
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT COUNT(*) FROM ({self.sql})", self.params)
+                self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self[key:key + 1][0]
+        if key.step is not None or (key.start or 0) < 0 or (key.stop is not None and key.stop < 0):
+            raise ValueError("RankedSearchResults só aceita fatias simples.")
+        start = key.start or 0
+        # LIMIT -1: sem limite no SQLite
+        limit = -1 if key.stop is None else max(key.stop - start, 0)
+        return self._page(limit, start)
+
+    def __iter__(self):
+        return iter(self._page(-1, 0))
+
+    def _page(self, limit, offset):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"{self.sql} ORDER BY score, transaction_id DESC LIMIT %s OFFSET %s",
+                [*self.params, limit, offset],
+            )
+            ranked_ids = [row[0] for row in cursor.fetchall()]
+        if not ranked_ids:
+            return []
+        rows = self.queryset.in_bulk(ranked_ids)
+        return [rows[pk] for pk in ranked_ids if pk in rows]
+
+
+def _search_fallback(queryset, query):
+    return queryset.filter(
+        Q(description__icontains=query) | Q(items__description__icontains=query)
+    ).distinct()
@@ -1,6 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
+from django.db.models import (
+    Case, DateField, DecimalField, F, IntegerField, OuterRef, Prefetch, Subquery, Sum, Value, When,
+    prefetch_related_objects,
+)
+from django.db.models.functions import Coalesce
 from .models import (
     House, HouseMember, Account, CreditCard, Invoice, 
     Transaction, Product, InventoryItem, ShoppingList, 
@@ -35,6 +39,7 @@ class HouseSerializer(serializers.ModelSerializer):
     class Meta:
         model = House
         fields = '__all__'
+        read_only_fields = ['data_version']
 
 class HouseMemberSerializer(serializers.ModelSerializer):
     user_name = serializers.CharField(source='user.username', read_only=True)
@@ -61,6 +66,28 @@ class AccountSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'balance', 'limit', 'is_shared', 'owner']
         read_only_fields = ['owner', 'house']
 
+def current_invoice_prefetch():
+    """
+    Prefetch da fatura atual de cada cartão (a não paga mais antiga; se todas
+    estiverem pagas, a mais recente) já com o total real das transações.
+    Uma única query para todos os cartões: cada fatura é filtrada por uma
+    subquery correlacionada que escolhe a "atual" do seu cartão.
+    """
+    current = Invoice.objects.filter(card_id=OuterRef('card_id')).annotate(
+        paid_rank=Case(When(status='PAID', then=Value(1)), default=Value(0), output_field=IntegerField()),
+        open_ref=Case(When(status='PAID', then=Value(None)), default=F('reference_date'), output_field=DateField()),
+    ).order_by('paid_rank', 'open_ref', '-reference_date').values('pk')[:1]
+
+    real_total = Transaction.objects.filter(invoice=OuterRef('pk')).values('invoice').annotate(
+        total=Sum('value')
+    ).values('total')
+
+    queryset = Invoice.objects.filter(pk=Subquery(current)).annotate(
+        real_total=Coalesce(Subquery(real_total), Value(0), output_field=DecimalField(max_digits=12, decimal_places=2))
+    )
+    return Prefetch('invoices', queryset=queryset, to_attr='current_invoices')
+
+
 class CreditCardSerializer(serializers.ModelSerializer):
     invoice_info = serializers.SerializerMethodField()
 
@@ -70,19 +97,17 @@ class CreditCardSerializer(serializers.ModelSerializer):
         read_only_fields = ['owner', 'house']
 
     def get_invoice_info(self, obj):
-        target_invoice = Invoice.objects.filter(card=obj).exclude(status='PAID').order_by('reference_date').first()
-        if not target_invoice:
-            target_invoice = Invoice.objects.filter(card=obj).order_by('-reference_date').first()
-
-        if target_invoice:
-            real_total = Transaction.objects.filter(invoice=target_invoice).aggregate(total=Sum('value'))['total'] or 0
-            if real_total != target_invoice.value:
-                target_invoice.value = real_total
-                target_invoice.save()
-
+        # Listagens já chegam com current_invoice_prefetch(); objetos avulsos
+        # (create/update/retrieve) buscam aqui, com o mesmo custo fixo.
+        # Somente leitura: Invoice.value é mantido no caminho de escrita.
+        if not hasattr(obj, 'current_invoices'):
+            prefetch_related_objects([obj], current_invoice_prefetch())
+
+        if obj.current_invoices:
+            target_invoice = obj.current_invoices[0]
             return {
                 'id': target_invoice.id,
-                'value': real_total,
+                'value': target_invoice.real_total,
                 'status': target_invoice.status,
                 'reference_date': target_invoice.reference_date,
                 'amount_paid': target_invoice.amount_paid
@@ -101,10 +126,21 @@ class RecurringBillSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = RecurringBill
-        fields = ['id', 'name', 'base_value', 'due_day', 'category', 'category_name', 'is_paid_this_month', 'is_active']
+        fields = ['id', 'name', 'base_value', 'due_day', 'category', 'category_name', 'is_paid_this_month', 'is_active',
+                  'account']
         read_only_fields = ['house']
 
+    def validate_account(self, account):
+        # Conta de débito automático precisa ser da mesma casa
+        request = self.context.get('request')
+        if account is not None and request is not None and account.house_id != request.user.house_member.house_id:
+            raise serializers.ValidationError('Conta não encontrada.')
+        return account
+
     def get_is_paid_this_month(self, obj):
+        # Listagens chegam anotadas (RecurringBillViewSet: um EXISTS para todas)
+        if hasattr(obj, 'is_paid'):
+            return obj.is_paid
         today = datetime.date.today()
         start_date = today.replace(day=1)
         return Transaction.objects.filter(
@@ -0,0 +1,362 @@
+import calendar
+from decimal import Decimal
+
+from django.db import transaction as db_transaction
+from django.db.models import Case, DecimalField, Exists, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest, Least
+
+from .ledger import record_entries
+from .models import (
+    Account, AccountLedgerEntry, CreditCard, House, InventoryItem, Invoice, RecurringBill, ShoppingList,
+    Transaction, money,
+)
+from .response_cache import bump_house_version
+from .summaries import record_bulk_create
+
+# ======================================================================
+# SALDOS E LIMITES (ATUALIZAÇÕES ATÔMICAS)
+# ======================================================================
+# Nenhuma função aqui lê o saldo para o Python e grava de volta: todas usam
+# UPDATE com F(), e as validações (saldo/limite suficiente) ficam no WHERE do
+# próprio UPDATE. Se nenhuma linha for afetada, a validação falhou.
+#
+# Quando uma operação mexe em várias contas/cartões, chame lock_sources()
+# no início do bloco atômico: ele trava só as linhas envolvidas, sempre na
+# mesma ordem (contas por id, depois cartões por id), evitando deadlocks
+# entre requisições simultâneas sem bloquear a casa inteira.
+#
+# Como UPDATEs diretos não disparam signals, cada função aqui também marca a
+# casa como alterada (bump_house_version) para invalidar o cache de respostas.
+#
+# Toda alteração de saldo de conta também grava a linha do extrato
+# (AccountLedgerEntry, ver core.ledger) com a data e a transação de origem.
+
+
+class BalanceError(Exception):
+    pass
+
+
+class InsufficientBalance(BalanceError):
+    pass
+
+
+class InsufficientLimit(BalanceError):
+    pass
+
+
+def _clean_ids(ids):
+    return sorted({int(i) for i in ids if i not in (None, '')})
+
+
+def lock_sources(account_ids=(), card_ids=()):
+    """SELECT ... FOR UPDATE nas contas e cartões informados, em ordem fixa."""
+    account_ids = _clean_ids(account_ids)
+    card_ids = _clean_ids(card_ids)
+    if account_ids:
+        list(Account.objects.select_for_update().filter(pk__in=account_ids).order_by('pk').values_list('pk', flat=True))
+    if card_ids:
+        list(CreditCard.objects.select_for_update().filter(pk__in=card_ids).order_by('pk').values_list('pk', flat=True))
+
+
+def _ledger_entry(account_id, delta, date=None, description='', transaction=None):
+    return AccountLedgerEntry(
+        account_id=account_id, delta=delta, date=date, description=description, transaction=transaction,
+    )
+
+
+def adjust_account_balance(account, delta, **ledger):
+    """
+    Soma delta (positivo ou negativo) ao saldo, sem validação.
+    ledger: date/description/transaction da linha do extrato.
+    """
+    Account.objects.filter(pk=account.pk).update(balance=F('balance') + Decimal(delta))
+    record_entries([_ledger_entry(account.pk, Decimal(delta), **ledger)])
+    bump_house_version(account.house_id)
+
+
+def credit_account(account, amount, **ledger):
+    adjust_account_balance(account, amount, **ledger)
+
+
+def debit_account(account, amount, use_limit=True, **ledger):
+    """
+    Debita se houver saldo (mais o cheque especial, se use_limit).
+    A checagem e o débito acontecem no mesmo UPDATE condicional.
+    """
+    amount = Decimal(amount)
+    floor = Value(amount) - F('limit') if use_limit else amount
+    updated = Account.objects.filter(pk=account.pk, balance__gte=floor).update(balance=F('balance') - amount)
+    if not updated:
+        raise InsufficientBalance(f'Saldo insuficiente na conta {account.name}.')
+    record_entries([_ledger_entry(account.pk, -amount, **ledger)])
+    bump_house_version(account.house_id)
+
+
+def consume_card_limit(card, amount):
+    """Reserva limite do cartão se houver limite disponível suficiente."""
+    amount = Decimal(amount)
+    if amount <= 0:
+        return
+    updated = CreditCard.objects.filter(pk=card.pk, limit_available__gte=amount).update(
+        limit_available=F('limit_available') - amount
+    )
+    if not updated:
+        raise InsufficientLimit(f'Limite indisponível no cartão {card.name}.')
+    bump_house_version(card.house_id)
+
+
+def restore_card_limit(card, amount):
+    """Devolve limite ao cartão, sem ultrapassar o limite total."""
+    CreditCard.objects.filter(pk=card.pk).update(
+        limit_available=Least(F('limit_available') + Decimal(amount), F('limit_total'))
+    )
+    bump_house_version(card.house_id)
+
+
+def adjust_account_balances(house_id, deltas, entries=None):
+    """
+    Versão em lote de adjust_account_balance: {account_id: delta} num único UPDATE.
+    entries: linhas do extrato (AccountLedgerEntry não salvas) que somam os
+    deltas; sem elas, uma linha por conta com a data de hoje.
+    """
+    accounts = []
+    for account_id, delta in deltas.items():
+        account = Account(pk=account_id)
+        account.balance = F('balance') + Decimal(delta)
+        accounts.append(account)
+    if accounts:
+        Account.objects.bulk_update(accounts, ['balance'])
+        if entries is None:
+            entries = [_ledger_entry(account_id, Decimal(delta)) for account_id, delta in deltas.items()]
+        record_entries(entries)
+        bump_house_version(house_id)
+
+
+def debit_accounts(house_id, amounts, entries=None, use_limit=True):
+    """
+    Versão em lote de debit_account: {account_id: valor}. Com as contas já
+    travadas (lock_sources), uma query aponta a conta sem saldo (mais o cheque
+    especial, se use_limit) e um único UPDATE condicional debita todas.
+    Sem saldo em alguma: InsufficientBalance (chame dentro de um bloco atômico).
+    entries: como em adjust_account_balances.
+    """
+    if not amounts:
+        return
+    money_field = DecimalField(max_digits=12, decimal_places=2)
+    amount = Case(*[When(pk=pk, then=Value(Decimal(value))) for pk, value in amounts.items()], output_field=money_field)
+    floor = amount - F('limit') if use_limit else amount
+    accounts = Account.objects.filter(pk__in=list(amounts))
+    short = accounts.filter(balance__lt=floor).values_list('name', flat=True).first()
+    if short is not None:
+        raise InsufficientBalance(f'Saldo insuficiente na conta {short}.')
+    # A condição também vai no UPDATE, como em debit_account (o bloco atômico desfaz o resto)
+    if accounts.filter(balance__gte=floor).update(balance=F('balance') - amount) != len(amounts):
+        raise InsufficientBalance('Saldo insuficiente.')
+    if entries is None:
+        entries = [_ledger_entry(account_id, -Decimal(value)) for account_id, value in amounts.items()]
+    record_entries(entries)
+    bump_house_version(house_id)
+
+
+def restore_card_limits(house_id, amounts):
+    """Versão em lote de restore_card_limit: {card_id: valor} num único UPDATE."""
+    cards = []
+    for card_id, amount in amounts.items():
+        card = CreditCard(pk=card_id)
+        card.limit_available = Least(F('limit_available') + Decimal(amount), F('limit_total'))
+        cards.append(card)
+    if cards:
+        CreditCard.objects.bulk_update(cards, ['limit_available'])
+        bump_house_version(house_id)
+
+
+# ======================================================================
+# FATURAS: FECHAMENTO E RECÁLCULO DE LIMITE (EM LOTE)
+# ======================================================================
+# Usado pelo comando close_invoices. Tudo em UPDATEs sobre conjuntos, sem
+# laço por cartão: o custo é de poucas queries para qualquer número de cartões.
+
+
+def close_due_invoices(today):
+    """
+    Fecha (OPEN -> CLOSED) as faturas cujo fechamento já passou. A fatura de
+    referência M fecha no dia closing_day de M (limitado ao último dia do mês),
+    como em get_invoice_ref_date. Retorna o número de faturas fechadas.
+    """
+    month_start = today.replace(day=1)
+    last_day = calendar.monthrange(today.year, today.month)[1]
+    # No último dia do mês fecham também os cartões com closing_day 29-31
+    closing_cutoff = 31 if today.day == last_day else today.day
+
+    due = Invoice.objects.filter(status='OPEN').filter(
+        Q(reference_date__lt=month_start) |
+        Q(reference_date=month_start, card__closing_day__lte=closing_cutoff)
+    )
+    with db_transaction.atomic():
+        House.objects.filter(pk__in=Subquery(due.values('card__house_id'))).update(data_version=F('data_version') + 1)
+        return due.update(status='CLOSED')
+
+
+def recompute_card_limits():
+    """
+    limit_available = limit_total - saldo devedor das faturas não pagas
+    (value - amount_paid, nunca negativo por fatura). Um único UPDATE com
+    subquery correlacionada, só nos cartões que divergem. Retorna quantos mudaram.
+    """
+    money_field = DecimalField(max_digits=12, decimal_places=2)
+    outstanding = Invoice.objects.filter(card=OuterRef('pk')).exclude(status='PAID').annotate(
+        owed=Greatest(F('value') - F('amount_paid'), Value(Decimal('0.00')), output_field=money_field)
+    ).values('card').annotate(total=Sum('owed')).values('total')
+    expected = F('limit_total') - Coalesce(Subquery(outstanding), Value(Decimal('0.00')), output_field=money_field)
+
+    drifted = CreditCard.objects.annotate(expected=expected).exclude(limit_available=F('expected'))
+    with db_transaction.atomic():
+        House.objects.filter(pk__in=Subquery(drifted.values('house_id'))).update(data_version=F('data_version') + 1)
+        return drifted.update(limit_available=expected)
+
+
+# ======================================================================
+# CONTAS FIXAS: LANÇAMENTO AUTOMÁTICO (EM LOTE)
+# ======================================================================
+# Usado pelo comando post_recurring_bills. Cada conta fixa ativa com conta de
+# débito automático (RecurringBill.account) que já venceu no mês e ainda não
+# tem transação no mês vira uma despesa na data de vencimento, debitada da
+# conta. Por lote de contas fixas: um SELECT (com o anti-join EXISTS das já
+# lançadas), as contas travadas uma vez, um bulk_create, um UPDATE condicional
+# dos saldos e os resumos/versões em lote. Rodar de novo no mesmo mês não lança
+# nada: a própria transação criada marca a conta fixa como paga.
+#
+# Contas fixas sem conta de débito não são lançadas (continuam com o botão de
+# pagar no dashboard). Sem saldo (mais o cheque especial) na conta, a conta fixa
+# fica de fora e é tentada de novo na próxima execução.
+
+
+def post_due_recurring_bills(today, batch_size=5000):
+    """
+    Lança e debita as contas fixas vencidas até today.
+    Retorna (transações criadas, contas fixas puladas por falta de saldo).
+    """
+    month_start = today.replace(day=1)
+    last_day = calendar.monthrange(today.year, today.month)[1]
+    # No último dia do mês vencem também as contas com due_day 29-31
+    due_cutoff = 31 if today.day == last_day else today.day
+
+    posted = Transaction.objects.filter(
+        recurring_bill=OuterRef('pk'), date__gte=month_start, date__lte=today.replace(day=last_day)
+    )
+    candidates = RecurringBill.objects.filter(
+        is_active=True, account__isnull=False, due_day__lte=due_cutoff
+    ).filter(~Exists(posted)).order_by('pk')
+
+    created, skipped, last_pk = 0, 0, 0
+    while True:
+        with db_transaction.atomic():
+            # skip_locked: duas execuções simultâneas não lançam a mesma conta
+            bills = list(
+                candidates.filter(pk__gt=last_pk).select_for_update(skip_locked=True, of=('self',)).values(
+                    'pk', 'house_id', 'name', 'base_value', 'due_day', 'category_id', 'account_id',
+                )[:batch_size]
+            )
+            if not bills:
+                break
+            last_pk = bills[-1]['pk']
+
+            account_ids = {bill['account_id'] for bill in bills}
+            lock_sources(account_ids=account_ids)
+            # Com as contas travadas, o disponível lido aqui vale até o commit
+            accounts = {
+                pk: {'funds': balance + limit, 'owner_id': owner_id, 'is_shared': is_shared}
+                for pk, balance, limit, owner_id, is_shared in Account.objects.filter(pk__in=account_ids).values_list(
+                    'pk', 'balance', 'limit', 'owner_id', 'is_shared'
+                )
+            }
+            transactions, debits = [], {}
+            for bill in bills:
+                account, value = accounts[bill['account_id']], money(bill['base_value'])
+                if value > account['funds']:
+                    skipped += 1
+                    continue
+                account['funds'] -= value
+                debits[bill['account_id']] = debits.get(bill['account_id'], Decimal(0)) + value
+                # bulk_create não chama save(): dono/privacidade vêm da conta
+                transactions.append(Transaction(
+                    house_id=bill['house_id'], description=bill['name'], value=value,
+                    date=month_start.replace(day=max(1, min(bill['due_day'], last_day))), type='EXPENSE',
+                    category_id=bill['category_id'], recurring_bill_id=bill['pk'], account_id=bill['account_id'],
+                    owner_id=account['owner_id'], is_shared=account['is_shared'],
+                ))
+            if not transactions:
+                continue
+
+            Transaction.objects.bulk_create(transactions)
+            record_bulk_create(transactions)
+            # Versões das casas vão abaixo, num UPDATE só (house_id=None: sem bump por casa)
+            debit_accounts(None, debits, entries=[
+                AccountLedgerEntry(account_id=tx.account_id, delta=-tx.value, date=tx.date,
+                                   description=tx.description, transaction=tx)
+                for tx in transactions
+            ])
+            House.objects.filter(pk__in={tx.house_id for tx in transactions}).update(
+                data_version=F('data_version') + 1
+            )
+        created += len(transactions)
+    return created, skipped
+
+
+# ======================================================================
+# LISTA DE COMPRAS: SINCRONIA COM O ESTOQUE (EM LOTE)
+# ======================================================================
+# Chamado nas escritas de estoque (InventoryItem.save, compra finalizada),
+# nunca na leitura da lista. Regra estrita: só entra na lista o que está
+# ABAIXO (<) do mínimo; igual ao mínimo é estoque saudável. Os itens em
+# falta vêm de uma query no índice parcial core_inv_low_stock_idx.
+
+
+def sync_shopping_list(house_id, product_ids=None):
+    """
+    Cria (bulk_create) e ajusta (bulk_update) os itens da lista para o que falta
+    no estoque. Itens já no carrinho (is_purchased) não são alterados.
+    Com product_ids, sincroniza só esses produtos e também tira da lista os que
+    voltaram ao mínimo; sem, percorre todo o estoque baixo da casa.
+    Retorna (criados, ajustados, removidos).
+    """
+    stock = InventoryItem.objects.filter(house_id=house_id)
+    if product_ids is None:
+        stock = stock.filter(quantity__lt=F('min_quantity'))
+    else:
+        stock = stock.filter(product_id__in=set(product_ids))
+
+    needed, prices, healthy = {}, {}, []
+    for product_id, quantity, min_quantity, price in stock.values_list(
+        'product_id', 'quantity', 'min_quantity', 'product__estimated_price'
+    ):
+        if quantity < min_quantity:
+            needed[product_id] = min_quantity - quantity
+            prices[product_id] = price
+        else:
+            healthy.append(product_id)
+
+    listed = set()
+    to_update = []
+    for item in ShoppingList.objects.filter(house_id=house_id, product_id__in=needed):
+        listed.add(item.product_id)
+        if not item.is_purchased and item.quantity_to_buy != needed[item.product_id]:
+            item.quantity_to_buy = needed[item.product_id]
+            to_update.append(item)
+    to_create = [
+        ShoppingList(
+            house_id=house_id, product_id=product_id, quantity_to_buy=quantity,
+            real_unit_price=prices[product_id], discount_unit_price=prices[product_id], is_purchased=False,
+        )
+        for product_id, quantity in needed.items() if product_id not in listed
+    ]
+
+    with db_transaction.atomic():
+        removed = 0
+        if healthy:
+            removed, _ = ShoppingList.objects.filter(house_id=house_id, product_id__in=healthy).delete()
+        ShoppingList.objects.bulk_create(to_create)
+        ShoppingList.objects.bulk_update(to_update, ['quantity_to_buy'])
+    if to_create or to_update or removed:
+        bump_house_version(house_id)
+    return len(to_create), len(to_update), removed
@@ -1,9 +1,15 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.conf import settings
 from django.core.mail import send_mail
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import House, HouseMember, HouseInvitation
+from .models import (
+    Account, Category, CreditCard, House, HouseMember, HouseInvitation, InventoryItem,
+    Invoice, Product, RecurringBill, ShoppingList, Transaction,
+)
+from .summaries import fold_category, record_bulk_delete, summaries_suspended_now
+from .response_cache import bump_house_version
+from .invoice_totals import record_invoice_bulk_delete
 
 @receiver(post_save, sender=User)
 def create_house_for_new_user(sender, instance, created, **kwargs):
@@ -24,7 +30,7 @@ def create_house_for_new_user(sender, instance, created, **kwargs):
 import threading
 from django.conf import settings
 from django.core.mail import send_mail
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 from .models import HouseInvitation
 
@@ -70,4 +76,62 @@ def send_invitation_email(sender, instance, created, **kwargs):
 
         # Dispara a thread e deixa o código seguir sua vida
         email_thread = threading.Thread(target=send_async_email)
-        email_thread.start()
\ No newline at end of file
+        email_thread.start()
+
+# Transações apagadas: chaves guardadas no pre_delete, deltas aplicados em lote
+_deleting = threading.local()
+
+@receiver(pre_delete, sender=Transaction)
+def queue_transaction_rollups(sender, instance, **kwargs):
+    if summaries_suspended_now():
+        return
+    pending = _deleting.__dict__.setdefault('transactions', {})
+    pending[instance.pk] = (
+        instance._summary_snapshot or instance.summary_key(),
+        instance._invoice_snapshot or instance.invoice_key(),
+    )
+
+@receiver(post_delete, sender=Transaction)
+def remove_transaction_from_rollups(sender, instance, **kwargs):
+    """
+    Cobre delete() da instância, de querysets e em cascata (conta, fatura...).
+    O Collector manda todos os pre_delete antes de apagar e, no primeiro
+    post_delete, as linhas do lote já foram apagadas: os resumos e as faturas
+    são ajustados ali, uma vez para o lote inteiro, na mesma transação do DELETE.
+    """
+    pending = getattr(_deleting, 'transactions', None)
+    if not pending or instance.pk not in pending:
+        return
+    _deleting.transactions = {}
+    # Sobras de um delete que falhou antes de apagar (a linha ainda existe) não contam
+    alive = set(Transaction.objects.filter(pk__in=list(pending)).values_list('pk', flat=True))
+    keys = [key for pk, key in pending.items() if pk not in alive]
+    record_bulk_delete([summary_key for summary_key, _ in keys])
+    record_invoice_bulk_delete([invoice_key for _, invoice_key in keys])
+
+@receiver(pre_delete, sender=Category)
+def fold_category_summaries(sender, instance, **kwargs):
+    fold_category(instance)
+
+# Modelos cujas escritas invalidam o cache de respostas da casa
+VERSIONED_MODELS = (
+    House, HouseMember, Category, Account, CreditCard, Invoice,
+    RecurringBill, Transaction, Product, InventoryItem, ShoppingList,
+)
+
+def _house_id_of(instance):
+    if isinstance(instance, House):
+        return instance.pk
+    if isinstance(instance, Invoice):
+        return CreditCard.objects.filter(pk=instance.card_id).values_list('house_id', flat=True).first()
+    return getattr(instance, 'house_id', None)
+
+def bump_version_on_write(sender, instance, **kwargs):
+    # Casa sendo apagada inteira: não há o que invalidar
+    if summaries_suspended_now():
+        return
+    bump_house_version(_house_id_of(instance))
+
+for _model in VERSIONED_MODELS:
+    post_save.connect(bump_version_on_write, sender=_model, dispatch_uid=f'bump_version_save_{_model.__name__}')
+    post_delete.connect(bump_version_on_write, sender=_model, dispatch_uid=f'bump_version_delete_{_model.__name__}')
@@ -0,0 +1,186 @@
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import MonthlySummary, Transaction
+from .response_cache import bump_house_version
+
+# ======================================================================
+# RESUMO MENSAL (MonthlySummary) MANTIDO INCREMENTALMENTE
+# ======================================================================
+# Cada escrita de Transaction aplica um delta (total, quantidade) na linha
+# (casa, mês, tipo, categoria) correspondente, dentro da mesma transação de
+# banco da escrita:
+#   - Transaction.save()       -> record_transaction_change (remove a chave
+#                                 antiga, soma a nova)
+#   - delete (signals.py)      -> record_bulk_delete, uma vez por lote apagado
+#   - bulk_create              -> record_bulk_create (chame logo após)
+# Queryset.update() em value/date/type/category NÃO passa por aqui: quem
+# fizer isso deve chamar rebuild_house_summaries (ou manage.py rebuild_summaries).
+
+_state = threading.local()
+
+
+@contextmanager
+def summaries_suspended():
+    """
+    Desliga a manutenção incremental na thread atual. Usado ao apagar a casa
+    inteira: os resumos vão junto na cascata, e atualizar linha a linha cada
+    transação apagada seria só custo.
+    """
+    previous = getattr(_state, 'suspended', False)
+    _state.suspended = True
+    try:
+        yield
+    finally:
+        _state.suspended = previous
+
+
+def summaries_suspended_now():
+    return getattr(_state, 'suspended', False)
+
+
+def _apply_delta(house_id, month, tx_type, category_id, total, count):
+    lookup = {'house_id': house_id, 'month': month, 'type': tx_type, 'category_id': category_id}
+    updated = MonthlySummary.objects.filter(**lookup).update(total=F('total') + total, count=F('count') + count)
+
+    if count < 0:
+        # Linha esvaziada não precisa continuar existindo
+        MonthlySummary.objects.filter(count__lte=0, **lookup).delete()
+        return
+
+    if not updated:
+        try:
+            with db_transaction.atomic():
+                MonthlySummary.objects.create(total=total, count=count, **lookup)
+        except IntegrityError:
+            # Outra requisição criou a linha entre o UPDATE e o INSERT
+            MonthlySummary.objects.filter(**lookup).update(total=F('total') + total, count=F('count') + count)
+
+
+def record_transaction_change(old_key, new_key):
+    """Chaves no formato Transaction.summary_key(); None = não existia / não existe mais."""
+    if old_key == new_key or summaries_suspended_now():
+        return
+    if old_key is not None:
+        *group, value = old_key
+        _apply_delta(*group, total=-value, count=-1)
+    if new_key is not None:
+        *group, value = new_key
+        _apply_delta(*group, total=value, count=1)
+
+
+def record_bulk_create(transactions):
+    """
+    Agrupa as transações recém-criadas por chave e aplica os deltas em lote:
+    um SELECT ... FOR UPDATE, um bulk_update e um bulk_create, qualquer que
+    seja o número de meses/categorias envolvidos (ex.: parcelas de cartão).
+    """
+    if summaries_suspended_now():
+        return
+    deltas = defaultdict(lambda: [Decimal('0.00'), 0])
+    for tx in transactions:
+        key = tx.summary_key()
+        if key is None:
+            continue
+        *group, value = key
+        deltas[tuple(group)][0] += value
+        deltas[tuple(group)][1] += 1
+        tx._summary_snapshot = key
+    _apply_deltas(deltas)
+
+
+def record_bulk_delete(keys):
+    """
+    Contrapartida de record_bulk_create para transações apagadas em lote
+    (delete em cascata de conta, fatura, membro...): chaves no formato
+    Transaction.summary_key(). As linhas esvaziadas são apagadas numa query.
+    """
+    if summaries_suspended_now():
+        return
+    deltas = defaultdict(lambda: [Decimal('0.00'), 0])
+    for key in keys:
+        if key is None:
+            continue
+        *group, value = key
+        deltas[tuple(group)][0] -= value
+        deltas[tuple(group)][1] -= 1
+    _apply_deltas(deltas)
+
+
+def _apply_deltas(deltas):
+    """{(casa, mês, tipo, categoria): [total, quantidade]} aplicados em lote."""
+    if not deltas:
+        return
+    houses, months = {group[0] for group in deltas}, {group[1] for group in deltas}
+    shrinking = any(count < 0 for _, count in deltas.values())
+
+    with db_transaction.atomic():
+        # Filtro por casas x meses (superconjunto das chaves) em vez de um OR por
+        # chave: com milhares de chaves o OR custa mais para montar que a query
+        candidates = MonthlySummary.objects.select_for_update().filter(house_id__in=houses, month__in=months)
+        existing = []
+        for row in candidates:
+            delta = deltas.pop((row.house_id, row.month, row.type, row.category_id), None)
+            if delta is None:
+                continue
+            row.total = F('total') + delta[0]
+            row.count = F('count') + delta[1]
+            existing.append(row)
+        if existing:
+            MonthlySummary.objects.bulk_update(existing, ['total', 'count'])
+        if shrinking:
+            # Linhas esvaziadas não precisam continuar existindo
+            MonthlySummary.objects.filter(house_id__in=houses, month__in=months, count__lte=0).delete()
+
+        # Sem linha para remover não há o que descontar (ex.: resumo reconstruído)
+        deltas = {group: delta for group, delta in deltas.items() if delta[1] > 0}
+        if deltas:
+            try:
+                with db_transaction.atomic():
+                    MonthlySummary.objects.bulk_create([
+                        MonthlySummary(house_id=house_id, month=month, type=tx_type,
+                                       category_id=category_id, total=total, count=count)
+                        for (house_id, month, tx_type, category_id), (total, count) in deltas.items()
+                    ])
+            except IntegrityError:
+                # Corrida na criação de alguma linha: aplica grupo a grupo
+                for group, (total, count) in deltas.items():
+                    _apply_delta(*group, total=total, count=count)
+
+
+def fold_category(category):
+    """
+    Antes de apagar uma categoria, as transações dela ficam sem categoria
+    (SET_NULL). Move os resumos dela para a linha "sem categoria" correspondente.
+    """
+    if summaries_suspended_now():
+        return
+    with db_transaction.atomic():
+        for row in MonthlySummary.objects.filter(category=category):
+            _apply_delta(row.house_id, row.month, row.type, None, row.total, row.count)
+        MonthlySummary.objects.filter(category=category).delete()
+
+
+def rebuild_house_summaries(house_id):
+    """Recalcula do zero os resumos da casa a partir das transações. Retorna o nº de linhas."""
+    rows = Transaction.objects.filter(house_id=house_id).annotate(month=TruncMonth('date')).values(
+        'month', 'type', 'category_id'
+    ).annotate(total=Sum('value'), count=Count('id')).order_by()
+
+    with db_transaction.atomic():
+        MonthlySummary.objects.filter(house_id=house_id).delete()
+        created = MonthlySummary.objects.bulk_create([
+            MonthlySummary(
+                house_id=house_id, month=row['month'], type=row['type'],
+                category_id=row['category_id'], total=row['total'], count=row['count'],
+            )
+            for row in rows
+        ])
+        bump_house_version(house_id)
+    return len(created)
@@ -1,10 +1,16 @@
-from django.test import TestCase
+import calendar
+import io
+import threading
+from unittest import skipIf
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.contrib.auth.models import User
 from .models import (
     House, HouseMember, HouseInvitation, Account, Transaction, 
-    Product, InventoryItem, ShoppingList
+    Product, InventoryItem, ShoppingList, CreditCard, Invoice
 )
 
 # ============================================================================
@@ -261,4 +267,1519 @@ class RegistrationTestCase(TestCase):
         self.assertEqual(member.house.name, "Casa de new_admin")
         
         # O papel DEVE ser MASTER (Conforme definido no models.py e signals.py)
-        self.assertEqual(member.role, 'MASTER')
\ No newline at end of file
+        self.assertEqual(member.role, 'MASTER')
+
+# ============================================================================
+# 7. PAGINAÇÃO POR CURSOR DAS TRANSAÇÕES
+# ============================================================================
+class TransactionCursorPaginationTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='cursor_user', password='123')
+        # A casa padrão é criada pelo signal de User
+        self.house = self.user.house_member.house
+        self.account = Account.objects.create(house=self.house, name="Conta", balance=0, owner=self.user)
+        self.client.force_authenticate(user=self.user)
+
+        # 7 transações, várias no mesmo dia para exercitar o desempate por created_at/id
+        for i in range(7):
+            Transaction.objects.create(
+                house=self.house, description=f"T{i}", value=10, type='EXPENSE',
+                account=self.account, date=f"2025-12-{10 + i // 3:02d}"
+            )
+
+    def test_walks_forward_and_back_without_gaps(self):
+        full = self.client.get('/api/transactions/').data
+        self.assertEqual(len(full), 7)
+        expected_ids = [t['id'] for t in full]
+
+        seen = []
+        response = self.client.get('/api/transactions/', {'page_size': 3})
+        pages = [response.data]
+        seen += [t['id'] for t in response.data['results']]
+        self.assertIsNone(response.data['previous'])
+
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            pages.append(response.data)
+            seen += [t['id'] for t in response.data['results']]
+
+        self.assertEqual(seen, expected_ids)
+        self.assertEqual(len(pages), 3)
+
+        # Volta uma página a partir da última
+        back = self.client.get(pages[-1]['previous'])
+        self.assertEqual(
+            [t['id'] for t in back.data['results']],
+            [t['id'] for t in pages[1]['results']]
+        )
+
+    def test_limit_keeps_legacy_behavior(self):
+        response = self.client.get('/api/transactions/', {'limit': 2})
+        self.assertIsInstance(response.data, list)
+        self.assertEqual(len(response.data), 2)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/transactions/', {'cursor': 'lixo'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+# ============================================================================
+# 8. VISIBILIDADE DE TRANSAÇÕES (DONO DESNORMALIZADO)
+# ============================================================================
+class TransactionVisibilityTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.alice = User.objects.create_user(username='alice', password='123')
+        self.house = self.alice.house_member.house
+
+        self.bob = User.objects.create_user(username='bob', password='123')
+        HouseMember.objects.filter(user=self.bob).update(house=self.house, role='MEMBER')
+        self.bob = User.objects.get(pk=self.bob.pk)
+
+        self.private = Account.objects.create(house=self.house, name="Privada", owner=self.alice, is_shared=False)
+        self.shared = Account.objects.create(house=self.house, name="Conjunta", owner=self.alice, is_shared=True)
+
+        Transaction.objects.create(house=self.house, description="Segredo", value=5, type='EXPENSE', account=self.private)
+        Transaction.objects.create(house=self.house, description="Luz", value=5, type='EXPENSE', account=self.shared)
+
+    def _descriptions(self, user):
+        self.client.force_authenticate(user=user)
+        return {t['description'] for t in self.client.get('/api/transactions/').data}
+
+    def test_owner_is_resolved_on_save(self):
+        self.assertEqual(set(Transaction.objects.values_list('owner', flat=True)), {self.alice.id})
+
+    def test_visibility_rules(self):
+        self.assertEqual(self._descriptions(self.alice), {"Segredo", "Luz"})
+        self.assertEqual(self._descriptions(self.bob), {"Luz"})
+
+
+# ============================================================================
+# 9. IMPORTAÇÃO DE EXTRATOS (CSV / OFX)
+# ============================================================================
+class StatementImportTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='importer', password='123')
+        self.house = self.user.house_member.house
+        self.account = Account.objects.create(house=self.house, name="Banco", balance=100, owner=self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def test_csv_upload_applies_single_net_delta(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        content = (
+            "Data;Descrição;Valor\n"
+            "01/03/2025;Salário;1.500,00\n"
+            "02/03/2025;Farmácia;-45,90\n"
+            "03/03/2025;Mercado;-254,10\n"
+        ).encode('utf-8')
+        upload = SimpleUploadedFile('extrato.csv', content, content_type='text/csv')
+
+        response = self.client.post('/api/transactions/import/', {'account': self.account.id, 'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 3)
+
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, 1300)
+        pharmacy = Transaction.objects.get(description='Farmácia')
+        self.assertEqual((pharmacy.type, pharmacy.owner_id), ('EXPENSE', self.user.id))
+
+        # Extrato importado bate com as transações da conta na verificação de saldos
+        from core.verification import verify_shard
+        self.assertEqual(verify_shard(self.house.pk, self.house.pk)['accounts'], 0)
+
+    def test_ofx_parser_streams_sgml_blocks(self):
+        import io
+        from core.importers import iter_ofx_rows
+        ofx = io.StringIO(
+            "OFXHEADER:100\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>\n"
+            "<STMTTRN>\n<TRNTYPE>DEBIT\n<DTPOSTED>20250305120000[-3:BRT]\n<TRNAMT>-12.50\n<MEMO>Padaria\n"
+            "<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20250306<TRNAMT>100.00<NAME>Pix recebido</STMTTRN>\n"
+            "</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n"
+        )
+        rows = list(iter_ofx_rows(ofx))
+        self.assertEqual([(r.description, str(r.value)) for r in rows], [('Padaria', '-12.50'), ('Pix recebido', '100.00')])
+
+    def test_amount_separators(self):
+        from decimal import Decimal
+        from core.importers import StatementImportError, parse_amount
+        for raw, expected in (('1.234,56', '1234.56'), ('1,234.56', '1234.56'), ('1234', '1234'),
+                              ('R$ -1.234.567,89', '-1234567.89'), ('-45,90', '-45.90'), ('10.5', '10.5')):
+            self.assertEqual(parse_amount(raw), Decimal(expected), raw)
+        for raw in ('1.234', '1,234', '1,2,3', '1.234.56', '12.34.56', '10,', 'abc', ''):
+            with self.assertRaises(StatementImportError, msg=raw):
+                parse_amount(raw)
+        # OFX não usa milhar: o separador é sempre o decimal
+        self.assertEqual(parse_amount('-1.234', thousands=False), Decimal('-1.234'))
+
+    def test_malformed_amount_rejects_the_file_with_the_line(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        content = "Data,Descrição,Valor\n01/03/2025,Salário,\"1,500.00\"\n02/03/2025,Farmácia,\"1,234\"\n".encode('utf-8')
+        upload = SimpleUploadedFile('extrato.csv', content, content_type='text/csv')
+        response = self.client.post('/api/transactions/import/', {'account': self.account.id, 'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Linha 3', response.data['error'])
+        self.assertFalse(Transaction.objects.filter(account=self.account).exists())
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, 100)
+
+
+# ============================================================================
+# 10. COMPRAS PARCELADAS (FATURAS EM LOTE)
+# ============================================================================
+class InstallmentInvoicesTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='parcelas', password='123')
+        self.house = self.user.house_member.house
+        self.card = CreditCard.objects.create(
+            house=self.house, owner=self.user, name="Visa",
+            limit_total=100000, limit_available=100000, closing_day=5, due_day=12
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def _buy(self, value, installments, date='2030-01-10'):
+        return self.client.post('/api/transactions/', {
+            'description': 'TV', 'value': value, 'type': 'EXPENSE', 'date': date,
+            'payment_method': 'CREDIT_CARD', 'card': self.card.id, 'installments': installments
+        }, format='json')
+
+    def test_query_count_does_not_grow_with_installments(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as two:
+            self.assertEqual(self._buy(200, 2).status_code, status.HTTP_201_CREATED)
+        with CaptureQueriesContext(connection) as twelve:
+            self.assertEqual(self._buy(1200, 12, date='2031-01-10').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(two), len(twelve))
+
+    def test_existing_invoices_are_incremented(self):
+        self._buy(300, 3)
+        self._buy(300, 3)
+        invoices = Invoice.objects.filter(card=self.card).order_by('reference_date')
+        self.assertEqual(invoices.count(), 3)
+        self.assertEqual([inv.value for inv in invoices], [200, 200, 200])
+        self.assertEqual(Transaction.objects.filter(invoice__card=self.card).count(), 6)
+
+    def test_paid_installments_use_the_rounded_value(self):
+        from decimal import Decimal
+
+        # Parcelas já vencidas entram pagas com o mesmo valor (arredondado) da transação
+        self.assertEqual(self._buy(100, 3, date='2020-01-10').status_code, status.HTTP_201_CREATED)
+        invoices = Invoice.objects.filter(card=self.card).order_by('reference_date')
+        self.assertEqual([inv.amount_paid for inv in invoices], [Decimal('33.33')] * 3)
+        self.assertEqual([inv.value for inv in invoices], [Decimal('33.33')] * 3)
+
+
+# ============================================================================
+# 11. CONCORRÊNCIA EM SALDOS E LIMITES (REQUER POSTGRES)
+# ============================================================================
+@skipIf(connection.vendor == 'sqlite', "SQLite trava o banco inteiro na escrita; rode com Postgres.")
+class ConcurrentBalanceTestCase(TransactionTestCase):
+    WORKERS = 16
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='concorrente', password='123')
+        self.house = self.user.house_member.house
+        self.account = Account.objects.create(house=self.house, name="Conta", balance=80, owner=self.user)
+        self.savings = Account.objects.create(house=self.house, name="Poupança", balance=0, owner=self.user)
+        self.card = CreditCard.objects.create(
+            house=self.house, owner=self.user, name="Visa",
+            limit_total=50, limit_available=50, closing_day=5, due_day=12
+        )
+
+    def _run_concurrently(self, payload):
+        barrier = threading.Barrier(self.WORKERS)
+        codes = []
+
+        def worker():
+            client = APIClient()
+            client.force_authenticate(user=self.user)
+            try:
+                barrier.wait()
+                codes.append(client.post('/api/transactions/', payload, format='json').status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.WORKERS)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        return codes
+
+    def test_no_lost_updates_or_overdraft(self):
+        expense = {'description': 'Café', 'value': 10, 'type': 'EXPENSE', 'date': '2030-01-10',
+                   'payment_method': 'ACCOUNT', 'account': self.account.id}
+        codes = self._run_concurrently(expense)
+        self.assertEqual(codes.count(status.HTTP_201_CREATED), 8)
+
+        income = {'description': 'Pix', 'value': 5, 'type': 'INCOME', 'date': '2030-01-10',
+                  'payment_method': 'ACCOUNT', 'account': self.savings.id}
+        self._run_concurrently(income)
+
+        self.account.refresh_from_db()
+        self.savings.refresh_from_db()
+        self.assertEqual(self.account.balance, 0)
+        self.assertEqual(self.savings.balance, 5 * self.WORKERS)
+        self.assertEqual(Transaction.objects.filter(account=self.account).count(), 8)
+
+    def test_card_limit_is_never_exceeded(self):
+        purchase = {'description': 'Livro', 'value': 10, 'type': 'EXPENSE', 'date': '2030-01-10',
+                    'payment_method': 'CREDIT_CARD', 'card': self.card.id}
+        codes = self._run_concurrently(purchase)
+        self.assertEqual(codes.count(status.HTTP_201_CREATED), 5)
+
+        self.card.refresh_from_db()
+        self.assertEqual(self.card.limit_available, 0)
+        self.assertEqual(Invoice.objects.get(card=self.card).value, 50)
+
+
+# ============================================================================
+# 12. BUSCA TEXTUAL (?q=) EM TRANSAÇÕES E ITENS
+# ============================================================================
+class TransactionSearchTestCase(TestCase):
+    def setUp(self):
+        from .models import TransactionItem
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='buscador', password='123')
+        self.house = self.user.house_member.house
+        self.account = Account.objects.create(house=self.house, name="Conta", owner=self.user)
+        self.client.force_authenticate(user=self.user)
+
+        self.pharmacy = Transaction.objects.create(house=self.house, description="Drogaria Farmacenter", value=30, type='EXPENSE', account=self.account)
+        self.market = Transaction.objects.create(house=self.house, description="Mercado", value=80, type='EXPENSE', account=self.account)
+        TransactionItem.objects.create(transaction=self.market, description="Dipirona farmacenter", value=8)
+        Transaction.objects.create(house=self.house, description="Padaria", value=12, type='EXPENSE', account=self.account)
+
+        # Transação de outra casa nunca aparece
+        other = User.objects.create_user(username='vizinho', password='123')
+        other_account = Account.objects.create(house=other.house_member.house, name="X", owner=other)
+        Transaction.objects.create(house=other.house_member.house, description="Farmacenter", value=1, type='EXPENSE', account=other_account)
+
+    def test_matches_header_and_items(self):
+        response = self.client.get('/api/transactions/', {'q': 'farmacenter'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = [t['id'] for t in response.data['results']]
+        self.assertEqual(set(ids), {self.pharmacy.id, self.market.id})
+        self.assertEqual(response.data['count'], 2)
+
+    def test_item_edits_are_searchable(self):
+        item = self.market.items.get()
+        item.description = "Shampoo"
+        item.save()
+        ids = [t['id'] for t in self.client.get('/api/transactions/', {'q': 'shampoo'}).data['results']]
+        self.assertEqual(ids, [self.market.id])
+
+    def test_every_page_is_reachable_and_other_houses_stay_out(self):
+        from django.db.models import Q
+        other = User.objects.get(username='vizinho')
+        other_account = Account.objects.get(owner=other)
+        for _ in range(5):
+            Transaction.objects.create(house=other_account.house, description="Farmacenter", value=1,
+                                       type='EXPENSE', account=other_account)
+            Transaction.objects.create(house=self.house, description="Farmacenter centro", value=5,
+                                       type='EXPENSE', account=self.account)
+
+        response = self.client.get('/api/transactions/', {'q': 'farmacenter', 'page_size': 3})
+        self.assertEqual(response.data['count'], 7)
+        ids = [t['id'] for t in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            ids += [t['id'] for t in response.data['results']]
+        self.assertEqual(len(ids), 7)
+        self.assertEqual(set(ids), set(Transaction.objects.filter(house=self.house).filter(
+            Q(description__icontains='farmacenter') | Q(items__description__icontains='farmacenter')
+        ).values_list('id', flat=True)))
+
+
+# ============================================================================
+# 13. EXPORTAÇÃO EM STREAMING (CSV / NDJSON)
+# ============================================================================
+class TransactionExportTestCase(TestCase):
+    def setUp(self):
+        from .models import TransactionItem
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='exportador', first_name='Ana', password='123')
+        self.house = self.user.house_member.house
+        self.account = Account.objects.create(house=self.house, name="Nubank", owner=self.user)
+        self.client.force_authenticate(user=self.user)
+
+        market = Transaction.objects.create(house=self.house, description="Mercado", value=30, type='EXPENSE', account=self.account, date='2025-03-10')
+        TransactionItem.objects.create(transaction=market, description="Arroz", value=20)
+        TransactionItem.objects.create(transaction=market, description="Feijão", value=10)
+        Transaction.objects.create(house=self.house, description="Salário", value=1000, type='INCOME', account=self.account, date='2025-04-05')
+
+    def _content(self, params):
+        response = self.client.get('/api/transactions/export/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_csv_with_date_range(self):
+        lines = self._content({'fmt': 'csv', 'to': '2025-03-31'}).lstrip('\ufeff').splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'date', 'description'])
+        self.assertEqual(len(lines), 2)
+        self.assertIn('Nubank', lines[1])
+        self.assertIn('Ana', lines[1])
+
+    def test_ndjson_with_flattened_items(self):
+        import json
+        rows = [json.loads(line) for line in self._content({'fmt': 'ndjson', 'items': '1'}).splitlines()]
+        self.assertEqual([r['item_description'] for r in rows], ['Arroz', 'Feijão', None])
+        self.assertEqual(rows[-1]['type'], 'INCOME')
+
+
+# ============================================================================
+# 14. IDEMPOTÊNCIA (Idempotency-Key)
+# ============================================================================
+class IdempotencyKeyTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='offline', password='123')
+        self.house = self.user.house_member.house
+        self.account = Account.objects.create(house=self.house, name="Conta", balance=100, owner=self.user)
+        self.client.force_authenticate(user=self.user)
+        self.payload = {'description': 'Feira', 'value': 30, 'type': 'EXPENSE', 'date': '2025-05-02',
+                        'payment_method': 'ACCOUNT', 'account': self.account.id}
+
+    def _post(self, key, payload=None):
+        return self.client.post('/api/transactions/', payload or self.payload, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_without_debiting_twice(self):
+        first = self._post('abc-1')
+        retry = self._post('abc-1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data['id'], first.data['id'])
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, 70)
+        self.assertEqual(Transaction.objects.filter(description='Feira').count(), 1)
+
+    def test_failed_request_can_be_retried_and_key_reuse_is_rejected(self):
+        too_expensive = dict(self.payload, value=500)
+        self.assertEqual(self._post('abc-2', too_expensive).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._post('abc-2').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self._post('abc-2', dict(self.payload, value=10)).status_code, 422)
+
+    def test_purge_command_removes_expired_keys(self):
+        import datetime
+        import io
+        from django.core.management import call_command
+        from django.utils import timezone
+        from .models import IdempotencyKey
+        self._post('velha')
+        IdempotencyKey.objects.update(created_at=timezone.now() - datetime.timedelta(hours=48))
+        call_command('purge_idempotency_keys', stdout=io.StringIO())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+# ============================================================================
+# 15. HISTÓRICO AGREGADO NO BANCO
+# ============================================================================
+class HistoryAggregationTestCase(TestCase):
+    def setUp(self):
+        import datetime
+        from django.core.cache import cache
+        cache.clear()
+        from .models import Category
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='historiador', password='123')
+        self.house = self.user.house_member.house
+        self.account = Account.objects.create(house=self.house, name="Conta", owner=self.user)
+        self.client.force_authenticate(user=self.user)
+
+        food = Category.objects.create(house=self.house, name="Alimentação")
+        today = datetime.date.today()
+        self.month = today.strftime('%Y-%m')
+        for value, tx_type, category in ((1000, 'INCOME', None), (30, 'EXPENSE', food), (20, 'EXPENSE', food), (5, 'EXPENSE', None)):
+            Transaction.objects.create(house=self.house, description="x", value=value, type=tx_type,
+                                       category=category, account=self.account, date=today)
+
+    def test_totals_and_categories(self):
+        response = self.client.get('/api/history/')
+        month = response.data[0]
+        self.assertEqual(month['id'], self.month)
+        self.assertEqual((month['income'], month['expense'], month['balance']), (1000.0, 55.0, 945.0))
+        self.assertEqual(month['chart_data'], [{'name': 'Alimentação', 'value': 50.0}, {'name': 'Geral', 'value': 5.0}])
+        self.assertNotIn('transactions', month)
+
+    def test_month_drill_down_is_paginated(self):
+        import json
+        url = f'/api/history/{self.month}/transactions/'
+        first = self.client.get(url, {'page_size': 3})
+        self.assertEqual(first.status_code, 200)
+        page = json.loads(b''.join(first.streaming_content))
+        self.assertEqual(len(page['results']), 3)
+        self.assertIsNotNone(page['next'])
+
+        second = json.loads(b''.join(self.client.get(page['next']).streaming_content))
+        self.assertEqual(len(second['results']), 1)
+        self.assertIsNone(second['next'])
+        ids = [t['id'] for t in page['results'] + second['results']]
+        self.assertEqual(len(set(ids)), 4)
+        self.assertIn('Outros', [t['category'] for t in page['results'] + second['results']])
+
+        # "previous" da 2ª página volta exatamente para a 1ª
+        self.assertIsNone(page['previous'])
+        back = json.loads(b''.join(self.client.get(second['previous']).streaming_content))
+        self.assertEqual([t['id'] for t in back['results']], [t['id'] for t in page['results']])
+        self.assertIsNotNone(back['next'])
+        self.assertIsNone(back['previous'])
+
+    def test_totals_expose_what_the_drill_down_hides(self):
+        import datetime
+        import json
+        other = User.objects.create_user(username='reservado', password='123')
+        HouseMember.objects.filter(user=other).update(house=self.house)
+        private = Account.objects.create(house=self.house, name="Particular", owner=other, is_shared=False)
+        shared = Account.objects.create(house=self.house, name="Conjunta", owner=other)
+        today = datetime.date.today()
+        Transaction.objects.create(house=self.house, description="privada", value=40, type='EXPENSE',
+                                   account=private, date=today)
+        Transaction.objects.create(house=self.house, description="dividida", value=10, type='EXPENSE',
+                                   account=shared, date=today)
+
+        month = self.client.get('/api/history/').data[0]
+        self.assertEqual((month['expense'], month['hidden_expense'], month['hidden_count']), (105.0, 40.0, 1))
+        self.assertEqual(month['hidden_income'], 0.0)
+
+        page = json.loads(b''.join(
+            self.client.get(f'/api/history/{self.month}/transactions/', {'page_size': 50}).streaming_content
+        ))
+        visible_expense = sum(float(t['value']) for t in page['results'] if t['type'] == 'EXPENSE')
+        self.assertEqual(visible_expense, month['expense'] - month['hidden_expense'])
+
+    def test_month_drill_down_rejects_bad_month(self):
+        self.assertEqual(self.client.get('/api/history/2026-13/transactions/').status_code, 400)
+
+
+# ============================================================================
+# 16. RESUMO MENSAL (MonthlySummary)
+# ============================================================================
+class MonthlySummaryTestCase(TestCase):
+    def setUp(self):
+        import datetime
+        from .models import Category
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='resumo', password='123')
+        self.house = self.user.house_member.house
+        self.account = Account.objects.create(house=self.house, name="Conta", owner=self.user, balance=1000)
+        self.category = Category.objects.create(house=self.house, name="Mercado")
+        self.client.force_authenticate(user=self.user)
+        self.today = datetime.date.today()
+
+    def summary(self):
+        from .models import MonthlySummary
+        return {
+            (row.type, row.category_id): (row.total, row.count)
+            for row in MonthlySummary.objects.filter(house=self.house)
+        }
+
+    def expected_from_transactions(self):
+        from django.db.models import Count, Sum
+        from django.db.models.functions import TruncMonth
+        rows = Transaction.objects.filter(house=self.house).annotate(month=TruncMonth('date')).values(
+            'month', 'type', 'category_id').annotate(total=Sum('value'), count=Count('id'))
+        return {(r['month'], r['type'], r['category_id']): (r['total'], r['count']) for r in rows}
+
+    def summary_by_month(self):
+        from .models import MonthlySummary
+        return {
+            (row.month, row.type, row.category_id): (row.total, row.count)
+            for row in MonthlySummary.objects.filter(house=self.house)
+        }
+
+    def test_insert_update_delete_keep_summary_in_sync(self):
+        tx = Transaction.objects.create(house=self.house, description="a", value=10, type='EXPENSE',
+                                        category=self.category, account=self.account, date=self.today)
+        Transaction.objects.create(house=self.house, description="b", value=5, type='EXPENSE',
+                                   account=self.account, date=self.today)
+        self.assertEqual(self.summary(), {('EXPENSE', self.category.pk): (10, 1), ('EXPENSE', None): (5, 1)})
+
+        tx = Transaction.objects.get(pk=tx.pk)
+        tx.value = 7
+        tx.category = None
+        tx.save()
+        self.assertEqual(self.summary(), {('EXPENSE', None): (12, 2)})
+
+        Transaction.objects.filter(house=self.house).delete()
+        self.assertEqual(self.summary(), {})
+
+    def test_installments_bulk_create_and_category_delete(self):
+        card = CreditCard.objects.create(house=self.house, owner=self.user, name="Cartão", limit_total=1000,
+                                         limit_available=1000, closing_day=5, due_day=12)
+        response = self.client.post('/api/transactions/', {
+            'description': 'TV', 'value': 300, 'type': 'EXPENSE', 'category': self.category.pk,
+            'date': self.today.isoformat(),
+            'payments': [{'method': 'CREDIT_CARD', 'id': card.pk, 'value': 300, 'installments': 3}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.summary_by_month(), self.expected_from_transactions())
+        self.assertEqual(len(self.summary_by_month()), 3)
+
+        self.category.delete()
+        self.assertEqual(self.summary_by_month(), self.expected_from_transactions())
+
+    def test_rebuild_command_repairs_drift(self):
+        from django.core.management import call_command
+        from .models import MonthlySummary
+        Transaction.objects.create(house=self.house, description="a", value=10, type='INCOME',
+                                   account=self.account, date=self.today)
+        MonthlySummary.objects.filter(house=self.house).update(total=999)
+
+        call_command('rebuild_summaries', house=[self.house.pk], stdout=io.StringIO())
+        self.assertEqual(self.summary(), {('INCOME', None): (10, 1)})
+
+    def test_cascade_delete_updates_rollups_in_constant_queries(self):
+        import datetime
+        from django.test.utils import CaptureQueriesContext
+        card = CreditCard.objects.create(house=self.house, owner=self.user, name="Cartão", limit_total=1000,
+                                         limit_available=1000, closing_day=5, due_day=12)
+        invoice = Invoice.objects.create(card=card, reference_date=self.today.replace(day=1))
+
+        def account_with(count, name):
+            account = Account.objects.create(house=self.house, name=name, owner=self.user)
+            for i in range(count):
+                Transaction.objects.create(house=self.house, description=f"{name}{i}", value=1, type='EXPENSE',
+                                           category=self.category if i % 2 else None, account=account,
+                                           date=self.today - datetime.timedelta(days=40 * (i % 3)))
+            return account
+
+        Transaction.objects.create(house=self.house, description="cartão", value=30, type='EXPENSE',
+                                   invoice=invoice, date=self.today)
+        few, many = account_with(3, 'Poucas'), account_with(30, 'Muitas')
+        with CaptureQueriesContext(connection) as few_queries:
+            few.delete()
+        with CaptureQueriesContext(connection) as many_queries:
+            many.delete()
+        self.assertEqual(len(few_queries), len(many_queries))
+        self.assertEqual(self.summary_by_month(), self.expected_from_transactions())
+
+        invoice.transactions.all().delete()
+        self.assertEqual(Invoice.objects.get(pk=invoice.pk).value, 0)
+        self.assertEqual(self.summary_by_month(), self.expected_from_transactions())
+
+
+# ============================================================================
+# 17. CACHE DE RESPOSTAS POR VERSÃO DA CASA
+# ============================================================================
+class HouseResponseCacheTestCase(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='cacheado', password='123')
+        self.house = self.user.house_member.house
+        self.account = Account.objects.create(house=self.house, name="Conta", owner=self.user, balance=100)
+        self.client.force_authenticate(user=self.user)
+
+    def test_hit_until_a_write_bumps_the_version(self):
+        from .response_cache import get_cache_stats
+        before = get_cache_stats()
+
+        first = self.client.get('/api/accounts/')
+        second = self.client.get('/api/accounts/')
+        self.assertEqual((first['X-Cache'], second['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(get_cache_stats()['hits'], before['hits'] + 1)
+
+        # O contador só muda no commit
+        with self.captureOnCommitCallbacks(execute=True):
+            created = self.client.post('/api/transactions/', {
+                'description': 'Salário', 'value': 50, 'type': 'INCOME',
+                'payment_method': 'ACCOUNT', 'account': self.account.pk,
+            }, format='json')
+        self.assertEqual(created.status_code, status.HTTP_201_CREATED)
+
+        third = self.client.get('/api/accounts/')
+        self.assertEqual(third['X-Cache'], 'MISS')
+        self.assertEqual(float(third.data[0]['balance']), 150.0)
+
+    def test_key_depends_on_user_visibility(self):
+        other = User.objects.create_user(username='visita', password='123')
+        HouseMember.objects.filter(user=other).update(house=self.house)
+        other = User.objects.get(pk=other.pk)
+        Account.objects.filter(pk=self.account.pk).update(is_shared=False)
+
+        self.assertEqual(self.client.get('/api/accounts/')['X-Cache'], 'MISS')
+        self.client.force_authenticate(user=other)
+        response = self.client.get('/api/accounts/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data, [])
+
+    def version(self):
+        return House.objects.get(pk=self.house.pk).data_version
+
+    def test_one_bump_per_house_per_transaction(self):
+        import datetime
+        Transaction.objects.bulk_create([
+            Transaction(house=self.house, description=f"t{i}", value=1, type='EXPENSE', account=self.account,
+                        date=datetime.date.today())
+            for i in range(20)
+        ])
+        before = self.version()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.account.delete()
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.version(), before + 1)
+
+        # Depois do commit, uma nova escrita registra outro on_commit
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Account.objects.create(house=self.house, name="Nova", owner=self.user)
+        self.assertEqual((len(callbacks), self.version()), (1, before + 2))
+
+    def test_repair_commands_bump_the_version(self):
+        import datetime
+        from .invoice_totals import reconcile_invoices
+        from .summaries import rebuild_house_summaries
+        card = CreditCard.objects.create(house=self.house, owner=self.user, name="Visa", limit_total=100,
+                                         limit_available=100, closing_day=5, due_day=12)
+        invoice = Invoice.objects.create(card=card, reference_date=datetime.date(2030, 1, 1))
+        Invoice.objects.filter(pk=invoice.pk).update(value=50)
+
+        before = self.version()
+        with self.captureOnCommitCallbacks(execute=True):
+            reconcile_invoices()
+        self.assertEqual(self.version(), before + 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            rebuild_house_summaries(self.house.pk)
+        self.assertEqual(self.version(), before + 2)
+
+
+# ============================================================================
+# 18. HISTÓRICO POR PERÍODO (SÉRIES ACUMULADAS)
+# ============================================================================
+class HistorySeriesTestCase(TestCase):
+    def setUp(self):
+        import datetime
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='series', password='123')
+        self.house = self.user.house_member.house
+        self.account = Account.objects.create(house=self.house, name="Conta", owner=self.user)
+        self.client.force_authenticate(user=self.user)
+
+        for day, value, tx_type in (('2015-06-10', 500, 'INCOME'), ('2024-01-03', 100, 'INCOME'),
+                                    ('2024-01-20', 30, 'EXPENSE'), ('2024-03-05', 20, 'EXPENSE')):
+            Transaction.objects.create(house=self.house, description="x", value=value, type=tx_type,
+                                       account=self.account, date=datetime.date.fromisoformat(day))
+
+    def test_monthly_series_with_opening_balance(self):
+        data = self.client.get('/api/history/', {'from': '2024-01-01', 'to': '2024-03-31'}).data
+        self.assertEqual(data['opening_balance'], 500.0)
+        self.assertEqual(
+            [(p['income'], p['expense'], p['cumulative']) for p in data['series']],
+            [(100.0, 30.0, 570.0), (0.0, 0.0, 570.0), (0.0, 20.0, 550.0)]
+        )
+
+    def test_yearly_series_over_ten_years(self):
+        data = self.client.get('/api/history/', {'from': '2015-01-01', 'to': '2024-12-31', 'granularity': 'year'}).data
+        self.assertEqual(len(data['series']), 10)
+        self.assertEqual(data['series'][0]['cumulative'], 500.0)
+        self.assertEqual(data['series'][-1]['net'], 50.0)
+        self.assertEqual(data['series'][-1]['cumulative'], 550.0)
+
+    def test_daily_series_opening_inside_month(self):
+        data = self.client.get('/api/history/', {'from': '2024-01-10', 'to': '2024-01-20', 'granularity': 'day'}).data
+        self.assertEqual(data['opening_balance'], 600.0)
+        self.assertEqual(len(data['series']), 11)
+        self.assertEqual(data['series'][-1]['cumulative'], 570.0)
+
+    def test_weekly_buckets_start_on_monday(self):
+        data = self.client.get('/api/history/', {'from': '2024-01-03', 'to': '2024-01-21', 'granularity': 'week'}).data
+        self.assertEqual(str(data['series'][0]['period']), '2024-01-01')
+        self.assertEqual([p['net'] for p in data['series']], [100.0, 0.0, -30.0])
+
+    def test_invalid_granularity(self):
+        self.assertEqual(self.client.get('/api/history/', {'granularity': 'hour'}).status_code, 400)
+
+    def test_too_many_points_is_rejected(self):
+        params = {'from': '2015-01-01', 'to': '2024-12-31'}
+        self.assertEqual(self.client.get('/api/history/', {**params, 'granularity': 'day'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/history/', {**params, 'granularity': 'week'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/history/', {**params, 'granularity': 'month'}).status_code, 200)
+        year = self.client.get('/api/history/', {'from': '2024-01-01', 'to': '2024-12-31', 'granularity': 'day'})
+        self.assertEqual(len(year.data['series']), 366)
+
+
+# ============================================================================
+# 19. CARTÕES: FATURA ATUAL SEM N+1 E SEM ESCRITA NA LEITURA
+# ============================================================================
+class CreditCardInvoiceInfoTestCase(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='cartoes', password='123')
+        self.house = self.user.house_member.house
+        self.client.force_authenticate(user=self.user)
+
+    def make_card(self, name, statuses):
+        import datetime
+        card = CreditCard.objects.create(house=self.house, owner=self.user, name=name, limit_total=1000,
+                                         limit_available=1000, closing_day=5, due_day=12)
+        invoices = []
+        for month, invoice_status in enumerate(statuses, start=1):
+            invoice = Invoice.objects.create(card=card, reference_date=datetime.date(2030, month, 1),
+                                             status=invoice_status, value=0)
+            Transaction.objects.create(house=self.house, description="compra", value=10 * month,
+                                       type='EXPENSE', invoice=invoice, date=datetime.date(2030, month, 1))
+            invoices.append(invoice)
+        return card, invoices
+
+    def list_cards(self):
+        from django.core.cache import cache
+        from django.test.utils import CaptureQueriesContext
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/credit-cards/')
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_current_invoice_selection_and_no_write_on_read(self):
+        _, (paid, oldest_open, newer_open) = self.make_card("A", ['PAID', 'OPEN', 'CLOSED'])
+        _, (first, last) = self.make_card("B", ['PAID', 'PAID'])
+        Invoice.objects.filter(pk=oldest_open.pk).update(value=999)
+
+        response, _ = self.list_cards()
+        info = {card['name']: card['invoice_info'] for card in response.data}
+        self.assertEqual((info['A']['id'], info['A']['value']), (oldest_open.pk, 20))
+        self.assertEqual((info['B']['id'], info['B']['value']), (last.pk, 20))
+        # GET não corrige Invoice.value
+        self.assertEqual(Invoice.objects.get(pk=oldest_open.pk).value, 999)
+
+    def test_query_count_does_not_grow_with_cards(self):
+        self.make_card("A", ['OPEN'])
+        _, one_card = self.list_cards()
+        for i in range(5):
+            self.make_card(f"Extra {i}", ['PAID', 'OPEN'])
+        response, six_cards = self.list_cards()
+        self.assertEqual(len(response.data), 6)
+        self.assertEqual(one_card, six_cards)
+
+
+# ============================================================================
+# 20. TOTAL DAS FATURAS MANTIDO NA ESCRITA
+# ============================================================================
+class InvoiceTotalsTestCase(TestCase):
+    def setUp(self):
+        import datetime
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='faturas', password='123')
+        self.house = self.user.house_member.house
+        self.card = CreditCard.objects.create(house=self.house, owner=self.user, name="Visa", limit_total=1000,
+                                              limit_available=1000, closing_day=5, due_day=12)
+        self.jan = Invoice.objects.create(card=self.card, reference_date=datetime.date(2030, 1, 1), value=0)
+        self.feb = Invoice.objects.create(card=self.card, reference_date=datetime.date(2030, 2, 1), value=0)
+        self.client.force_authenticate(user=self.user)
+
+    def value(self, invoice):
+        return Invoice.objects.get(pk=invoice.pk).value
+
+    def test_create_update_move_and_delete(self):
+        tx = Transaction.objects.create(house=self.house, description="a", value=40, type='EXPENSE', invoice=self.jan)
+        Transaction.objects.create(house=self.house, description="b", value=10, type='EXPENSE', invoice=self.jan)
+        self.assertEqual(self.value(self.jan), 50)
+
+        response = self.client.patch(f'/api/transactions/{tx.pk}/', {'value': '25.00'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.value(self.jan), 35)
+
+        tx = Transaction.objects.get(pk=tx.pk)
+        tx.invoice = self.feb
+        tx.save()
+        self.assertEqual((self.value(self.jan), self.value(self.feb)), (10, 25))
+
+        self.client.delete(f'/api/transactions/{tx.pk}/')
+        self.assertEqual(self.value(self.feb), 0)
+
+    def test_reconcile_command_reports_and_fixes_drift(self):
+        from django.core.management import call_command
+        Transaction.objects.create(house=self.house, description="a", value=40, type='EXPENSE', invoice=self.jan)
+        Invoice.objects.filter(pk=self.jan.pk).update(value=15)
+        Invoice.objects.filter(pk=self.feb.pk).update(value=7)
+
+        out = io.StringIO()
+        call_command('reconcile_invoices', stdout=out)
+        self.assertIn('2 faturas corrigidas', out.getvalue())
+        self.assertIn('32.00', out.getvalue())
+        self.assertEqual((self.value(self.jan), self.value(self.feb)), (40, 0))
+
+
+# ============================================================================
+# 21. FECHAMENTO DE FATURAS E RECÁLCULO DE LIMITE
+# ============================================================================
+class CloseInvoicesTestCase(TestCase):
+    def setUp(self):
+        import datetime
+        self.user = User.objects.create_user(username='fechamento', password='123')
+        self.house = self.user.house_member.house
+        self.early = CreditCard.objects.create(house=self.house, owner=self.user, name="Fecha dia 5", limit_total=1000,
+                                               limit_available=1000, closing_day=5, due_day=12)
+        self.late = CreditCard.objects.create(house=self.house, owner=self.user, name="Fecha dia 31", limit_total=500,
+                                              limit_available=0, closing_day=31, due_day=8)
+        self.d = datetime.date
+
+    def run_command(self, day):
+        from django.core.management import call_command
+        call_command('close_invoices', date=day, stdout=io.StringIO())
+
+    def test_closes_only_invoices_past_closing_day(self):
+        past = Invoice.objects.create(card=self.late, reference_date=self.d(2030, 1, 1))
+        current_early = Invoice.objects.create(card=self.early, reference_date=self.d(2030, 2, 1))
+        current_late = Invoice.objects.create(card=self.late, reference_date=self.d(2030, 2, 1))
+        future = Invoice.objects.create(card=self.early, reference_date=self.d(2030, 3, 1))
+
+        self.run_command(self.d(2030, 2, 10))
+        statuses = {inv.pk: inv.status for inv in Invoice.objects.all()}
+        self.assertEqual(
+            [statuses[i.pk] for i in (past, current_early, current_late, future)],
+            ['CLOSED', 'CLOSED', 'OPEN', 'OPEN']
+        )
+
+        # Último dia de fevereiro: closing_day 31 também fecha
+        self.run_command(self.d(2030, 2, 28))
+        self.assertEqual(Invoice.objects.get(pk=current_late.pk).status, 'CLOSED')
+
+    def test_limit_recomputed_from_unpaid_invoices(self):
+        Invoice.objects.create(card=self.early, reference_date=self.d(2030, 1, 1), status='PAID', value=300, amount_paid=300)
+        Invoice.objects.create(card=self.early, reference_date=self.d(2030, 2, 1), status='CLOSED', value=200, amount_paid=50)
+        Invoice.objects.create(card=self.early, reference_date=self.d(2030, 3, 1), status='OPEN', value=100)
+
+        self.run_command(self.d(2030, 2, 10))
+        self.assertEqual(CreditCard.objects.get(pk=self.early.pk).limit_available, 750)
+        # Cartão sem faturas em aberto volta ao limite total
+        self.assertEqual(CreditCard.objects.get(pk=self.late.pk).limit_available, 500)
+
+
+# ============================================================================
+# 22. PREVISÃO DE FATURAS DOS CARTÕES
+# ============================================================================
+class CardForecastTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='previsao', password='123')
+        self.house = self.user.house_member.house
+        self.visa = CreditCard.objects.create(house=self.house, owner=self.user, name="Visa", limit_total=5000,
+                                              limit_available=5000, closing_day=5, due_day=31)
+        self.master = CreditCard.objects.create(house=self.house, owner=self.user, name="Master", limit_total=5000,
+                                                limit_available=5000, closing_day=20, due_day=10)
+        self.client.force_authenticate(user=self.user)
+
+    def test_installments_projected_per_card_and_month(self):
+        import datetime
+        today = datetime.date.today().replace(day=1)
+        for card, value, installments in ((self.visa, 300, 3), (self.master, 100, 1)):
+            response = self.client.post('/api/transactions/', {
+                'description': 'Compra', 'value': value, 'type': 'EXPENSE', 'date': today.replace(day=21).isoformat(),
+                'payment_method': 'CREDIT_CARD', 'card': card.pk, 'installments': installments,
+            }, format='json')
+            self.assertEqual(response.status_code, 201)
+
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get('/api/credit-cards/forecast/', {'months': 4}).data
+        self.assertLessEqual(len(queries), 6)
+
+        self.assertEqual(len(data['months']), 4)
+        cards = {card['name']: [point['value'] for point in card['forecast']] for card in data['cards']}
+        # Compra no dia 21: cai na fatura do mês seguinte (fechamento 5 e 20)
+        self.assertEqual(cards['Visa'], [0.0, 100.0, 100.0, 100.0])
+        self.assertEqual(cards['Master'], [0.0, 100.0, 0.0, 0.0])
+        self.assertEqual([t['value'] for t in data['totals']], [0.0, 200.0, 100.0, 100.0])
+        # Vencimento ajustado ao último dia do mês
+        visa = next(card for card in data['cards'] if card['name'] == 'Visa')
+        self.assertEqual(visa['forecast'][0]['due_date'].day,
+                         calendar.monthrange(today.year, today.month)[1])
+
+
+# ============================================================================
+# 23. PAGAMENTO DE FATURAS EM LOTE
+# ============================================================================
+class InvoicePayBatchTestCase(TestCase):
+    def setUp(self):
+        import datetime
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='lote', password='123')
+        self.house = self.user.house_member.house
+        self.account = Account.objects.create(house=self.house, name="Conta", owner=self.user, balance=1000)
+        self.visa = CreditCard.objects.create(house=self.house, owner=self.user, name="Visa", limit_total=500,
+                                              limit_available=300, closing_day=5, due_day=12)
+        self.master = CreditCard.objects.create(house=self.house, owner=self.user, name="Master", limit_total=500,
+                                                limit_available=400, closing_day=5, due_day=12)
+        self.visa_invoice = Invoice.objects.create(card=self.visa, reference_date=datetime.date(2030, 1, 1),
+                                                   value=200, status='CLOSED')
+        self.master_invoice = Invoice.objects.create(card=self.master, reference_date=datetime.date(2030, 1, 1),
+                                                     value=100, status='CLOSED')
+        self.client.force_authenticate(user=self.user)
+
+    def test_pays_valid_items_and_reports_each_one(self):
+        # Número fixo de queries, qualquer que seja o tamanho do lote (savepoints incluídos)
+        with self.assertNumQueries(24):
+            response = self.client.post('/api/invoices/pay-batch/', {'payments': [
+                {'invoice': self.visa_invoice.pk, 'account': self.account.pk, 'value': 200},
+                {'invoice': self.master_invoice.pk, 'account': self.account.pk, 'value': 60},
+                {'invoice': 999999, 'account': self.account.pk, 'value': 10},
+            ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        results = response.data['results']
+        self.assertEqual([r['status'] for r in results], ['paid', 'paid', 'error'])
+        self.assertEqual((results[0]['invoice_status'], results[1]['invoice_status']), ('PAID', 'CLOSED'))
+        self.assertEqual(results[1]['remaining'], 40)
+
+        self.assertEqual(Account.objects.get(pk=self.account.pk).balance, 740)
+        self.assertEqual(CreditCard.objects.get(pk=self.visa.pk).limit_available, 500)
+        self.assertEqual(CreditCard.objects.get(pk=self.master.pk).limit_available, 460)
+        self.assertEqual(Transaction.objects.filter(account=self.account, type='EXPENSE').count(), 2)
+
+    def test_all_invalid_returns_400_without_changes(self):
+        response = self.client.post('/api/invoices/pay-batch/', {'payments': [
+            {'invoice': self.visa_invoice.pk, 'account': self.account.pk, 'value': 0},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Account.objects.get(pk=self.account.pk).balance, 1000)
+
+    def test_malformed_ids_and_values_are_reported_per_item(self):
+        response = self.client.post('/api/invoices/pay-batch/', {'payments': [
+            {'invoice': 'abc', 'account': self.account.pk, 'value': 10},
+            {'invoice': self.visa_invoice.pk, 'account': self.account.pk, 'value': 'NaN'},
+            {'invoice': self.visa_invoice.pk, 'account': self.account.pk, 'value': 'Infinity'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([r['status'] for r in response.data['results']], ['error'] * 3)
+
+    def test_overdraft_rejects_the_whole_batch(self):
+        Account.objects.filter(pk=self.account.pk).update(balance=250)
+        response = self.client.post('/api/invoices/pay-batch/', {'payments': [
+            {'invoice': self.visa_invoice.pk, 'account': self.account.pk, 'value': 200},
+            {'invoice': self.master_invoice.pk, 'account': self.account.pk, 'value': 100},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Saldo insuficiente', response.data['error'])
+        self.assertEqual(Account.objects.get(pk=self.account.pk).balance, 250)
+        self.assertEqual(Invoice.objects.get(pk=self.visa_invoice.pk).amount_paid, 0)
+        self.assertEqual(CreditCard.objects.get(pk=self.visa.pk).limit_available, 300)
+        self.assertFalse(Transaction.objects.filter(account=self.account).exists())
+
+    def test_single_payment_also_refuses_overdraft(self):
+        Account.objects.filter(pk=self.account.pk).update(balance=150)
+        response = self.client.post(f'/api/invoices/{self.visa_invoice.pk}/pay/',
+                                    {'account_id': self.account.pk, 'value': 200}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Account.objects.get(pk=self.account.pk).balance, 150)
+        self.assertEqual(Invoice.objects.get(pk=self.visa_invoice.pk).amount_paid, 0)
+        self.assertFalse(Transaction.objects.filter(account=self.account).exists())
+
+    def test_payments_are_capped_at_the_remaining_amount(self):
+        response = self.client.post('/api/invoices/pay-batch/', {'payments': [
+            {'invoice': self.master_invoice.pk, 'account': self.account.pk, 'value': 70},
+            {'invoice': self.master_invoice.pk, 'account': self.account.pk, 'value': 70},
+            {'invoice': self.master_invoice.pk, 'account': self.account.pk, 'value': 70},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([r['status'] for r in results], ['paid', 'paid', 'error'])
+        self.assertEqual([r.get('value') for r in results[:2]], [70, 30])
+        self.assertEqual(results[1]['invoice_status'], 'PAID')
+        self.assertEqual(Account.objects.get(pk=self.account.pk).balance, 900)
+        self.assertEqual(CreditCard.objects.get(pk=self.master.pk).limit_available, 500)
+
+
+# ============================================================================
+# 24. CONTAS FIXAS: SITUAÇÃO POR MÊS E MATRIZ
+# ============================================================================
+class RecurringBillStatusTestCase(TestCase):
+    def setUp(self):
+        import datetime
+        from django.core.cache import cache
+        from .models import RecurringBill
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='fixas', password='123')
+        self.house = self.user.house_member.house
+        self.account = Account.objects.create(house=self.house, name="Conta", owner=self.user)
+        self.client.force_authenticate(user=self.user)
+
+        self.rent = RecurringBill.objects.create(house=self.house, name="Aluguel", base_value=1500, due_day=5)
+        self.power = RecurringBill.objects.create(house=self.house, name="Luz", base_value=200, due_day=10)
+        for bill, day, value in ((self.rent, '2030-01-05', 1500), (self.rent, '2030-02-06', 1500),
+                                 (self.power, '2030-02-11', 180), (self.power, '2030-02-20', 30)):
+            Transaction.objects.create(house=self.house, description=bill.name, value=value, type='EXPENSE',
+                                       account=self.account, recurring_bill=bill, date=datetime.date.fromisoformat(day))
+
+    def test_paid_status_for_any_month_in_constant_queries(self):
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get('/api/recurring-bills/', {'month': '2030-01'}).data
+        self.assertEqual({b['name']: b['is_paid_this_month'] for b in data}, {'Aluguel': True, 'Luz': False})
+        self.assertLess(len(queries), 8)
+
+        data = self.client.get('/api/recurring-bills/', {'month': '2030-02'}).data
+        self.assertEqual({b['name']: b['is_paid_this_month'] for b in data}, {'Aluguel': True, 'Luz': True})
+        self.assertEqual(self.client.get('/api/recurring-bills/', {'month': '2030-2x'}).status_code, 400)
+
+    def test_matrix_across_months(self):
+        data = self.client.get('/api/recurring-bills/matrix/', {'from': '2029-12', 'to': '2030-02'}).data
+        self.assertEqual(data['months'], ['2029-12', '2030-01', '2030-02'])
+        matrix = {bill['name']: [(cell['paid'], cell['amount']) for cell in bill['months']] for bill in data['bills']}
+        self.assertEqual(matrix['Aluguel'], [(False, 0.0), (True, 1500.0), (True, 1500.0)])
+        self.assertEqual(matrix['Luz'], [(False, 0.0), (False, 0.0), (True, 210.0)])
+
+    def test_matrix_rejects_ranges_over_the_limit(self):
+        response = self.client.get('/api/recurring-bills/matrix/', {'from': '2025-01', 'to': '2029-12'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['months']), 60)
+        response = self.client.get('/api/recurring-bills/matrix/', {'from': '2024-12', 'to': '2029-12'})
+        self.assertEqual(response.status_code, 400)
+
+
+# ============================================================================
+# 25. LANÇAMENTO AUTOMÁTICO DE CONTAS FIXAS
+# ============================================================================
+class PostRecurringBillsTestCase(TestCase):
+    def setUp(self):
+        import datetime
+        from .models import RecurringBill
+        self.user = User.objects.create_user(username='lancamento', password='123')
+        self.house = self.user.house_member.house
+        self.account = Account.objects.create(house=self.house, name="Conta", owner=self.user, balance=2000)
+        self.rent = RecurringBill.objects.create(house=self.house, name="Aluguel", base_value=1500, due_day=5,
+                                                 account=self.account)
+        self.power = RecurringBill.objects.create(house=self.house, name="Luz", base_value=200, due_day=20,
+                                                  account=self.account)
+        self.gym = RecurringBill.objects.create(house=self.house, name="Academia", base_value=90, due_day=31,
+                                                account=self.account)
+        # Sem conta de débito: paga à mão, nunca lançada pelo comando
+        RecurringBill.objects.create(house=self.house, name="Internet", base_value=100, due_day=1)
+        RecurringBill.objects.create(house=self.house, name="Inativa", base_value=10, due_day=1, is_active=False,
+                                     account=self.account)
+        self.d = datetime.date
+
+    def run_command(self, day):
+        from django.core.management import call_command
+        out = io.StringIO()
+        call_command('post_recurring_bills', date=day, batch_size=2, stdout=out)
+        return out.getvalue()
+
+    def posted(self):
+        return sorted(Transaction.objects.filter(recurring_bill__isnull=False).values_list('description', 'date'))
+
+    def balance(self):
+        return Account.objects.get(pk=self.account.pk).balance
+
+    def test_posts_due_bills_once_per_month(self):
+        # Luz já foi paga à mão em fevereiro: não é lançada de novo
+        Transaction.objects.create(house=self.house, description="Luz", value=210, type='EXPENSE',
+                                   account=self.account, recurring_bill=self.power, date=self.d(2030, 2, 3))
+        self.run_command(self.d(2030, 2, 21))
+        self.run_command(self.d(2030, 2, 21))
+        self.assertEqual(self.posted(), [('Aluguel', self.d(2030, 2, 5)), ('Luz', self.d(2030, 2, 3))])
+
+        # Último dia do mês: due_day 31 vence no dia 28
+        self.run_command(self.d(2030, 2, 28))
+        self.assertIn(('Academia', self.d(2030, 2, 28)), self.posted())
+
+        from .models import AccountLedgerEntry, MonthlySummary
+        rent = Transaction.objects.get(recurring_bill=self.rent)
+        self.assertEqual((rent.account, rent.owner, rent.is_shared, rent.value), (self.account, self.user, True, 1500))
+        summary = MonthlySummary.objects.get(house=self.house, month=self.d(2030, 2, 1), type='EXPENSE')
+        self.assertEqual((summary.total, summary.count), (1800, 3))
+        # Debitado da conta de débito automático, com o extrato ligado às transações
+        self.assertEqual(self.balance(), 2000 - 1500 - 90)
+        self.assertEqual(AccountLedgerEntry.objects.get(transaction=rent).delta, -1500)
+
+    def test_bills_without_funds_wait_for_the_next_run(self):
+        Account.objects.filter(pk=self.account.pk).update(balance=300)
+        report = self.run_command(self.d(2030, 2, 21))
+        # Luz (200) cabe; Aluguel (1500) não
+        self.assertEqual(self.posted(), [('Luz', self.d(2030, 2, 20))])
+        self.assertIn("1 contas fixas sem saldo", report)
+        self.assertEqual(self.balance(), 100)
+
+        Account.objects.filter(pk=self.account.pk).update(balance=1600)
+        self.run_command(self.d(2030, 2, 22))
+        self.assertIn(('Aluguel', self.d(2030, 2, 5)), self.posted())
+        self.assertEqual(self.balance(), 100)
+
+    def test_visible_and_paid_after_posting(self):
+        from django.core.cache import cache
+        cache.clear()
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        self.run_command(self.d(2030, 3, 6))
+
+        bills = client.get('/api/recurring-bills/', {'month': '2030-03'}).data
+        self.assertEqual({b['name']: b['is_paid_this_month'] for b in bills},
+                         {'Aluguel': True, 'Luz': False, 'Academia': False, 'Internet': False, 'Inativa': False})
+        self.assertEqual(Transaction.objects.filter(house=self.house).count(), 1)
+
+        # Editar um lançamento sem conta nem fatura não apaga o dono: continua visível
+        loose = Transaction.objects.create(house=self.house, description="Avulsa", value=5, type='EXPENSE',
+                                           owner=self.user, date=self.d(2030, 3, 6))
+        response = client.patch(f'/api/transactions/{loose.pk}/', {'description': 'Avulsa março'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        loose.refresh_from_db()
+        self.assertEqual((loose.description, loose.owner), ('Avulsa março', self.user))
+        self.assertEqual(client.get(f'/api/transactions/{loose.pk}/').status_code, 200)
+
+    def test_debit_account_must_belong_to_the_house(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        outsider = User.objects.create_user(username='vizinho', password='123')
+        foreign = Account.objects.create(house=outsider.house_member.house, name="Alheia", owner=outsider)
+        response = client.patch(f'/api/recurring-bills/{self.rent.pk}/', {'name': 'Aluguel', 'account': foreign.pk},
+                                format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+# ============================================================================
+# 26. EXTRATO DA CONTA E SÉRIE DE SALDO
+# ============================================================================
+class AccountLedgerTestCase(TestCase):
+    def setUp(self):
+        import datetime
+        from django.core.cache import cache
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='extrato', password='123')
+        self.house = self.user.house_member.house
+        self.account = Account.objects.create(house=self.house, name="Conta", owner=self.user, balance=1000)
+        # Saldo inicial entra no extrato com data antiga, para as séries abaixo
+        self.account.ledger_entries.update(date=datetime.date(2029, 12, 1))
+        self.card = CreditCard.objects.create(house=self.house, owner=self.user, name="Visa", limit_total=500,
+                                              limit_available=300, closing_day=5, due_day=12)
+        self.client.force_authenticate(user=self.user)
+        self.d = datetime.date
+
+    def _post(self, value, tx_type, date):
+        return self.client.post('/api/transactions/', {
+            'description': 'Lançamento', 'value': value, 'type': tx_type, 'date': date,
+            'payment_method': 'ACCOUNT', 'account': self.account.id,
+        }, format='json')
+
+    def ledger_total(self):
+        from django.db.models import Sum
+        return self.account.ledger_entries.aggregate(total=Sum('delta'))['total']
+
+    def test_every_balance_change_is_in_the_ledger(self):
+        invoice = Invoice.objects.create(card=self.card, reference_date=self.d(2030, 1, 1), value=200, status='CLOSED')
+        self.assertEqual(self._post(100, 'EXPENSE', '2030-01-10').status_code, 201)
+        self.assertEqual(self._post(50, 'INCOME', '2030-01-20').status_code, 201)
+        self.client.post(f'/api/invoices/{invoice.pk}/pay/', {'account_id': self.account.pk, 'value': 80, 'date': '2030-02-12'},
+                         format='json')
+        self.client.post('/api/invoices/pay-batch/', {'payments': [
+            {'invoice': invoice.pk, 'account': self.account.pk, 'value': 20, 'date': '2030-02-15'},
+        ]}, format='json')
+        self.client.patch(f'/api/accounts/{self.account.pk}/', {'balance': '900.00'}, format='json')
+
+        entries = list(self.account.ledger_entries.order_by('id').values_list('date', 'delta', 'transaction__value'))
+        self.assertEqual([(day, delta) for day, delta, _ in entries[:5]], [
+            (self.d(2029, 12, 1), 1000), (self.d(2030, 1, 10), -100), (self.d(2030, 1, 20), 50),
+            (self.d(2030, 2, 12), -80), (self.d(2030, 2, 15), -20),
+        ])
+        # Cada débito/crédito aponta para a transação que o gerou
+        self.assertEqual([value for _, _, value in entries[1:5]], [100, 50, 80, 20])
+        # Ajuste manual: 850 -> 900
+        self.assertEqual(entries[5][1], 50)
+        self.assertEqual(self.ledger_total(), Account.objects.get(pk=self.account.pk).balance)
+
+    def test_insufficient_balance_leaves_no_entry(self):
+        self.assertEqual(self._post(5000, 'EXPENSE', '2030-01-10').status_code, 400)
+        self.assertEqual(self.account.ledger_entries.count(), 1)
+
+    def test_balance_at_uses_snapshot_and_backdated_entry_invalidates_it(self):
+        from django.test.utils import CaptureQueriesContext
+        from .ledger import balance_at, take_snapshots
+        from .models import AccountSnapshot
+        for value, date in ((100, '2030-01-10'), (200, '2030-02-10'), (300, '2030-03-10')):
+            self._post(value, 'EXPENSE', date)
+
+        self.assertEqual(take_snapshots(until=self.d(2030, 3, 15)), 3)
+        self.assertEqual(take_snapshots(until=self.d(2030, 3, 15)), 0)
+        self.assertEqual(
+            list(AccountSnapshot.objects.order_by('date').values_list('date', 'balance')),
+            [(self.d(2029, 12, 31), 1000), (self.d(2030, 1, 31), 900), (self.d(2030, 2, 28), 700)],
+        )
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(balance_at(self.account.pk, self.d(2030, 3, 20)), 400)
+        self.assertEqual(len(queries), 2)
+
+        # Lançamento retroativo em janeiro: snapshots de janeiro em diante caem e são refeitos
+        self._post(10, 'EXPENSE', '2030-01-05')
+        self.assertEqual(list(AccountSnapshot.objects.values_list('date', flat=True)), [self.d(2029, 12, 31)])
+        take_snapshots(until=self.d(2030, 3, 15))
+        self.assertEqual(AccountSnapshot.objects.get(date=self.d(2030, 2, 28)).balance, 690)
+        self.assertEqual(balance_at(self.account.pk, self.d(2030, 1, 31)), 890)
+
+    def test_balance_series_endpoint(self):
+        self._post(100, 'EXPENSE', '2030-01-10')
+        self._post(50, 'INCOME', '2030-03-02')
+        url = f'/api/accounts/{self.account.pk}/balance-series/'
+
+        data = self.client.get(url, {'from': '2030-01-01', 'to': '2030-03-31'}).data
+        self.assertEqual(data['opening_balance'], 1000)
+        self.assertEqual([(p['change'], p['balance']) for p in data['series']],
+                         [(-100.0, 900.0), (0.0, 900.0), (50.0, 950.0)])
+
+        daily = self.client.get(url, {'from': '2030-01-09', 'to': '2030-01-11', 'granularity': 'day'}).data
+        self.assertEqual([p['balance'] for p in daily['series']], [1000.0, 900.0, 900.0])
+        self.assertEqual(self.client.get(url, {'granularity': 'hora'}).status_code, 400)
+
+
+# ============================================================================
+# 27. VERIFICAÇÃO DE SALDOS, LIMITES E FATURAS
+# ============================================================================
+class VerifyLedgersTestCase(TestCase):
+    def setUp(self):
+        import datetime
+        self.user = User.objects.create_user(username='verifica', password='123')
+        self.house = self.user.house_member.house
+        self.account = Account.objects.create(house=self.house, name="Conta", owner=self.user, balance=500)
+        self.card = CreditCard.objects.create(house=self.house, owner=self.user, name="Visa", limit_total=1000,
+                                              limit_available=1000, closing_day=5, due_day=12)
+        self.invoice = Invoice.objects.create(card=self.card, reference_date=datetime.date(2030, 1, 1))
+        Transaction.objects.create(house=self.house, description="Compra", value=300, type='EXPENSE',
+                                   invoice=self.invoice, date=datetime.date(2030, 1, 3))
+        CreditCard.objects.filter(pk=self.card.pk).update(limit_available=700)
+
+    def run_command(self, **options):
+        from django.core.management import call_command
+        out = io.StringIO()
+        call_command('verify_ledgers', workers=1, shard_size=1, stdout=out, **options)
+        return out.getvalue()
+
+    def test_reports_then_fixes_drift(self):
+        self.assertIn("0 saldos de conta, 0 faturas e 0 limites", self.run_command())
+
+        # Escritas por fora dos caminhos que mantêm os valores
+        Account.objects.filter(pk=self.account.pk).update(balance=450)
+        Invoice.objects.filter(pk=self.invoice.pk).update(value=250)
+        CreditCard.objects.filter(pk=self.card.pk).update(limit_available=900)
+
+        report = self.run_command()
+        self.assertIn("1 saldos de conta, 1 faturas e 1 limites de cartão divergentes", report)
+        self.assertEqual(Account.objects.get(pk=self.account.pk).balance, 450)
+
+        self.run_command(fix=True)
+        self.assertEqual(Account.objects.get(pk=self.account.pk).balance, 500)
+        self.assertEqual(Invoice.objects.get(pk=self.invoice.pk).value, 300)
+        self.assertEqual(CreditCard.objects.get(pk=self.card.pk).limit_available, 700)
+        self.assertIn("0 saldos de conta, 0 faturas e 0 limites", self.run_command())
+
+    def test_manual_adjustments_are_suspect_but_never_reverted(self):
+        import datetime
+        from .services import credit_account, debit_account
+        stale = Account.objects.get(pk=self.account.pk)
+        salary = Transaction.objects.create(house=self.house, description="Salário", value=600, type='INCOME',
+                                            account=self.account, date=datetime.date(2030, 1, 2))
+        credit_account(self.account, 600, transaction=salary)
+        rent = Transaction.objects.create(house=self.house, description="Aluguel", value=200, type='EXPENSE',
+                                          account=self.account, date=datetime.date(2030, 1, 5))
+        debit_account(self.account, 200, transaction=rent)
+        self.assertIn("0 saldos de conta, 0 faturas e 0 limites", self.run_command())
+
+        # Instância velha gravada: o extrato ganha um ajuste que "explica" o saldo errado.
+        # Não dá para separar de uma edição legítima: é informado, nunca revertido
+        stale.name = "Conta corrente"
+        stale.save()
+        self.assertEqual(Account.objects.get(pk=self.account.pk).balance, 500)
+        report = self.run_command()
+        self.assertIn("0 saldos de conta, 0 faturas e 0 limites", report)
+        self.assertIn("1 conta(s) com ajuste manual de saldo sem transação (suspeitas", report)
+
+        # Edição de saldo pela API continua valendo depois do --fix
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        self.assertEqual(client.patch(f'/api/accounts/{self.account.pk}/', {'balance': '750'}).status_code, 200)
+        self.run_command(fix=True)
+        self.assertEqual(Account.objects.get(pk=self.account.pk).balance, 750)
+
+        # Divergência sem linha no extrato (UPDATE direto) é corrigida, preservando os ajustes
+        Account.objects.filter(pk=self.account.pk).update(balance=10)
+        self.assertIn("1 saldos de conta, 0 faturas e 0 limites de cartão divergentes", self.run_command())
+        self.run_command(fix=True)
+        self.assertEqual(Account.objects.get(pk=self.account.pk).balance, 750)
+        from django.db.models import Sum
+        from .models import AccountLedgerEntry
+        ledger = AccountLedgerEntry.objects.filter(account=self.account).aggregate(total=Sum('delta'))
+        self.assertEqual(ledger['total'], 750)
+        self.assertIn("0 saldos de conta, 0 faturas e 0 limites", self.run_command())
+
+
+# ============================================================================
+# 28. LISTA DE COMPRAS SINCRONIZADA NA ESCRITA DO ESTOQUE
+# ============================================================================
+class ShoppingListSyncTestCase(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='mercado', password='123')
+        self.house = self.user.house_member.house
+        self.client.force_authenticate(user=self.user)
+        self.milk = Product.objects.create(house=self.house, name="Leite", estimated_price=6)
+        self.item = InventoryItem.objects.create(house=self.house, product=self.milk, quantity=10, min_quantity=5)
+
+    def test_inventory_writes_keep_list_in_sync(self):
+        self.assertFalse(ShoppingList.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/inventory/{self.item.pk}/', {'quantity': 2}, format='json')
+        listed = ShoppingList.objects.get(house=self.house, product=self.milk)
+        self.assertEqual((listed.quantity_to_buy, listed.real_unit_price, listed.is_purchased), (3, 6, False))
+
+        # No carrinho: novas baixas não mexem no item
+        ShoppingList.objects.filter(pk=listed.pk).update(is_purchased=True)
+        self.client.patch(f'/api/inventory/{self.item.pk}/', {'quantity': 1}, format='json')
+        self.assertEqual(ShoppingList.objects.get(pk=listed.pk).quantity_to_buy, 3)
+
+        # Igual ao mínimo é estoque saudável: sai da lista
+        self.client.patch(f'/api/inventory/{self.item.pk}/', {'quantity': 5}, format='json')
+        self.assertFalse(ShoppingList.objects.exists())
+
+    def test_list_read_is_one_query_without_writes(self):
+        from django.test.utils import CaptureQueriesContext
+        products = Product.objects.bulk_create([Product(house=self.house, name=f"P{i}") for i in range(20)])
+        InventoryItem.objects.bulk_create([
+            InventoryItem(house=self.house, product=product, quantity=0, min_quantity=2) for product in products
+        ])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/api/shopping-list/').data, [])
+        statements = [q['sql'] for q in queries]
+        self.assertTrue(all(sql.lstrip().upper().startswith('SELECT') for sql in statements))
+        self.assertEqual(len([sql for sql in statements if 'core_shoppinglist' in sql]), 1)
+
+    def test_full_sync_in_constant_queries(self):
+        from django.test.utils import CaptureQueriesContext
+        from .services import sync_shopping_list
+
+        def add_low_stock(count, prefix):
+            products = Product.objects.bulk_create([Product(house=self.house, name=f"{prefix}{i}") for i in range(count)])
+            InventoryItem.objects.bulk_create([
+                InventoryItem(house=self.house, product=product, quantity=1, min_quantity=4) for product in products
+            ])
+
+        add_low_stock(3, 'A')
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(sync_shopping_list(self.house.pk), (3, 0, 0))
+        add_low_stock(30, 'B')
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(sync_shopping_list(self.house.pk), (30, 0, 0))
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(sync_shopping_list(self.house.pk), (0, 0, 0))
+        self.assertEqual(set(ShoppingList.objects.values_list('quantity_to_buy', flat=True)), {3})
+
+    def test_finish_restocks_in_constant_queries(self):
+        from django.test.utils import CaptureQueriesContext
+        account = Account.objects.create(house=self.house, name="Conta", owner=self.user, balance=10000)
+
+        def checkout(count, prefix):
+            products = Product.objects.bulk_create([
+                Product(house=self.house, name=f"{prefix}{i}", estimated_price=2) for i in range(count)
+            ])
+            # Metade já está no estoque (zerada, mínimo 3); a outra metade ainda não
+            InventoryItem.objects.bulk_create([
+                InventoryItem(house=self.house, product=product, quantity=0, min_quantity=3) for product in products[::2]
+            ])
+            ShoppingList.objects.bulk_create([
+                ShoppingList(house=self.house, product=product, quantity_to_buy=2, real_unit_price=5, is_purchased=True)
+                for product in products
+            ])
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/api/shopping-list/finish/', {'payments': [
+                    {'method': 'ACCOUNT', 'id': account.pk, 'value': 10 * count},
+                ]}, format='json')
+            self.assertEqual(response.status_code, 200)
+            return products, len(queries)
+
+        checkout(1, 'W')  # categoria "Compras" e resumo do mês já criados
+        _, few = checkout(2, 'A')
+        products, many = checkout(10, 'B')
+        self.assertEqual(few, many)
+
+        stock = dict(InventoryItem.objects.filter(product__in=products).values_list('product_id', 'quantity'))
+        self.assertEqual(set(stock.values()), {2})
+        self.assertEqual(set(Product.objects.filter(pk__in=stock).values_list('estimated_price', flat=True)), {5})
+        # Abaixo do mínimo depois da compra: volta para a lista, fora do carrinho
+        relisted = ShoppingList.objects.filter(product__in=products)
+        self.assertEqual(set(relisted.values_list('product_id', flat=True)), {p.pk for p in products[::2]})
+        self.assertFalse(relisted.filter(is_purchased=True).exists())
+        self.assertEqual(Account.objects.get(pk=account.pk).balance, 10000 - 10 - 20 - 100)
+
+
+# ============================================================================
+# 29. AJUSTE DE ESTOQUE EM LOTE
+# ============================================================================
+class InventoryBulkAdjustTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='despensa', password='123')
+        self.house = self.user.house_member.house
+        self.client.force_authenticate(user=self.user)
+        self.rice = Product.objects.create(house=self.house, name="Arroz", min_quantity=2, estimated_price=20)
+        self.beans = Product.objects.create(house=self.house, name="Feijão", min_quantity=3, estimated_price=9)
+        self.rice_stock = InventoryItem.objects.create(house=self.house, product=self.rice, quantity=1, min_quantity=2)
+        self.beans_stock = InventoryItem.objects.create(house=self.house, product=self.beans, quantity=5, min_quantity=3)
+
+    def adjust(self, items):
+        return self.client.post('/api/inventory/bulk-adjust/', {'items': items}, format='json')
+
+    def test_applies_changes_and_reconciles_list_once(self):
+        from decimal import Decimal
+        self.assertTrue(ShoppingList.objects.filter(product=self.rice).exists())
+        coffee = Product.objects.create(house=self.house, name="Café", min_quantity=1)
+
+        response = self.adjust([
+            {'product': self.rice.pk, 'delta': 1},           # 2 = mínimo: sai da lista (regra estrita)
+            {'product': self.beans.pk, 'quantity': 4},
+            {'product': self.beans.pk, 'delta': -2},         # 4 - 2 = 2 < 3: entra na lista
+            {'product': coffee.pk, 'delta': 0.5},            # novo item, abaixo do mínimo
+            {'product': 999999, 'delta': 1},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['status'] for r in response.data['results']], ['ok', 'ok', 'ok', 'ok', 'error'])
+        self.assertEqual(response.data['shopping_list'], {'created': 2, 'updated': 0, 'removed': 1})
+
+        stock = dict(InventoryItem.objects.values_list('product_id', 'quantity'))
+        self.assertEqual((stock[self.rice.pk], stock[self.beans.pk], stock[coffee.pk]), (2, 2, Decimal('0.5')))
+        needed = dict(ShoppingList.objects.values_list('product_id', 'quantity_to_buy'))
+        self.assertEqual(needed, {self.beans.pk: 1, coffee.pk: Decimal('0.5')})
+
+    def test_query_count_does_not_grow_with_items(self):
+        from django.test.utils import CaptureQueriesContext
+        products = Product.objects.bulk_create([
+            Product(house=self.house, name=f"Item {i}", min_quantity=2) for i in range(40)
+        ])
+        InventoryItem.objects.bulk_create([
+            InventoryItem(house=self.house, product=product, quantity=5, min_quantity=2) for product in products
+        ])
+
+        with CaptureQueriesContext(connection) as few:
+            self.adjust([{'product': product.pk, 'delta': -4} for product in products[:4]])
+        with CaptureQueriesContext(connection) as many:
+            self.adjust([{'product': product.pk, 'delta': -4} for product in products[4:]])
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(ShoppingList.objects.filter(product__in=products).count(), 40)
+
+    def test_never_goes_negative_and_rejects_invalid(self):
+        self.adjust([{'product': self.rice.pk, 'delta': -10}])
+        self.assertEqual(InventoryItem.objects.get(pk=self.rice_stock.pk).quantity, 0)
+
+        response = self.adjust([{'product': self.rice.pk, 'quantity': -1}, {'product': self.beans.pk}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.adjust([]).status_code, 400)
+
+        # Ids e números malformados são erro do item, não 500
+        response = self.adjust([
+            {'product': 'abc', 'delta': 1},
+            {'product': self.rice.pk, 'quantity': 'NaN'},
+            {'product': self.rice.pk, 'delta': 'Infinity'},
+            {'product': self.rice.pk, 'quantity': '-Infinity'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([r['status'] for r in response.data['results']], ['error'] * 4)
+        self.assertEqual(InventoryItem.objects.get(pk=self.rice_stock.pk).quantity, 0)
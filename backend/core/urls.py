@@ -6,7 +6,7 @@ from .views import (
     TransactionViewSet, AccountViewSet, RecurringBillViewSet, 
     CreditCardViewSet, InvoiceViewSet, InvitationViewSet,
     AuthViewSet, HistoryViewSet, ProductViewSet, InventoryViewSet, 
-    ShoppingListViewSet, CurrentUserView,
+    ShoppingListViewSet, CurrentUserView, CacheStatsView,
     
     # Views soltas (Login/Registro)
     CustomAuthToken, RegisterView
@@ -45,4 +45,5 @@ urlpatterns = [
     # 3. Inclui as rotas do Router
     path('', include(router.urls)),
     path('me/', CurrentUserView.as_view(), name='current-user'),
+    path('cache-stats/', CacheStatsView.as_view(), name='cache-stats'),
 ]
\ No newline at end of file
@@ -0,0 +1,141 @@
+import time
+from decimal import Decimal
+
+from django.db import transaction as db_transaction
+from django.db.models import Case, F, Sum, When
+
+from .ledger import record_entries
+from .models import Account, AccountLedgerEntry, CreditCard, House, Invoice, Transaction, money
+
+# ======================================================================
+# VERIFICAÇÃO DE SALDOS, LIMITES E FATURAS POR LOTE DE CASAS
+# ======================================================================
+# Usado pelo comando verify_ledgers. Cada shard é um intervalo de ids de casa
+# (índices nas FKs house_id); por shard, poucas queries agrupadas:
+#   Account.balance           = abertura do extrato + receitas - despesas das
+#                                transações da conta + ajustes manuais
+#   Invoice.value             = soma das transações da fatura
+#   CreditCard.limit_available = limit_total - saldo devedor das faturas não
+#                                pagas, já com Invoice.value correto
+# Os valores esperados são calculados em Python a partir desses agregados e
+# só as linhas divergentes são gravadas (bulk_update). Cada shard é
+# independente, então o comando pode distribuí-los entre processos.
+#
+# O saldo não é conferido contra a soma do extrato: Account.save() grava um
+# 'Ajuste manual de saldo' a cada mudança, então um save com instância velha
+# (ou uma edição direta) mantém extrato e saldo iguais e a divergência some.
+# Ajustes manuais também vêm da edição legítima da conta, então não há como
+# separar os dois casos: entram no saldo esperado (o --fix nunca os desfaz) e
+# a conta é informada como suspeita para conferência. As divergências que
+# sobram (UPDATE direto, débito sem transação) são corrigidas pelo --fix, com
+# uma linha de correção no extrato para que ele continue somando o saldo.
+# A migração 0012 abriu o extrato das contas antigas com "Saldo de abertura" =
+# saldo - transações já lançadas, então todas as transações entram na conta.
+
+ZERO = Decimal('0.00')
+OPENING = ('Saldo inicial', 'Saldo de abertura')
+MANUAL = 'Ajuste manual de saldo'
+CORRECTION = 'Correção da verificação de saldos'
+
+
+def house_shards(shard_size):
+    """Divide os ids das casas em intervalos (primeiro, último) de até shard_size casas."""
+    ids = list(House.objects.order_by('pk').values_list('pk', flat=True))
+    return [(chunk[0], chunk[-1]) for chunk in (ids[i:i + shard_size] for i in range(0, len(ids), shard_size))]
+
+
+def _flush(model, rows, fields, batch_size):
+    for start in range(0, len(rows), batch_size):
+        model.objects.bulk_update(rows[start:start + batch_size], fields)
+
+
+def verify_shard(first_house, last_house, fix=False, batch_size=1000):
+    """
+    Verifica (e com fix, corrige) as casas com id entre first_house e last_house.
+    Retorna um dict com as contagens de divergências, a diferença total e o tempo.
+    """
+    started = time.perf_counter()
+    houses = {'house_id__gte': first_house, 'house_id__lte': last_house}
+
+    # Contas: saldo x abertura + líquido das transações da conta + ajustes manuais
+    unlinked = AccountLedgerEntry.objects.filter(
+        transaction__isnull=True, account__house_id__gte=first_house, account__house_id__lte=last_house
+    )
+    opening = dict(
+        unlinked.filter(description__in=OPENING).values('account_id').annotate(total=Sum('delta'))
+        .order_by().values_list('account_id', 'total')
+    )
+    manual = dict(
+        unlinked.filter(description=MANUAL).values('account_id').annotate(total=Sum('delta'))
+        .order_by().values_list('account_id', 'total')
+    )
+    net = dict(
+        Transaction.objects.filter(account__isnull=False, **houses)
+        .values('account_id').annotate(total=Sum(Case(When(type='INCOME', then=F('value')), default=-F('value'))))
+        .order_by().values_list('account_id', 'total')
+    )
+    accounts, suspects, drift = [], 0, ZERO
+    for pk, house_id, balance in Account.objects.filter(**houses).values_list('pk', 'house_id', 'balance'):
+        adjusted = money(manual.get(pk) or 0)
+        expected = money((opening.get(pk) or 0) + (net.get(pk) or 0)) + adjusted
+        if adjusted:
+            # Mudança de saldo sem transação: edição legítima ou save com instância velha
+            suspects += 1
+        if expected != money(balance):
+            drift += abs(expected - money(balance))
+            accounts.append((house_id, Account(pk=pk, balance=expected)))
+
+    # Faturas: valor x soma das transações
+    totals = dict(
+        Transaction.objects.filter(invoice__isnull=False, **houses)
+        .values('invoice_id').annotate(total=Sum('value')).order_by().values_list('invoice_id', 'total')
+    )
+    invoices, owed_by_card = [], {}
+    for pk, card_id, house_id, value, amount_paid, status in Invoice.objects.filter(
+        card__house_id__gte=first_house, card__house_id__lte=last_house
+    ).values_list('pk', 'card_id', 'card__house_id', 'value', 'amount_paid', 'status'):
+        expected = money(totals.get(pk) or 0)
+        if expected != money(value):
+            drift += abs(expected - money(value))
+            invoices.append((house_id, Invoice(pk=pk, value=expected)))
+        if status != 'PAID':
+            owed_by_card[card_id] = owed_by_card.get(card_id, ZERO) + max(expected - money(amount_paid), ZERO)
+
+    # Cartões: limite disponível x limite total - saldo devedor
+    cards = []
+    for pk, house_id, limit_total, available in CreditCard.objects.filter(**houses).values_list(
+        'pk', 'house_id', 'limit_total', 'limit_available'
+    ):
+        expected = money(limit_total) - owed_by_card.get(pk, ZERO)
+        if expected != money(available):
+            drift += abs(expected - money(available))
+            cards.append((house_id, CreditCard(pk=pk, limit_available=expected)))
+
+    if fix and (accounts or invoices or cards):
+        changed_houses = {house_id for house_id, _ in accounts + invoices + cards}
+        with db_transaction.atomic():
+            _flush(Account, [row for _, row in accounts], ['balance'], batch_size)
+            # O extrato acompanha a correção, para continuar somando o saldo (um UPDATE
+            # direto muda o saldo sem passar pelo extrato: a diferença é contra a soma dele)
+            ledger = dict(
+                AccountLedgerEntry.objects.filter(account_id__in=[row.pk for _, row in accounts])
+                .values('account_id').annotate(total=Sum('delta')).order_by().values_list('account_id', 'total')
+            ) if accounts else {}
+            record_entries([
+                AccountLedgerEntry(account_id=row.pk, delta=row.balance - money(ledger.get(row.pk) or 0),
+                                   description=CORRECTION)
+                for _, row in accounts
+            ])
+            _flush(Invoice, [row for _, row in invoices], ['value'], batch_size)
+            _flush(CreditCard, [row for _, row in cards], ['limit_available'], batch_size)
+            House.objects.filter(pk__in=changed_houses).update(data_version=F('data_version') + 1)
+
+    return {
+        'houses': (first_house, last_house),
+        'accounts': len(accounts),
+        'suspects': suspects,
+        'invoices': len(invoices),
+        'cards': len(cards),
+        'drift': drift,
+        'seconds': time.perf_counter() - started,
+    }
@@ -2,13 +2,15 @@ import sys
 import re
 import calendar
 import datetime
+import json
 from decimal import Decimal, InvalidOperation
 from dateutil.relativedelta import relativedelta
 
 from django.shortcuts import get_object_or_404
+from django.http import StreamingHttpResponse
 from django.db import models, transaction as db_transaction, IntegrityError
-from django.db.models import Q, F, Sum
-from django.db.models.functions import TruncMonth
+from django.db.models import Q, F, Sum, Count, Exists, OuterRef, Value
+from django.db.models.functions import Greatest, TruncMonth
 from django.conf import settings
 from django.core.mail import send_mail
 from django.core.exceptions import ObjectDoesNotExist, ValidationError as DjangoValidationError
@@ -24,13 +26,14 @@ from rest_framework.decorators import action
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.exceptions import ValidationError
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.authtoken.models import Token
 
 from .models import (
     House, HouseMember, Account, CreditCard, Invoice, 
     Transaction, Product, InventoryItem, ShoppingList, 
-    RecurringBill, Category, TransactionItem, HouseInvitation
+    RecurringBill, Category, TransactionItem, HouseInvitation, MonthlySummary, AccountLedgerEntry, money
 )
 from .serializers import (
     HouseSerializer, HouseMemberSerializer, AccountSerializer, 
@@ -38,7 +41,21 @@ from .serializers import (
     ProductSerializer, InventoryItemSerializer, ShoppingListSerializer, 
     RecurringBillSerializer, CategorySerializer, TransactionItemSerializer, 
     HouseInvitationSerializer, PasswordResetRequestSerializer, PasswordResetConfirmSerializer,
-    ChangePasswordSerializer, ChangeEmailSerializer, UserSerializer
+    ChangePasswordSerializer, ChangeEmailSerializer, UserSerializer, current_invoice_prefetch
+)
+from .pagination import TransactionCursorPagination, TransactionSearchPagination
+from .search import search_transactions
+from .exporters import EXPORT_FORMATS, export_rows
+from .idempotency import idempotent
+from .summaries import record_bulk_create, summaries_suspended
+from .invoice_totals import record_invoice_bulk_create
+from .history import HistoryRangeError, build_series as build_history_series, parse_range as parse_history_range
+from .ledger import build_balance_series
+from .response_cache import bump_house_version, cache_house_response, get_cache_stats
+from .importers import StatementImportError, PARSERS, detect_format, import_statement, open_text_stream
+from .services import (
+    BalanceError, lock_sources, credit_account, restore_card_limits, debit_accounts,
+    debit_account, consume_card_limit, restore_card_limit, sync_shopping_list
 )
 
 User = get_user_model()
@@ -65,6 +82,59 @@ def safe_due_date(reference_date, due_day):
     safe_day = min(due_day, last_day)
     return reference_date.replace(day=safe_day)
 
+def build_installment_schedule(card, start_date, installments, today):
+    """Calcula uma única vez a data, a fatura e o vencimento de cada parcela."""
+    schedule = []
+    for i in range(installments):
+        parcel_date = start_date + relativedelta(months=i)
+        ref_date = get_invoice_ref_date(parcel_date, card.closing_day)
+        due_date = safe_due_date(ref_date, card.due_day)
+        schedule.append({
+            'parcel_date': parcel_date,
+            'reference_date': ref_date,
+            'due_date': due_date,
+            'status': 'PAID' if due_date < today else 'OPEN',
+        })
+    return schedule
+
+def upsert_installment_invoices(card, schedule, installment_val):
+    """
+    Garante a fatura de cada parcela com um número fixo de queries
+    (1 SELECT + 1 INSERT em lote + 1 UPDATE em lote), seja 1x ou 24x.
+    O valor das faturas é somado pelas próprias transações (core.invoice_totals);
+    aqui só entra o que já nasce pago. Retorna {reference_date: Invoice}.
+    """
+    # Mesmo valor arredondado das transações das parcelas
+    installment_val = money(installment_val)
+    increments = {}
+    for parcel in schedule:
+        ref = parcel['reference_date']
+        paid, initial_status = increments.get(ref, (Decimal(0), parcel['status']))
+        if parcel['status'] == 'PAID': paid += installment_val
+        increments[ref] = (paid, initial_status)
+
+    existing = {}
+    for inv in Invoice.objects.filter(card=card, reference_date__in=list(increments)).order_by('id'):
+        existing.setdefault(inv.reference_date, inv)
+
+    missing = [
+        Invoice(card=card, reference_date=ref, status=initial_status, value=0, amount_paid=paid)
+        for ref, (paid, initial_status) in increments.items() if ref not in existing
+    ]
+    invoices = {inv.reference_date: inv for inv in Invoice.objects.bulk_create(missing)}
+
+    # Incremento no banco (F) para não sobrescrever valores gravados em paralelo
+    paid_existing = []
+    for ref, inv in existing.items():
+        paid = increments[ref][0]
+        if paid:
+            inv.amount_paid = F('amount_paid') + paid
+            paid_existing.append(inv)
+    if paid_existing:
+        Invoice.objects.bulk_update(paid_existing, ['amount_paid'])
+    invoices.update(existing)
+    return invoices
+
 def to_decimal(value):
     if value is None: return Decimal('0.00')
     try:
@@ -74,6 +144,16 @@ def to_decimal(value):
     except:
         return Decimal('0.00')
 
+def parse_amount(value):
+    """Valor vindo do request como Decimal finito; ValueError se inválido (inclui NaN/Infinity)."""
+    try:
+        amount = Decimal(str(value).replace(',', '.'))
+    except InvalidOperation:
+        raise ValueError(f'Valor inválido: {value!r}')
+    if not amount.is_finite():
+        raise ValueError(f'Valor inválido: {value!r}')
+    return amount
+
 # ======================================================================
 # VIEWSETS BASE
 # ======================================================================
@@ -87,6 +167,13 @@ class BaseHouseViewSet(viewsets.ModelViewSet):
             return self.queryset.model.objects.none()
         return self.queryset.model.objects.filter(house=user.house_member.house)
 
+    # Listagens cacheadas por versão da casa (core.response_cache)
+    cache_list = True
+
+    @cache_house_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         user = self.request.user
         if hasattr(user, 'house_member'):
@@ -128,7 +215,8 @@ class HouseViewSet(viewsets.ModelViewSet):
         except HouseMember.DoesNotExist:
             return Response({'error': 'Membro não encontrado.'}, status=status.HTTP_403_FORBIDDEN)
 
-        house.delete()
+        with summaries_suspended():
+            house.delete()
         user.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -146,10 +234,10 @@ class HouseViewSet(viewsets.ModelViewSet):
 
         user_accounts = Account.objects.filter(owner=user, house=house)
         user_cards = CreditCard.objects.filter(owner=user, house=house)
-        Transaction.objects.filter(account__in=user_accounts).update(account=None)
+        Transaction.objects.filter(account__in=user_accounts).update(account=None, owner=None)
         
         user_invoices = Invoice.objects.filter(card__in=user_cards)
-        Transaction.objects.filter(invoice__in=user_invoices).update(invoice=None)
+        Transaction.objects.filter(invoice__in=user_invoices).update(invoice=None, owner=None)
 
         user_accounts.delete()
         user_cards.delete()
@@ -183,55 +271,89 @@ class CategoryViewSet(BaseHouseViewSet):
 # HISTÓRICO
 # ======================================================================
 
+def visible_transactions_for(user):
+    """Transações da casa que o usuário pode ver: as próprias e as compartilhadas."""
+    if not hasattr(user, 'house_member'):
+        return Transaction.objects.none()
+
+    return Transaction.objects.filter(house=user.house_member.house).filter(visibility_q(user))
+
+
+def visibility_q(user):
+    """Predicado de visibilidade de visible_transactions_for (negado: o que o usuário não vê)."""
+    allowed_users_ids = HouseMember.objects.filter(house=user.house_member.house).values_list('user_id', flat=True)
+
+    # Visibilidade via dono desnormalizado (Transaction.owner): um único predicado
+    # coberto por core_tx_visibility_idx, sem JOIN nas origens e sem DISTINCT.
+    return Q(owner=user) | Q(is_shared=True, owner_id__in=allowed_users_ids)
+
+
 class HistoryViewSet(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
+    @cache_house_response
     def list(self, request):
+        """
+        Totais da casa inteira por mês (MonthlySummary), como sempre foram.
+        O detalhamento (month_transactions) só lista o que o usuário vê; a diferença
+        vem explícita em hidden_income/hidden_expense/hidden_count de cada mês
+        (transações privadas de outros membros), então
+        income - hidden_income == soma das receitas do detalhamento (idem despesas).
+        """
         user = self.request.user
         if not hasattr(user, 'house_member'):
             return Response([])
         
         house = user.house_member.house
+
+        # ?from=&to=&granularity=day|week|month|year: séries com saldo acumulado
+        if any(param in request.query_params for param in ('from', 'to', 'granularity')):
+            try:
+                start, end, granularity = parse_history_range(request.query_params)
+            except HistoryRangeError as e:
+                return Response({'error': str(e)}, status=400)
+            return Response(build_history_series(house, start, end, granularity))
+
         today = datetime.date.today()
         start_date = (today - relativedelta(months=11)).replace(day=1)
-
-        transactions = Transaction.objects.filter(
-            house=house, 
-            date__gte=start_date
-        ).annotate(month=TruncMonth('date')).values(
-            'month', 'type', 'value', 'category__name', 'description', 'date', 'id'
+        # Totais já consolidados em MonthlySummary: uma linha por (mês, tipo, categoria)
+        rollup = MonthlySummary.objects.filter(house=house, month__gte=start_date).values(
+            'month', 'type', 'category__name', 'total'
         ).order_by('-month')
 
         estimated_fixed = RecurringBill.objects.filter(
             house=house, is_active=True
         ).aggregate(total=Sum('base_value'))['total'] or 0
 
+        # O que fica fora do detalhamento deste usuário, por mês (um GROUP BY)
+        hidden = {
+            row['month'].strftime('%Y-%m'): row
+            for row in Transaction.objects.filter(house=house, date__gte=start_date)
+            .exclude(visibility_q(user))
+            .annotate(month=TruncMonth('date')).values('month').annotate(
+                income=Sum('value', filter=Q(type='INCOME')),
+                expense=Sum('value', filter=~Q(type='INCOME')),
+                count=Count('id'),
+            ).order_by()
+        }
+
         history = {}
-        for t in transactions:
-            month_str = t['month'].strftime('%Y-%m')
+        for row in rollup:
+            month_str = row['month'].strftime('%Y-%m')
             if month_str not in history:
                 history[month_str] = {
-                    'month_label': t['month'],
+                    'month_label': row['month'],
                     'income': 0, 'expense': 0,
                     'estimated_expense': estimated_fixed,
-                    'categories': {}, 'transactions': []
+                    'categories': {}
                 }
-            
-            val = float(t['value'])
-            history[month_str]['transactions'].append({
-                'id': t['id'],
-                'description': t['description'],
-                'value': val,
-                'type': t['type'],
-                'date': t['date'],
-                'category': t['category__name'] or 'Outros'
-            })
 
-            if t['type'] == 'INCOME':
+            val = float(row['total'])
+            if row['type'] == 'INCOME':
                 history[month_str]['income'] += val
             else:
                 history[month_str]['expense'] += val
-                cat_name = t['category__name'] or 'Geral'
+                cat_name = row['category__name'] or 'Geral'
                 history[month_str]['categories'][cat_name] = history[month_str]['categories'].get(cat_name, 0) + val
 
         result = []
@@ -245,12 +367,82 @@ class HistoryViewSet(viewsets.ViewSet):
                 'expense': data['expense'],
                 'estimated': float(data['estimated_expense']),
                 'balance': data['income'] - data['expense'],
+                'hidden_income': float(hidden.get(key, {}).get('income') or 0),
+                'hidden_expense': float(hidden.get(key, {}).get('expense') or 0),
+                'hidden_count': hidden.get(key, {}).get('count', 0),
                 'chart_data': chart_data,
-                'transactions': data['transactions']
             })
 
         return Response(result)
 
+    @action(detail=False, methods=['get'], url_path=r'(?P<month>\d{4}-\d{2})/transactions')
+    def month_transactions(self, request, month=None):
+        """
+        Transações de um mês do histórico, sob demanda (?cursor=, ?page_size=).
+        Paginação por keyset (date, created_at, id) e resposta em streaming:
+        as linhas vêm de values().iterator() e são escritas uma a uma no JSON.
+        """
+        try:
+            start = datetime.datetime.strptime(month, '%Y-%m').date()
+        except ValueError:
+            return Response({'error': 'Mês inválido. Use AAAA-MM.'}, status=400)
+        end = start + relativedelta(months=1)
+
+        paginator = TransactionCursorPagination()
+        page_size = paginator.get_page_size(request)
+        # reverse: cursor de "previous", percorre para trás (como a listagem principal)
+        position, reverse = paginator.decode_cursor(request)
+
+        queryset = visible_transactions_for(request.user).filter(date__gte=start, date__lt=end)
+        if position is not None:
+            queryset = queryset.filter(paginator.keyset_filter(position, reverse))
+        ordering = ('date', 'created_at', 'id') if reverse else ('-date', '-created_at', '-id')
+        rows = queryset.order_by(*ordering).values(
+            'id', 'description', 'value', 'type', 'date', 'created_at', 'category__name'
+        )[:page_size + 1]
+
+        base_url = request.build_absolute_uri()
+
+        def link(row, backwards):
+            cursor = paginator.encode_position(row['date'], row['created_at'], row['id'], reverse=backwards)
+            return replace_query_param(base_url, paginator.cursor_query_param, cursor)
+
+        def stream():
+            if reverse:
+                # Página anterior: no máximo page_size + 1 linhas, reordenadas para exibição
+                fetched = list(rows)
+                has_more = len(fetched) > page_size
+                source = reversed(fetched[:page_size])
+            else:
+                source, has_more = rows.iterator(), False
+
+            yield '{"month":%s,"results":[' % json.dumps(month)
+            first = last = None
+            for index, row in enumerate(source):
+                if index == page_size:
+                    # Linha extra: existe página seguinte
+                    has_more = True
+                    break
+                yield (',' if index else '') + json.dumps({
+                    'id': row['id'],
+                    'description': row['description'],
+                    'value': float(row['value']),
+                    'type': row['type'],
+                    'date': row['date'].isoformat(),
+                    'category': row['category__name'] or 'Outros',
+                })
+                first = first or row
+                last = row
+
+            has_next, has_previous = (position is not None, has_more) if reverse else (has_more, position is not None)
+            next_link = link(last, False) if has_next and last else None
+            previous_link = None
+            if has_previous:
+                previous_link = link(first, True) if first else remove_query_param(base_url, paginator.cursor_query_param)
+            yield '],"next":%s,"previous":%s}' % (json.dumps(next_link), json.dumps(previous_link))
+
+        return StreamingHttpResponse(stream(), content_type='application/json')
+
 # ======================================================================
 # FINANCEIRO
 # ======================================================================
@@ -282,6 +474,19 @@ class AccountViewSet(BaseHouseViewSet):
         self.perform_update(serializer)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['get'], url_path='balance-series')
+    def balance_series(self, request, pk=None):
+        """
+        Saldo da conta ao fim de cada período (?from=&to=&granularity=, como no
+        histórico), lido do extrato: snapshot mensal + trecho até a data.
+        """
+        account = self.get_object()
+        try:
+            start, end, granularity = parse_history_range(request.query_params)
+        except HistoryRangeError as e:
+            return Response({'error': str(e)}, status=400)
+        return Response(build_balance_series(account, start, end, granularity))
+
 class CreditCardViewSet(BaseHouseViewSet):
     queryset = CreditCard.objects.all()
     serializer_class = CreditCardSerializer
@@ -291,7 +496,7 @@ class CreditCardViewSet(BaseHouseViewSet):
             house = user.house_member.house
             return CreditCard.objects.filter(house=house).filter(
                 Q(is_shared=True) | Q(owner=user)
-            )
+            ).prefetch_related(current_invoice_prefetch())
         return CreditCard.objects.none()
 
     def update(self, request, *args, **kwargs):
@@ -309,6 +514,56 @@ class CreditCardViewSet(BaseHouseViewSet):
         self.perform_update(serializer)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def forecast(self, request):
+        """
+        Projeção das faturas dos próximos ?months= meses (padrão 12, máx. 36) de
+        todos os cartões visíveis: soma das transações (parcelas futuras inclusas)
+        por cartão e mês de referência, numa única query agrupada.
+        """
+        try:
+            months = max(1, min(int(request.query_params.get('months', 12)), 36))
+        except ValueError:
+            return Response({'error': 'months deve ser um número.'}, status=400)
+
+        # Sem o prefetch da fatura atual: aqui só interessam closing_day/due_day
+        cards = list(self.get_queryset().prefetch_related(None).order_by('name', 'id'))
+        first_ref = datetime.date.today().replace(day=1)
+        refs = [first_ref + relativedelta(months=i) for i in range(months)]
+
+        totals = Transaction.objects.filter(
+            invoice__card__in=[card.pk for card in cards],
+            invoice__reference_date__gte=refs[0], invoice__reference_date__lte=refs[-1],
+        ).values('invoice__card_id', 'invoice__reference_date').annotate(total=Sum('value')).order_by()
+        by_card = {(row['invoice__card_id'], row['invoice__reference_date']): row['total'] for row in totals}
+
+        month_totals = dict.fromkeys(refs, Decimal('0.00'))
+        result = []
+        for card in cards:
+            # Vencimentos calculados uma vez por cartão (não por linha)
+            due_dates = [safe_due_date(ref, card.due_day) for ref in refs]
+            forecast = []
+            for ref, due in zip(refs, due_dates):
+                value = by_card.get((card.pk, ref)) or Decimal('0.00')
+                month_totals[ref] += value
+                forecast.append({
+                    'month': ref.strftime('%Y-%m'),
+                    'reference_date': ref,
+                    'due_date': due,
+                    'value': float(value),
+                })
+            result.append({
+                'id': card.pk, 'name': card.name,
+                'closing_day': card.closing_day, 'due_day': card.due_day,
+                'forecast': forecast,
+            })
+
+        return Response({
+            'months': [ref.strftime('%Y-%m') for ref in refs],
+            'cards': result,
+            'totals': [{'month': ref.strftime('%Y-%m'), 'value': float(total)} for ref, total in month_totals.items()],
+        })
+
 class InvoiceViewSet(BaseHouseViewSet):
     queryset = Invoice.objects.all()
     serializer_class = InvoiceSerializer
@@ -326,38 +581,216 @@ class InvoiceViewSet(BaseHouseViewSet):
             date_payment = request.data.get('date', datetime.date.today())
 
             account = Account.objects.get(id=account_id, house=invoice.card.house)
-            
-            Transaction.objects.create(
-                house=invoice.card.house,
-                description=f"Pagamento Fatura {invoice.card.name}",
-                value=payment_value, type='EXPENSE',
-                account=account, date=date_payment, category=None 
-            )
 
-            invoice.amount_paid = to_decimal(invoice.amount_paid) + payment_value
-            invoice.value = to_decimal(invoice.value)
-            if invoice.amount_paid >= invoice.value:
-                invoice.status = 'PAID'
-            invoice.save()
+            with db_transaction.atomic():
+                lock_sources(account_ids=[account.pk], card_ids=[invoice.card_id])
 
-            current_available = to_decimal(invoice.card.limit_available)
-            max_limit = to_decimal(invoice.card.limit_total)
-            new_available = current_available + payment_value
-            if new_available > max_limit: new_available = max_limit
-            
-            invoice.card.limit_available = new_available
-            invoice.card.save()
-            
-            account.balance = to_decimal(account.balance) - payment_value
-            account.save()
+                payment = Transaction.objects.create(
+                    house=invoice.card.house,
+                    description=f"Pagamento Fatura {invoice.card.name}",
+                    value=payment_value, type='EXPENSE',
+                    account=account, date=date_payment, category=None 
+                )
+
+                Invoice.objects.filter(pk=invoice.pk).update(amount_paid=F('amount_paid') + payment_value)
+                Invoice.objects.filter(pk=invoice.pk, amount_paid__gte=F('value')).update(status='PAID')
+
+                restore_card_limit(invoice.card, payment_value)
+                # Sem saldo (mais o cheque especial): BalanceError desfaz o pagamento
+                debit_account(
+                    account, payment_value, date=date_payment, description=payment.description, transaction=payment
+                )
 
             return Response({'message': 'Fatura paga com sucesso'}, status=status.HTTP_200_OK)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['post'], url_path='pay-batch')
+    @idempotent('invoices.pay-batch')
+    def pay_batch(self, request):
+        """
+        Paga várias faturas de uma vez: {"payments": [{"invoice", "account", "value", "date"?}]}.
+        Itens inválidos voltam com erro e não impedem os demais; os válidos são
+        aplicados juntos numa única transação, com as linhas travadas uma vez e
+        as atualizações de faturas, cartões e contas em lote.
+        """
+        user = request.user
+        house = user.house_member.house
+        items = request.data.get('payments') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'Envie a lista "payments".'}, status=400)
+
+        # Valida e converte os ids antes de qualquer query
+        results, parsed = [], []
+        for index, item in enumerate(items):
+            result = {'index': index, 'invoice': item.get('invoice') if isinstance(item, dict) else None}
+            results.append(result)
+            try:
+                invoice_id, account_id = int(item['invoice']), int(item['account'])
+                value = parse_amount(item.get('value'))
+                pay_date = datetime.date.fromisoformat(item['date']) if item.get('date') else datetime.date.today()
+            except (KeyError, TypeError, ValueError):
+                result.update(status='error', error='Fatura, conta, valor ou data inválida.')
+                continue
+            if value <= 0:
+                result.update(status='error', error='Valor inválido.')
+                continue
+            parsed.append((result, invoice_id, account_id, money(value), pay_date))
+
+        if not parsed:
+            return Response({'results': results}, status=400)
+
+        try:
+            with db_transaction.atomic():
+                invoice_cards = dict(Invoice.objects.filter(
+                    card__house=house, pk__in=[invoice_id for _, invoice_id, _, _, _ in parsed]
+                ).values_list('pk', 'card_id'))
+                accounts = Account.objects.filter(
+                    house=house, pk__in=[account_id for _, _, account_id, _, _ in parsed]
+                ).in_bulk()
+                # Mesma ordem das demais escritas (lançamento, pagamento avulso, compra):
+                # contas e cartões primeiro, depois as faturas, sempre por pk
+                lock_sources(
+                    account_ids=[account_id for _, invoice_id, account_id, _, _ in parsed
+                                 if invoice_id in invoice_cards and account_id in accounts],
+                    card_ids=set(invoice_cards.values()),
+                )
+                # Faturas travadas: o saldo restante não muda até o commit
+                invoices = {
+                    invoice.pk: invoice for invoice in Invoice.objects.select_for_update(of=('self',))
+                    .filter(pk__in=invoice_cards).select_related('card').order_by('pk')
+                }
+
+                valid = []
+                remaining = {pk: max(inv.value - inv.amount_paid, Decimal(0)) for pk, inv in invoices.items()}
+                for result, invoice_id, account_id, value, pay_date in parsed:
+                    if invoice_id not in invoices or account_id not in accounts:
+                        result.update(status='error', error='Fatura ou conta não encontrada.')
+                        continue
+                    # Nunca paga além do que falta na fatura
+                    value = min(value, remaining[invoice_id])
+                    if value <= 0:
+                        result.update(status='error', error='Fatura já quitada.')
+                        continue
+                    remaining[invoice_id] -= value
+                    valid.append((result, invoices[invoice_id], accounts[account_id], value, pay_date))
+
+                if not valid:
+                    return Response({'results': results}, status=400)
+
+                paid_by_invoice, restore_by_card, debit_by_account = {}, {}, {}
+                payment_transactions = []
+                for _, invoice, account, value, pay_date in valid:
+                    paid_by_invoice[invoice.pk] = paid_by_invoice.get(invoice.pk, Decimal(0)) + value
+                    restore_by_card[invoice.card_id] = restore_by_card.get(invoice.card_id, Decimal(0)) + value
+                    debit_by_account[account.pk] = debit_by_account.get(account.pk, Decimal(0)) + value
+                    payment_transactions.append(Transaction(
+                        house=house, description=f"Pagamento Fatura {invoice.card.name}",
+                        value=value, type='EXPENSE', account=account, date=pay_date,
+                        owner_id=account.owner_id, is_shared=account.is_shared,
+                    ))
+
+                # bulk_create não chama save(): dono/privacidade vêm da conta (acima)
+                Transaction.objects.bulk_create(payment_transactions)
+                record_bulk_create(payment_transactions)
+
+                paid_invoices = []
+                for invoice_id, amount in paid_by_invoice.items():
+                    paid = Invoice(pk=invoice_id)
+                    paid.amount_paid = F('amount_paid') + amount
+                    paid_invoices.append(paid)
+                Invoice.objects.bulk_update(paid_invoices, ['amount_paid'])
+                Invoice.objects.filter(pk__in=paid_by_invoice, amount_paid__gte=F('value')).update(status='PAID')
+
+                restore_card_limits(house.pk, restore_by_card)
+                # Débito condicional (saldo + cheque especial), como no pagamento avulso
+                debit_accounts(house.pk, debit_by_account, entries=[
+                    AccountLedgerEntry(account_id=tx.account_id, delta=-tx.value, date=tx.date,
+                                       description=tx.description, transaction=tx)
+                    for tx in payment_transactions
+                ])
+        except BalanceError as e:
+            return Response({'error': str(e), 'results': results}, status=400)
+
+        final = Invoice.objects.filter(pk__in=paid_by_invoice).in_bulk()
+        for result, invoice, account, value, _ in valid:
+            current = final[invoice.pk]
+            result.update(
+                status='paid', account=account.pk, value=value,
+                invoice_status=current.status, remaining=max(current.value - current.amount_paid, Decimal(0)),
+            )
+        return Response({'results': results})
+
+def parse_month_param(raw, default):
+    """'AAAA-MM' -> primeiro dia do mês; vazio -> default."""
+    if not raw:
+        return default
+    try:
+        return datetime.datetime.strptime(raw, '%Y-%m').date()
+    except ValueError:
+        raise ValidationError({'error': 'Mês inválido. Use AAAA-MM.'})
+
+
 class RecurringBillViewSet(BaseHouseViewSet):
     queryset = RecurringBill.objects.all()
     serializer_class = RecurringBillSerializer
+    MAX_MATRIX_MONTHS = 60
+
+    def get_queryset(self):
+        # Situação "paga" de todas as contas num único EXISTS (?month=AAAA-MM, padrão: mês atual)
+        month = parse_month_param(self.request.query_params.get('month'), datetime.date.today().replace(day=1))
+        paid = Transaction.objects.filter(
+            recurring_bill=OuterRef('pk'), date__gte=month, date__lt=month + relativedelta(months=1)
+        )
+        return super().get_queryset().select_related('category').annotate(is_paid=Exists(paid))
+
+    @action(detail=False, methods=['get'])
+    def matrix(self, request):
+        """
+        Matriz conta fixa x mês (?from=AAAA-MM&to=AAAA-MM, padrão: últimos 12 meses):
+        pago ou não e o valor efetivamente lançado, numa única query agrupada.
+        """
+        current = datetime.date.today().replace(day=1)
+        end = parse_month_param(request.query_params.get('to'), current)
+        start = parse_month_param(request.query_params.get('from'), end - relativedelta(months=11))
+        if start > end:
+            return Response({'error': '"from" deve ser anterior a "to".'}, status=400)
+        span = (end.year - start.year) * 12 + end.month - start.month + 1
+        if span > self.MAX_MATRIX_MONTHS:
+            return Response({'error': f'Intervalo grande demais: no máximo {self.MAX_MATRIX_MONTHS} meses.'}, status=400)
+
+        months = []
+        month = start
+        while month <= end:
+            months.append(month)
+            month += relativedelta(months=1)
+
+        bills = list(super().get_queryset().order_by('due_day', 'name'))
+        totals = Transaction.objects.filter(
+            recurring_bill__in=[bill.pk for bill in bills],
+            date__gte=months[0], date__lt=months[-1] + relativedelta(months=1),
+        ).annotate(month=TruncMonth('date')).values('recurring_bill', 'month').annotate(
+            total=Sum('value'), count=Count('id')
+        ).order_by()
+        cells = {(row['recurring_bill'], row['month']): row for row in totals}
+
+        result = []
+        for bill in bills:
+            row = []
+            for month in months:
+                cell = cells.get((bill.pk, month))
+                row.append({
+                    'month': month.strftime('%Y-%m'),
+                    'paid': cell is not None,
+                    'amount': float(cell['total']) if cell else 0.0,
+                    'count': cell['count'] if cell else 0,
+                })
+            result.append({
+                'id': bill.pk, 'name': bill.name, 'base_value': float(bill.base_value),
+                'due_day': bill.due_day, 'is_active': bill.is_active, 'months': row,
+            })
+
+        return Response({'months': [month.strftime('%Y-%m') for month in months], 'bills': result})
 
     def create(self, request, *args, **kwargs):
         house = request.user.house_member.house
@@ -382,21 +815,31 @@ class TransactionViewSet(viewsets.ModelViewSet):
     queryset = Transaction.objects.all()
     serializer_class = TransactionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # Ativa apenas com ?cursor= ou ?page_size= (ver TransactionCursorPagination)
+    pagination_class = TransactionCursorPagination
+
+    @property
+    def paginator(self):
+        # Busca (?q=) é ordenada por relevância, então pagina por número de página
+        if not hasattr(self, '_paginator'):
+            if self.request is not None and self.request.query_params.get('q'):
+                self._paginator = TransactionSearchPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
-    def get_queryset(self):
-        user = self.request.user
-        my_house_ids = HouseMember.objects.filter(user=user).values_list('house_id', flat=True)
-        allowed_users_ids = HouseMember.objects.filter(house_id__in=my_house_ids).values_list('user_id', flat=True)
+    def visible_transactions(self):
+        return visible_transactions_for(self.request.user)
 
-        queryset = Transaction.objects.select_related(
+    def get_queryset(self):
+        queryset = self.visible_transactions().select_related(
             'category', 'account', 'account__owner', 'invoice', 
             'invoice__card', 'invoice__card__owner', 'recurring_bill'
-        ).filter(
-            Q(account__owner=user) | 
-            Q(invoice__card__owner=user) |  
-            Q(is_shared=True, account__owner__id__in=allowed_users_ids) |
-            Q(is_shared=True, invoice__card__owner__id__in=allowed_users_ids)
-        ).distinct().order_by('-date', '-created_at')
+        ).order_by('-date', '-created_at', '-id')
+
+        query = self.request.query_params.get('q')
+        if query and self.action == 'list':
+            return search_transactions(queryset, query)
 
         limit = self.request.query_params.get('limit')
         if limit:
@@ -404,6 +847,7 @@ class TransactionViewSet(viewsets.ModelViewSet):
             except ValueError: pass
         return queryset
 
+    @idempotent('transactions.create')
     def create(self, request, *args, **kwargs):
         data = request.data
         user = request.user
@@ -453,6 +897,11 @@ class TransactionViewSet(viewsets.ModelViewSet):
 
         try:
             with db_transaction.atomic():
+                # Trava apenas as contas/cartões envolvidos, em ordem fixa (evita deadlock)
+                lock_sources(
+                    account_ids=[p.get('id') for p in payments if p.get('method') != 'CREDIT_CARD' or tx_type == 'INCOME'],
+                    card_ids=[p.get('id') for p in payments if p.get('method') == 'CREDIT_CARD' and tx_type == 'EXPENSE'],
+                )
                 first_transaction = None
                 
                 # Loop para criar uma transação por pagamento
@@ -476,50 +925,30 @@ class TransactionViewSet(viewsets.ModelViewSet):
                     if tx_type == 'EXPENSE' and method == 'ACCOUNT':
                         if not source_id: return Response({'error': 'Selecione uma conta.'}, status=400)
                         account = Account.objects.get(id=source_id, house=house)
-                        if val > to_decimal(account.balance) + to_decimal(account.limit):
-                            return Response({'error': f'Saldo insuficiente na conta {account.name}.'}, status=400)
-                        account.balance = to_decimal(account.balance) - val
-                        account.save()
 
                     # --- Lógica de Cartão ---
                     elif tx_type == 'EXPENSE' and method == 'CREDIT_CARD':
                         if not source_id: return Response({'error': 'Selecione um cartão.'}, status=400)
                         card = CreditCard.objects.get(id=source_id, house=house)
                         
-                        # Parcelas
+                        # Parcelas: datas e faturas calculadas uma única vez
                         installment_val = val / installments
-                        amount_to_deduct = Decimal(0)
-                        for i in range(installments):
-                            parcel_date = date_tx + relativedelta(months=i)
-                            ref_date = get_invoice_ref_date(parcel_date, card.closing_day)
-                            due_date = safe_due_date(ref_date, card.due_day)
-                            if due_date >= today: amount_to_deduct += installment_val
-
-                        if amount_to_deduct > to_decimal(card.limit_available):
-                            return Response({'error': f'Limite indisponível no cartão {card.name}.'}, status=400)
-                        
-                        card.limit_available = to_decimal(card.limit_available) - amount_to_deduct
-                        card.save()
+                        schedule = build_installment_schedule(card, date_tx, installments, today)
+                        amount_to_deduct = sum(
+                            (installment_val for parcel in schedule if parcel['due_date'] >= today),
+                            Decimal(0)
+                        )
 
-                        # Fatura da 1ª parcela (ou única)
-                        first_ref = get_invoice_ref_date(date_tx, card.closing_day)
-                        first_due = safe_due_date(first_ref, card.due_day)
-                        initial_status = 'PAID' if first_due < today else 'OPEN'
+                        consume_card_limit(card, amount_to_deduct)
 
-                        invoice, _ = Invoice.objects.get_or_create(
-                            card=card, reference_date=first_ref,
-                            defaults={'value': 0, 'status': initial_status}
-                        )
-                        invoice.value = to_decimal(invoice.value) + installment_val
-                        if initial_status == 'PAID': invoice.amount_paid = to_decimal(invoice.amount_paid) + installment_val
-                        invoice.save()
+                        # Todas as faturas (1ª parcela e futuras) em lote
+                        invoices_by_ref = upsert_installment_invoices(card, schedule, installment_val)
+                        invoice = invoices_by_ref[schedule[0]['reference_date']]
 
                     # --- Receita ---
                     elif tx_type == 'INCOME':
                         if not source_id: return Response({'error': 'Selecione uma conta.'}, status=400)
                         account = Account.objects.get(id=source_id, house=house)
-                        account.balance = to_decimal(account.balance) + val 
-                        account.save()
 
                     # --- Criação da Transação Principal deste pagamento ---
                     final_desc_db = description
@@ -537,6 +966,15 @@ class TransactionViewSet(viewsets.ModelViewSet):
                         is_shared=data.get('is_shared', False)
                     )
 
+                    # Conta: débito/crédito depois da transação, para o extrato apontar para ela
+                    # (saldo insuficiente desfaz tudo no atomic)
+                    if account:
+                        ledger = {'date': date_tx, 'description': final_desc_db, 'transaction': transaction_instance}
+                        if tx_type == 'INCOME':
+                            credit_account(account, val, **ledger)
+                        else:
+                            debit_account(account, val, use_limit=True, **ledger)
+
                     if index == 0:
                         first_transaction = transaction_instance
 
@@ -546,22 +984,19 @@ class TransactionViewSet(viewsets.ModelViewSet):
                         new_transactions = []
                         
                         for i in range(1, installments):
-                            parcel_date = date_tx + relativedelta(months=i)
-                            fut_ref = get_invoice_ref_date(parcel_date, card.closing_day)
-                            fut_due = safe_due_date(fut_ref, card.due_day)
-                            fut_status = 'PAID' if fut_due < today else 'OPEN'
-
-                            fut_invoice, _ = Invoice.objects.get_or_create(card=card, reference_date=fut_ref, defaults={'value': 0, 'status': fut_status})
-                            fut_invoice.value = to_decimal(fut_invoice.value) + installment_val
-                            if fut_status == 'PAID': fut_invoice.amount_paid = to_decimal(fut_invoice.amount_paid) + installment_val
-                            fut_invoice.save()
+                            parcel_date = schedule[i]['parcel_date']
+                            fut_invoice = invoices_by_ref[schedule[i]['reference_date']]
 
+                            # bulk_create não chama save(): o dono é informado explicitamente
                             new_transactions.append(Transaction(
                                 house=house, description=f"{description} ({i+1}/{installments})",
-                                value=installment_val, type='EXPENSE', invoice=fut_invoice, date=parcel_date,
-                                category_id=category_id, is_shared=data.get('is_shared', False)
+                                value=money(installment_val), type='EXPENSE', invoice=fut_invoice, date=parcel_date,
+                                category_id=category_id, is_shared=data.get('is_shared', False),
+                                owner=card.owner
                             ))
                         Transaction.objects.bulk_create(new_transactions)
+                        record_bulk_create(new_transactions)
+                        record_invoice_bulk_create(new_transactions)
 
                 # 4. Vincular Itens (Se houver) - APENAS NA PRIMEIRA TRANSAÇÃO
                 if items_data and isinstance(items_data, list) and first_transaction:
@@ -582,10 +1017,68 @@ class TransactionViewSet(viewsets.ModelViewSet):
 
         except Account.DoesNotExist: return Response({'error': 'Conta não encontrada.'}, status=400)
         except CreditCard.DoesNotExist: return Response({'error': 'Cartão não encontrado.'}, status=400)
+        except BalanceError as e: return Response({'error': str(e)}, status=400)
         except Exception as e:
             print(f"ERRO CRITICO TRANSACTION: {e}")
             return Response({'error': f"Erro interno: {str(e)}"}, status=400)
 
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Exporta as transações visíveis em streaming (?fmt=csv|ndjson, ?from=, ?to=, ?items=1).
+        Lê linhas via values() + iterator(), sem instanciar models nem o serializer.
+        """
+        fmt = request.query_params.get('fmt', 'csv').lower()
+        if fmt not in EXPORT_FORMATS:
+            return Response({'error': f'Formato não suportado: {fmt}'}, status=400)
+
+        queryset = self.visible_transactions()
+        try:
+            for param, lookup in (('from', 'date__gte'), ('to', 'date__lte')):
+                raw = request.query_params.get(param)
+                if raw:
+                    queryset = queryset.filter(**{lookup: datetime.date.fromisoformat(raw)})
+        except ValueError:
+            return Response({'error': 'Datas devem estar no formato AAAA-MM-DD.'}, status=400)
+
+        with_items = request.query_params.get('items') in ('1', 'true')
+        rows = export_rows(queryset, with_items=with_items)
+        content_type, extension, render = EXPORT_FORMATS[fmt]
+
+        response = StreamingHttpResponse(render(rows, with_items), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="transacoes.{extension}"'
+        return response
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_statement(self, request):
+        """Importa extrato CSV/OFX (multipart: file, account, format opcional)."""
+        user = request.user
+        if not hasattr(user, 'house_member'):
+            return Response({'error': 'Você não pertence a uma casa.'}, status=400)
+        house = user.house_member.house
+
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response({'error': 'Envie o arquivo do extrato.'}, status=400)
+
+        fmt = request.data.get('format') or detect_format(upload.name)
+        if fmt not in PARSERS:
+            return Response({'error': f'Formato não suportado: {fmt}'}, status=400)
+
+        try:
+            account = Account.objects.filter(house=house).filter(
+                Q(is_shared=True) | Q(owner=user)
+            ).get(id=request.data.get('account'))
+        except (Account.DoesNotExist, ValueError, TypeError):
+            return Response({'error': 'Conta não encontrada.'}, status=400)
+
+        try:
+            summary = import_statement(account, open_text_stream(upload.file), fmt=fmt)
+        except StatementImportError as e:
+            return Response({'error': f'Extrato inválido: {e}'}, status=400)
+
+        return Response(summary, status=status.HTTP_201_CREATED)
+
 # ======================================================================
 # ESTOQUE E COMPRAS (COM CORREÇÃO OFFLINE + MULTI-PAGAMENTO)
 # ======================================================================
@@ -605,6 +1098,93 @@ class InventoryViewSet(BaseHouseViewSet):
         if not min_qty: min_qty = product.min_quantity
         serializer.save(house=user.house_member.house, min_quantity=min_qty)
 
+    @action(detail=False, methods=['post'], url_path='bulk-adjust')
+    @idempotent('inventory.bulk-adjust')
+    def bulk_adjust(self, request):
+        """
+        Ajusta vários itens do estoque de uma vez:
+        {"items": [{"product", "delta"} ou {"product", "quantity"}]}.
+        Itens inválidos voltam com erro e não impedem os demais. Os válidos são
+        gravados em lote (bulk_create/bulk_update) e a lista de compras é
+        reconciliada uma única vez para todos os produtos.
+        """
+        house = request.user.house_member.house
+        items = request.data.get('items') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'Envie a lista "items".'}, status=400)
+
+        # Valida e converte ids e quantidades antes de qualquer query
+        parsed, results = [], []
+        for index, item in enumerate(items):
+            result = {'index': index, 'product': item.get('product') if isinstance(item, dict) else None}
+            results.append(result)
+            try:
+                product_id = int(item['product'])
+                field = 'quantity' if item.get('quantity') is not None else 'delta'
+                value = parse_amount(item[field])
+                if field == 'quantity' and value < 0:
+                    result.update(status='error', error='Quantidade não pode ser negativa.')
+                    continue
+            except (KeyError, TypeError, ValueError):
+                result.update(status='error', error='Produto ou quantidade inválida.')
+                continue
+            parsed.append((result, product_id, field, value))
+
+        products = Product.objects.filter(
+            Q(house=house) | Q(house__isnull=True), pk__in=[product_id for _, product_id, _, _ in parsed],
+        ).in_bulk() if parsed else {}
+
+        # Por produto: [quantidade absoluta ou None, soma dos deltas], na ordem enviada
+        changes = {}
+        for result, product_id, field, value in parsed:
+            product = products.get(product_id)
+            if product is None:
+                result.update(status='error', error='Produto ou quantidade inválida.')
+                continue
+            change = changes.setdefault(product.pk, [None, Decimal('0')])
+            if field == 'quantity':
+                change[:] = [value, Decimal('0')]
+            else:
+                change[1] += value
+            result['status'] = 'ok'
+
+        if not changes:
+            return Response({'results': results}, status=400)
+
+        with db_transaction.atomic():
+            existing = {
+                item.product_id: item
+                for item in InventoryItem.objects.select_for_update().filter(house=house, product_id__in=changes)
+            }
+            to_create, to_update = [], []
+            for product_id, (quantity, delta) in changes.items():
+                item = existing.get(product_id)
+                if item is None:
+                    to_create.append(InventoryItem(
+                        house=house, product_id=product_id, quantity=max((quantity or 0) + delta, Decimal('0')),
+                        min_quantity=products[product_id].min_quantity,
+                    ))
+                    continue
+                # Delta aplicado no UPDATE (F), sem deixar o estoque negativo
+                base = F('quantity') if quantity is None else Value(quantity)
+                item.quantity = Greatest(base + delta, Value(Decimal('0')))
+                to_update.append(item)
+            InventoryItem.objects.bulk_create(to_create)
+            InventoryItem.objects.bulk_update(to_update, ['quantity'])
+            bump_house_version(house.pk)
+
+            created, updated, removed = sync_shopping_list(house.pk, changes)
+
+        final = dict(InventoryItem.objects.filter(house=house, product_id__in=changes).values_list('product_id', 'quantity'))
+        for result in results:
+            if result['status'] == 'ok':
+                result['quantity'] = final[int(result['product'])]
+
+        return Response({
+            'results': results,
+            'shopping_list': {'created': created, 'updated': updated, 'removed': removed},
+        })
+
 class ShoppingListViewSet(BaseHouseViewSet):
     queryset = ShoppingList.objects.all()
     serializer_class = ShoppingListSerializer
@@ -613,30 +1193,10 @@ class ShoppingListViewSet(BaseHouseViewSet):
         user = self.request.user
         if not hasattr(user, 'house_member'): return ShoppingList.objects.none()
         house = user.house_member.house
-        
-        low_stock_items = InventoryItem.objects.filter(house=house, quantity__lt=models.F('min_quantity'))
-        
-        for item in low_stock_items:
-            needed = item.min_quantity - item.quantity
-            if needed <= 0: needed = Decimal('1.00')
-            
-            obj, created = ShoppingList.objects.get_or_create(
-                house=house, product=item.product,
-                defaults={
-                    'quantity_to_buy': needed, 
-                    'real_unit_price': item.product.estimated_price, 
-                    'discount_unit_price': item.product.estimated_price, 
-                    'is_purchased': False
-                }
-            )
-            if not created and not obj.is_purchased:
-                if obj.quantity_to_buy != needed:
-                    obj.quantity_to_buy = needed
-                    obj.save()
 
-        # [CORREÇÃO] Removida a linha que deletava itens manuais.
-        
-        return ShoppingList.objects.filter(house=house).order_by('is_purchased', 'product__name')
+        # Leitura pura: a lista é sincronizada com o estoque nas escritas de
+        # InventoryItem (services.sync_shopping_list)
+        return ShoppingList.objects.filter(house=house).select_related('product').order_by('is_purchased', 'product__name')
 
     def perform_create(self, serializer):
         user = self.request.user
@@ -657,6 +1217,7 @@ class ShoppingListViewSet(BaseHouseViewSet):
         serializer.save(house=house)
 
     @action(detail=False, methods=['post'])
+    @idempotent('shopping-list.finish')
     def finish(self, request):
         user = self.request.user
         house = user.house_member.house
@@ -673,14 +1234,15 @@ class ShoppingListViewSet(BaseHouseViewSet):
             return Response({'error': 'Nenhum pagamento informado.'}, status=400)
 
         purchased_items = ShoppingList.objects.filter(house=house, is_purchased=True)
-        if not purchased_items.exists(): return Response({'error': 'Carrinho vazio.'}, status=400)
+        purchased = list(purchased_items.select_related('product'))
+        if not purchased: return Response({'error': 'Carrinho vazio.'}, status=400)
 
         # Validação de Total (Com margem de 5 centavos)
         total_cart = sum([
             (to_decimal(item.real_unit_price) if item.real_unit_price > 0 else 
              (to_decimal(item.discount_unit_price) if item.discount_unit_price > 0 else to_decimal(item.product.estimated_price))) 
             * item.quantity_to_buy 
-            for item in purchased_items
+            for item in purchased
         ])
         
         total_payments = sum([to_decimal(p.get('value', 0)) for p in payments])
@@ -690,6 +1252,10 @@ class ShoppingListViewSet(BaseHouseViewSet):
 
         try:
             with db_transaction.atomic():
+                lock_sources(
+                    account_ids=[p.get('id') for p in payments if p.get('method') == 'ACCOUNT'],
+                    card_ids=[p.get('id') for p in payments if p.get('method') == 'CREDIT_CARD'],
+                )
                 category, _ = Category.objects.get_or_create(house=house, name="Compras", defaults={'type': 'EXPENSE'})
                 
                 first_transaction = None
@@ -711,27 +1277,17 @@ class ShoppingListViewSet(BaseHouseViewSet):
 
                     if method == 'ACCOUNT':
                         account = Account.objects.get(id=source_id, house=house)
-                        if value > to_decimal(account.balance): 
-                            raise ValidationError(f"Saldo insuficiente na conta {account.name}.")
-                        account.balance = to_decimal(account.balance) - value
-                        account.save()
                         description = f"Mercado ({account.name}){desc_suffix}"
                     
                     elif method == 'CREDIT_CARD':
                         card = CreditCard.objects.get(id=source_id, house=house)
-                        if value > to_decimal(card.limit_available): 
-                            raise ValidationError(f"Limite insuficiente no cartão {card.name}.")
+                        consume_card_limit(card, value)
                         
                         ref_date = get_invoice_ref_date(purchase_date, card.closing_day)
                         invoice, _ = Invoice.objects.get_or_create(
                             card=card, reference_date=ref_date, 
                             defaults={'value': 0, 'status': 'OPEN'}
                         )
-                        invoice.value = to_decimal(invoice.value) + value
-                        invoice.save()
-                        
-                        card.limit_available = to_decimal(card.limit_available) - value
-                        card.save()
                         description = f"Mercado ({card.name}){desc_suffix}"
 
                     # Cria a transação financeira
@@ -740,13 +1296,16 @@ class ShoppingListViewSet(BaseHouseViewSet):
                         type='EXPENSE', account=account, invoice=invoice,
                         category=category, date=purchase_date
                     )
+                    if account:
+                        debit_account(account, value, use_limit=False, date=purchase_date,
+                                      description=description, transaction=transaction)
 
                     if index == 0:
                         first_transaction = transaction
 
                 # [VÍNCULO DE ITENS] Apenas na primeira transação
-                transaction_items = []
-                for shop_item in purchased_items:
+                transaction_items, bought, priced = [], {}, []
+                for shop_item in purchased:
                     qty = shop_item.quantity_to_buy
                     unit_price = to_decimal(shop_item.real_unit_price)
                     if unit_price <= 0: 
@@ -759,26 +1318,44 @@ class ShoppingListViewSet(BaseHouseViewSet):
                         value=unit_price * qty
                     ))
                     
-                    inv_item, _ = InventoryItem.objects.get_or_create(
-                        house=house, product=shop_item.product, 
-                        defaults={'min_quantity': 1, 'quantity': 0}
-                    )
-                    inv_item.quantity += qty
-                    inv_item.save()
-                    
+                    bought[shop_item.product_id] = bought.get(shop_item.product_id, 0) + qty
+
                     if unit_price > 0:
                         shop_item.product.estimated_price = unit_price
-                        shop_item.product.save()
+                        priced.append(shop_item.product)
                     
                     total_items_count += 1
 
                 TransactionItem.objects.bulk_create(transaction_items)
+                Product.objects.bulk_update(priced, ['estimated_price'])
+
+                # Estoque em lote, como no bulk-adjust: sem save() por item (cada um
+                # sincronizaria a lista); os existentes somam a quantidade num UPDATE
+                existing = dict(
+                    InventoryItem.objects.select_for_update().filter(house=house, product_id__in=bought)
+                    .values_list('product_id', 'pk')
+                )
+                InventoryItem.objects.bulk_create([
+                    InventoryItem(house=house, product_id=product_id, min_quantity=1, quantity=qty)
+                    for product_id, qty in bought.items() if product_id not in existing
+                ])
+                restocked = []
+                for product_id, pk in existing.items():
+                    inv_item = InventoryItem(pk=pk)
+                    inv_item.quantity = F('quantity') + bought[product_id]
+                    restocked.append(inv_item)
+                InventoryItem.objects.bulk_update(restocked, ['quantity'])
+
                 purchased_items.delete()
+                # O que continuar abaixo do mínimo volta para a lista
+                sync_shopping_list(house.pk, list(bought))
 
                 return Response({'message': f'Compra finalizada! {total_items_count} itens.'}, status=200)
 
         except (Account.DoesNotExist, CreditCard.DoesNotExist):
             return Response({'error': 'Meio de pagamento não encontrado.'}, status=404)
+        except BalanceError as e:
+            return Response({'error': str(e)}, status=400)
         except ValidationError as e:
              return Response({'error': e.detail[0] if isinstance(e.detail, list) else str(e)}, status=400)
         except Exception as e:
@@ -947,4 +1524,11 @@ class CurrentUserView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     def get(self, request):
         user = request.user
-        return Response({'id': user.id, 'username': user.username, 'first_name': user.first_name, 'email': user.email, 'full_name': user.get_full_name()})
\ No newline at end of file
+        return Response({'id': user.id, 'username': user.username, 'first_name': user.first_name, 'email': user.email, 'full_name': user.get_full_name()})
+
+
+class CacheStatsView(APIView):
+    """Contadores de acerto/erro do cache de respostas deste processo (só admin)."""
+    permission_classes = [permissions.IsAdminUser]
+    def get(self, request):
+        return Response(get_cache_stats())